@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "accounts"
+
+    def ready(self):
+        # Cache invalidation receivers
+        from . import cache  # noqa: F401
+        # Token cache invalidation receivers
+        from . import authentication  # noqa: F401
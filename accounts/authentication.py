@@ -0,0 +1,142 @@
+"""
+Cached JWT authentication (REST and WebSocket).
+
+Access tokens are short-lived and clients refresh and reconnect a lot.
+Without a cache, every request and every socket handshake costs a signature
+check plus a User query. Here, after the signature and expiry checks, the
+user is looked up by the token's `jti` in a small per-process LRU
+(AUTH_TOKEN_CACHE_SIZE entries, each kept for AUTH_TOKEN_CACHE_TTL seconds),
+so a cached token costs one shared-cache round trip and no queries.
+
+Revocation goes through the shared cache and is checked on every call, so
+it applies on every worker at once:
+
+- `revoke_token()` marks one access token (logout - the refresh token
+  is blacklisted by the view, other sessions keep working)
+- `revoke_user()` rejects every access token the user got up to now
+  (deleted or deactivated account, password change)
+"""
+
+import copy
+import threading
+import time
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+User = get_user_model()
+
+_tokens = None
+_tokens_lock = threading.Lock()
+
+
+def _get_tokens():
+    global _tokens
+    if _tokens is None:
+        with _tokens_lock:
+            if _tokens is None:
+                _tokens = TTLCache(
+                    maxsize=getattr(settings, 'AUTH_TOKEN_CACHE_SIZE', 10000),
+                    ttl=getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 30),
+                )
+    return _tokens
+
+
+def _revoked_key(jti):
+    return f"auth:revoked:{jti}"
+
+
+def _epoch_key(user_id):
+    return f"auth:epoch:{user_id}"
+
+
+def _remaining_lifetime(token):
+    """Seconds until the token expires (at least 1)"""
+    return max(1, int(token.get('exp', time.time()) - time.time()) + 1)
+
+
+def authenticate_token(raw_token):
+    """
+    Validate a raw access token and return (user, validated_token).
+    Raises InvalidToken / AuthenticationFailed like JWTAuthentication.
+    """
+    backend = JWTAuthentication()
+    validated_token = backend.get_validated_token(raw_token)
+    jti = validated_token.get(api_settings.JTI_CLAIM)
+
+    # Revocation markers first (one cache round trip), cached or not
+    user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+    found = cache.get_many([_revoked_key(jti), _epoch_key(user_id)])
+    if found.get(_revoked_key(jti)):
+        raise InvalidToken('Token has been revoked')
+    epoch = found.get(_epoch_key(user_id))
+    # iat has whole-second precision - a token from the revoking second is rejected too
+    if epoch is not None and validated_token.get('iat', 0) <= epoch:
+        raise InvalidToken('Token has been revoked')
+
+    tokens = _get_tokens()
+    with _tokens_lock:
+        user = tokens.get(jti)
+    if user is None:
+        user = backend.get_user(validated_token)
+        with _tokens_lock:
+            tokens[jti] = user
+    # Each request gets its own copy - views may modify request.user
+    return copy.copy(user), validated_token
+
+
+def forget_user(user_id):
+    """Drop this process's cached entries for a user"""
+    tokens = _get_tokens()
+    with _tokens_lock:
+        for jti, user in list(tokens.items()):
+            if str(user.pk) == str(user_id):
+                tokens.pop(jti, None)
+
+
+def revoke_token(validated_token):
+    """Reject one access token from now on (logout)"""
+    jti = validated_token.get(api_settings.JTI_CLAIM)
+    cache.set(_revoked_key(jti), True, _remaining_lifetime(validated_token))
+    with _tokens_lock:
+        _get_tokens().pop(jti, None)
+
+
+def revoke_user(user_id):
+    """Reject every access token issued to the user up to now"""
+    lifetime = int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()) + 1
+    cache.set(_epoch_key(user_id), int(time.time()), lifetime)
+    forget_user(user_id)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """DRF authentication class backed by authenticate_token()"""
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        return authenticate_token(raw_token)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    # set_password() leaves the raw password on the instance until save() returns
+    password_changed = getattr(instance, '_password', None) is not None
+    if not created and (password_changed or not instance.is_active):
+        revoke_user(instance.pk)
+    else:
+        # Cached snapshots would hide profile / is_active changes
+        forget_user(instance.pk)
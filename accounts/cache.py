@@ -0,0 +1,85 @@
+"""
+Read-through cache for serialized user profiles.
+
+Entries are keyed by user id and versioned (pixora_backend.cache). The
+version is bumped when the user row is saved and when accounts.counters
+changes the post/follower/following counts. The slim author summaries
+nested in cached posts have their own version, bumped only on user save.
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from pixora_backend import cache as versioned_cache
+from .serializers import UserProfileSerializer, UserSummarySerializer
+from .signals import user_counts_changed
+
+User = get_user_model()
+
+PROFILE = 'profile'
+SUMMARY = 'user_summary'
+
+
+def get_user_id(username):
+    """Username -> user id (usernames never change, so this is not versioned)"""
+    key = f"username:{username}"
+    user_id = cache.get(key)
+    if user_id is None:
+        user_id = User.objects.filter(username=username).values_list('id', flat=True).first()
+        if user_id is not None:
+            cache.set(key, user_id, versioned_cache.get_timeout())
+    return user_id
+
+
+def get_profile(user_id, request):
+    """Serialized UserProfileSerializer data, or None if the user is gone"""
+    def build():
+        user = User.objects.filter(pk=user_id).first()
+        if user is None:
+            return None
+        return dict(UserProfileSerializer(user, context={'request': request}).data)
+
+    return versioned_cache.get_or_build(PROFILE, user_id, build, request.get_host())
+
+
+def get_summaries(user_ids, request):
+    """{user_id: UserSummarySerializer data} for many users, missing users are skipped"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+
+    host = request.get_host()
+    versions = versioned_cache.get_versions(SUMMARY, user_ids)
+    keys = {
+        user_id: versioned_cache.make_key(SUMMARY, user_id, versions[user_id], host)
+        for user_id in user_ids
+    }
+    found = cache.get_many(list(keys.values()))
+
+    summaries = {user_id: found[key] for user_id, key in keys.items() if key in found}
+    missing = [user_id for user_id in user_ids if user_id not in summaries]
+    if missing:
+        built = {
+            user.id: dict(UserSummarySerializer(user, context={'request': request}).data)
+            for user in User.objects.filter(id__in=missing)
+        }
+        cache.set_many(
+            {keys[user_id]: summary for user_id, summary in built.items()},
+            versioned_cache.get_timeout()
+        )
+        summaries.update(built)
+    return summaries
+
+
+@receiver(post_save, sender=User)
+def invalidate_profile(sender, instance, **kwargs):
+    versioned_cache.bump_version(PROFILE, instance.id)
+    versioned_cache.bump_version(SUMMARY, instance.id)
+
+
+@receiver(user_counts_changed)
+def invalidate_profile_counts(sender, user_ids, **kwargs):
+    for user_id in user_ids:
+        versioned_cache.bump_version(PROFILE, user_id)
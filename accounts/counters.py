@@ -0,0 +1,93 @@
+"""
+Maintained post / follower / following counts on User.
+
+Updates are single `UPDATE ... SET col = col + n` statements so concurrent
+follows never lose increments. `reconcile()` recomputes the columns in bulk
+for rows that have drifted. `user_counts_changed` is sent once the
+surrounding transaction commits, so cache readers never re-cache the old
+counts under a new version.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from .signals import user_counts_changed
+
+User = get_user_model()
+
+
+def _counts_changed(user_ids):
+    transaction.on_commit(lambda: user_counts_changed.send(sender=User, user_ids=user_ids))
+
+
+def adjust_post_count(user_id, delta):
+    User.objects.filter(pk=user_id).update(post_count=F('post_count') + delta)
+    _counts_changed([user_id])
+
+
+def adjust_follow_counts(follower_id, following_id, delta):
+    """Apply a follow (+1) or unfollow (-1) to both users"""
+    User.objects.filter(pk=following_id).update(follower_count=F('follower_count') + delta)
+    User.objects.filter(pk=follower_id).update(following_count=F('following_count') + delta)
+    _counts_changed([follower_id, following_id])
+
+
+def get_follow_counts(follower_id, following_id):
+    """(followed user's follower_count, follower's following_count) in one query"""
+    rows = dict(
+        (user_id, (follower_count, following_count))
+        for user_id, follower_count, following_count in User.objects.filter(
+            pk__in=[follower_id, following_id]
+        ).values_list('id', 'follower_count', 'following_count')
+    )
+    return rows[following_id][0], rows[follower_id][1]
+
+
+def _count_subquery(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('id'))
+            .values('total')
+        ),
+        Value(0),
+    )
+
+
+def reconcile(batch_size=500):
+    """Recompute counters for users whose columns drifted, returns rows fixed"""
+    from posts.models import Post
+    from social.models import Follow
+
+    drifted = User.objects.annotate(
+        real_post_count=_count_subquery(Post, 'user'),
+        real_follower_count=_count_subquery(Follow, 'following'),
+        real_following_count=_count_subquery(Follow, 'follower'),
+    ).filter(
+        ~Q(post_count=F('real_post_count'))
+        | ~Q(follower_count=F('real_follower_count'))
+        | ~Q(following_count=F('real_following_count'))
+    ).only('id')
+
+    fixed = 0
+    batch = []
+    for user in drifted.iterator(chunk_size=batch_size):
+        user.post_count = user.real_post_count
+        user.follower_count = user.real_follower_count
+        user.following_count = user.real_following_count
+        batch.append(user)
+        if len(batch) >= batch_size:
+            fixed += _save_batch(batch)
+            batch = []
+    if batch:
+        fixed += _save_batch(batch)
+    return fixed
+
+
+def _save_batch(users):
+    User.objects.bulk_update(users, ['post_count', 'follower_count', 'following_count'])
+    _counts_changed([user.id for user in users])
+    return len(users)
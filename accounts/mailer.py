@@ -0,0 +1,152 @@
+"""
+Background mail dispatch.
+
+Messages go into a bounded queue served by a fixed pool of worker threads.
+Each worker keeps one email backend connection open and reuses it for every
+message (closing it after MAIL_IDLE_TIMEOUT seconds without work). Failed
+sends are retried with exponential backoff. Works with any EMAIL_BACKEND
+(smtp, console, locmem).
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class MailDispatcher:
+    """Bounded queue + fixed worker pool for outgoing email"""
+
+    def __init__(self, workers=2, queue_size=100, max_retries=3, retry_backoff=1.0, idle_timeout=30):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.idle_timeout = idle_timeout
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._metrics = Counter()
+        self._metrics_lock = threading.Lock()
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, daemon=True, name=f'mail-worker-{i}')
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Let workers finish the queue, then shut them down"""
+        with self._start_lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self.queue.put(_STOP)
+        for thread in threads:
+            thread.join(timeout)
+
+    def submit(self, message):
+        """Queue an EmailMessage. Returns False if the queue is full."""
+        self.start()
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('queued')
+        return True
+
+    def join(self):
+        """Block until every queued message was sent or gave up"""
+        self.queue.join()
+
+    def get_metrics(self):
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        metrics['queue_depth'] = self.queue.qsize()
+        return metrics
+
+    def _count(self, name, amount=1):
+        with self._metrics_lock:
+            self._metrics[name] += amount
+
+    def _run(self):
+        connection = None
+        while True:
+            try:
+                message = self.queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                connection = self._close(connection)
+                continue
+
+            if message is _STOP:
+                self._close(connection)
+                self.queue.task_done()
+                return
+
+            try:
+                connection = self._send(connection, message)
+            finally:
+                self.queue.task_done()
+
+    def _send(self, connection, message):
+        for attempt in range(self.max_retries + 1):
+            try:
+                if connection is None:
+                    connection = get_connection(fail_silently=False)
+                    connection.open()
+                connection.send_messages([message])
+                self._count('sent')
+                return connection
+            except Exception:
+                # Drop the connection, it may be the thing that broke
+                connection = self._close(connection)
+                if attempt == self.max_retries:
+                    self._count('failed')
+                    logger.exception("Email to %s failed after %d attempts", message.to, attempt + 1)
+                    return connection
+                self._count('retried')
+                time.sleep(self.retry_backoff * (2 ** attempt))
+        return connection
+
+    def _close(self, connection):
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+        return None
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = MailDispatcher(
+                    workers=getattr(settings, 'MAIL_WORKERS', 2),
+                    queue_size=getattr(settings, 'MAIL_QUEUE_SIZE', 100),
+                    max_retries=getattr(settings, 'MAIL_MAX_RETRIES', 3),
+                    retry_backoff=getattr(settings, 'MAIL_RETRY_BACKOFF', 1.0),
+                    idle_timeout=getattr(settings, 'MAIL_IDLE_TIMEOUT', 30),
+                )
+    return _dispatcher
+
+
+def send_async(message):
+    """Queue an EmailMessage on the shared dispatcher"""
+    return get_dispatcher().submit(message)
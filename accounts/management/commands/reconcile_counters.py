@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from accounts import counters
+
+
+class Command(BaseCommand):
+    help = 'Fix drift in the cached post/follower/following counts on users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows written per bulk update')
+
+    def handle(self, *args, **options):
+        fixed = counters.reconcile(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Reconciled counters for {fixed} users'))
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:59
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counters(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('social', 'Follow')
+
+    post_counts = dict(Post.objects.values('user').annotate(total=Count('id')).values_list('user', 'total'))
+    follower_counts = dict(Follow.objects.values('following').annotate(total=Count('id')).values_list('following', 'total'))
+    following_counts = dict(Follow.objects.values('follower').annotate(total=Count('id')).values_list('follower', 'total'))
+
+    users = []
+    for user in User.objects.only('id'):
+        user.post_count = post_counts.get(user.id, 0)
+        user.follower_count = follower_counts.get(user.id, 0)
+        user.following_count = following_counts.get(user.id, 0)
+        users.append(user)
+    User.objects.bulk_update(users, ['post_count', 'follower_count', 'following_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_emailotp'),
+        ('posts', '0004_timelineentry'),
+        ('social', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='follower_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='post_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
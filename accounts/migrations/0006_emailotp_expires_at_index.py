@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 13:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_user_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emailotp',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
@@ -3,7 +3,6 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .models import User
 from .models import EmailOTP
-from social.models import Follow
 from django.contrib.auth.password_validation import validate_password
 import re
 User = get_user_model() 
@@ -17,18 +16,34 @@ class VerifyOTPSerializer(serializers.Serializer):
     email = serializers.EmailField()
     otp = serializers.CharField(max_length=6)
 
+class UserSummarySerializer(serializers.ModelSerializer):
+    """Slim user for nesting in posts, comments, stories and messages (no counts)"""
+
+    avatar_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'full_name', 'avatar_url', 'is_verified']
+        read_only_fields = fields
+
+    def get_avatar_url(self, obj):
+        """Get full avatar URL"""
+        if obj.avatar:
+            request = self.context.get('request')
+            if request:
+                return request.build_absolute_uri(obj.avatar.url)
+        return None
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for User model"""
 
     avatar_url = serializers.SerializerMethodField()
-    post_count = serializers.SerializerMethodField()
-    follower_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
     
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'full_name', 'bio', 'avatar','avatar_url', 'role', 'is_verified', 'post_count', 'follower_count', 'following_count', 'created_at']
-        read_only_fields = ['id', 'username', 'email', 'role', 'is_verified', 'created_at']
+        read_only_fields = ['id', 'username', 'email', 'role', 'is_verified', 'post_count', 'follower_count', 'following_count', 'created_at']
     def get_avatar_url(self, obj):
         """Get full avatar URL"""
         if obj.avatar:
@@ -37,25 +52,11 @@ class UserSerializer(serializers.ModelSerializer):
                 return request.build_absolute_uri(obj.avatar.url)
         return None
 
-    def get_post_count(self, obj):
-        return obj.posts.count()
-    
-    def get_follower_count(self, obj):
-        # Count users who follow this user
-        
-        return Follow.objects.filter(following=obj).count()
-    
-    def get_following_count(self, obj):
-        return Follow.objects.filter(follower=obj).count()
-
 
 class UserProfileSerializer(serializers.ModelSerializer):
     """Detailed user profile serializer with counts"""
     
     avatar_url = serializers.SerializerMethodField()
-    post_count = serializers.SerializerMethodField()
-    follower_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -65,7 +66,10 @@ class UserProfileSerializer(serializers.ModelSerializer):
             'post_count', 'follower_count', 'following_count',
             'created_at'
         ]
-        read_only_fields = ['id', 'username', 'email', 'role', 'is_verified', 'created_at']
+        read_only_fields = [
+            'id', 'username', 'email', 'role', 'is_verified',
+            'post_count', 'follower_count', 'following_count', 'created_at'
+        ]
     
     def get_avatar_url(self, obj):
         """Get full avatar URL"""
@@ -74,22 +78,6 @@ class UserProfileSerializer(serializers.ModelSerializer):
             if request:
                 return request.build_absolute_uri(obj.avatar.url)
         return None
-    
-    def get_post_count(self, obj):
-        """Get user's post count"""
-        return obj.posts.count()
-
-    def get_follower_count(self, obj):
-        from social.models import Follow
-        count = Follow.objects.filter(following=obj).count()
-        print(f"🔍 Getting follower_count for {obj.username}: {count}")
-        return count
-
-    def get_following_count(self, obj):
-        from social.models import Follow
-        count = Follow.objects.filter(follower=obj).count()
-        print(f"🔍 Getting following_count for {obj.username}: {count}")
-        return count
 
 class UpdateProfileSerializer(serializers.ModelSerializer):
     """Serializer for updating user profile"""
@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent by accounts.counters after post/follower/following counts change
+# (those writes are UPDATE statements, so post_save does not fire)
+user_counts_changed = Signal()  # kwargs: user_ids
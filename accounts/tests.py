@@ -1,3 +1,136 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from . import mailer
+from .models import EmailOTP
+
+User = get_user_model()
+
+EMAIL = 'newcomer@example.com'
+SEND_OTP_URL = '/api/auth/send-otp/'
+
+
+class SendOTPTests(TestCase):
+    """The OTP row only changes once its email is in the mail queue"""
+
+    def setUp(self):
+        # Throttle counters live in the cache
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+
+    def test_otp_stored_after_email_is_queued(self):
+        old = EmailOTP.objects.create(email=EMAIL, otp='111111')
+        stored_when_queued = []
+
+        def send_async(message):
+            stored_when_queued.append(list(EmailOTP.objects.filter(email=EMAIL).values_list('otp', flat=True)))
+            return True
+
+        with mock.patch.object(mailer, 'send_async', side_effect=send_async) as send:
+            response = self.client.post(SEND_OTP_URL, {'email': EMAIL})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(send.call_count, 1)
+        self.assertEqual(send.call_args.args[0].to, [EMAIL])
+        # Only the previous OTP existed while the email was being queued
+        self.assertEqual(stored_when_queued, [[old.otp]])
+
+        otp = EmailOTP.objects.get(email=EMAIL)
+        self.assertNotEqual(otp.pk, old.pk)
+        self.assertIn(otp.otp, send.call_args.args[0].body)
+
+    def test_full_mail_queue_returns_503_and_keeps_previous_otp(self):
+        old = EmailOTP.objects.create(email=EMAIL, otp='111111')
+
+        with mock.patch.object(mailer, 'send_async', return_value=False):
+            response = self.client.post(SEND_OTP_URL, {'email': EMAIL})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(list(EmailOTP.objects.filter(email=EMAIL)), [old])
+
+    def test_full_mail_queue_stores_nothing_for_new_email(self):
+        with mock.patch.object(mailer, 'send_async', return_value=False):
+            response = self.client.post(SEND_OTP_URL, {'email': EMAIL})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(EmailOTP.objects.filter(email=EMAIL).exists())
+
+
+class FailingConnection:
+    def __init__(self, **kwargs):
+        pass
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        raise OSError('smtp down')
+
+
+class MailDispatcherTests(SimpleTestCase):
+
+    def make_dispatcher(self, **kwargs):
+        dispatcher = mailer.MailDispatcher(**kwargs)
+        self.addCleanup(dispatcher.stop, 5)
+        return dispatcher
+
+    def message(self):
+        return mail.EmailMessage('Subject', 'Body', 'from@example.com', ['to@example.com'])
+
+    def test_submit_rejects_when_queue_is_full(self):
+        dispatcher = self.make_dispatcher(workers=1, queue_size=1)
+        # Keep the worker from draining the queue
+        with mock.patch.object(dispatcher, 'start'):
+            self.assertTrue(dispatcher.submit(self.message()))
+            self.assertFalse(dispatcher.submit(self.message()))
+            metrics = dispatcher.get_metrics()
+        self.assertEqual(metrics['queued'], 1)
+        self.assertEqual(metrics['dropped'], 1)
+        self.assertEqual(metrics['queue_depth'], 1)
+
+    def test_sends_through_worker(self):
+        dispatcher = self.make_dispatcher(workers=1)
+        dispatcher.submit(self.message())
+        dispatcher.join()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(dispatcher.get_metrics()['sent'], 1)
+
+    def test_retries_then_gives_up(self):
+        dispatcher = self.make_dispatcher(workers=1, max_retries=2, retry_backoff=0.001)
+        with mock.patch.object(mailer, 'get_connection', FailingConnection), \
+                self.assertLogs('accounts.mailer', 'ERROR'):
+            dispatcher.submit(self.message())
+            dispatcher.join()
+        metrics = dispatcher.get_metrics()
+        self.assertEqual(metrics['retried'], 2)
+        self.assertEqual(metrics['failed'], 1)
+        self.assertNotIn('sent', metrics)
+
+
+class MailMetricsViewTests(TestCase):
+    url = '/api/auth/mail-metrics/'
+
+    def test_admin_only(self):
+        user = User.objects.create_user(email='member@example.com', username='member', password='pw12345678')
+        client = APIClient()
+        client.force_authenticate(user)
+        self.assertEqual(client.get(self.url).status_code, 403)
+
+    def test_returns_dispatcher_metrics(self):
+        admin = User.objects.create_user(
+            email='admin@example.com', username='admin', password='pw12345678', is_staff=True
+        )
+        client = APIClient()
+        client.force_authenticate(admin)
+        response = client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('queue_depth', response.data)
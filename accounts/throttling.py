@@ -0,0 +1,103 @@
+"""
+Sliding-window rate limits for the auth endpoints.
+
+Counts live in the cache (atomic INCR on Redis, locked increments on
+locmem), so a rejected request never touches the database. The window is
+approximated from two fixed buckets: the current bucket's count plus the
+previous bucket's count weighted by how much of it still overlaps the window.
+"""
+
+import time
+
+from django.core.cache import cache
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """Base class - set `scope`, and `key_field` to limit per request field (e.g. email)"""
+    key_field = None
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def get_cache_key(self, request, view):
+        ident = None
+        # A JSON list or scalar body has no fields - fall back to the client IP
+        if self.key_field and isinstance(request.data, dict):
+            value = request.data.get(self.key_field)
+            if isinstance(value, str) and value.strip():
+                ident = value.strip().lower()
+        if ident is None:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        now = self.timer()
+        bucket = int(now // self.duration)
+        current_key = f"{self.key}:{bucket}"
+        previous_key = f"{self.key}:{bucket - 1}"
+
+        # Both buckets have to outlive the window that reads them
+        cache.add(current_key, 0, timeout=self.duration * 2)
+        try:
+            current = cache.incr(current_key)
+        except ValueError:
+            cache.set(current_key, 1, timeout=self.duration * 2)
+            current = 1
+        previous = cache.get(previous_key, 0)
+
+        elapsed = (now % self.duration) / self.duration
+        self.estimated = previous * (1 - elapsed) + current
+        self.bucket_end = (bucket + 1) * self.duration
+
+        if self.estimated > self.num_requests:
+            # Rejected requests do not use up the window
+            try:
+                cache.decr(current_key)
+            except ValueError:
+                pass
+            return False
+        return True
+
+    def wait(self):
+        return max(self.bucket_end - self.timer(), 0)
+
+    def timer(self):
+        return time.time()
+
+
+class SendOTPThrottle(SlidingWindowThrottle):
+    scope = 'send_otp'
+    key_field = 'email'
+
+
+class SendOTPIPThrottle(SlidingWindowThrottle):
+    """Per client IP, so cycling through email addresses doesn't help"""
+    scope = 'send_otp_ip'
+
+
+class VerifyOTPThrottle(SlidingWindowThrottle):
+    scope = 'verify_otp'
+    key_field = 'email'
+
+
+class VerifyOTPIPThrottle(SlidingWindowThrottle):
+    scope = 'verify_otp_ip'
+
+
+class LoginThrottle(SlidingWindowThrottle):
+    scope = 'login'
+    key_field = 'email'
+
+
+class LoginIPThrottle(SlidingWindowThrottle):
+    scope = 'login_ip'
+
+
+class RegisterThrottle(SlidingWindowThrottle):
+    scope = 'register'
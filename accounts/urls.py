@@ -9,11 +9,13 @@ urlpatterns = [
     # Authentication
     path('auth/register/', views.RegisterView.as_view(), name='register'),
     path('auth/login/', views.LoginView.as_view(), name='login'),
+    path('auth/logout/', views.LogoutView.as_view(), name='logout'),
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     
     # For OTP
     path('auth/send-otp/', views.SendOTPView.as_view(), name='send_otp'),
     path('auth/verify-otp/', views.VerifyOTPView.as_view(), name='verify_otp'),
+    path('auth/mail-metrics/', views.MailMetricsView.as_view(), name='mail_metrics'),
     
     # Current User
     path('auth/me/', views.CurrentUserView.as_view(), name='current_user'),
@@ -2,11 +2,12 @@ from rest_framework import status, generics, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import TokenError
 from django.contrib.auth import get_user_model
 from .serializers import RegisterSerializer, LoginSerializer, UserSerializer
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.shortcuts import get_object_or_404
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from rest_framework import status, generics
@@ -14,14 +15,20 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.conf import settings
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.conf import settings
-import threading
-from datetime import datetime, timedelta
-from django.utils import timezone
+from datetime import datetime
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth import authenticate
 from django.db import transaction
 from .models import EmailOTP
+from . import cache as profile_cache
+from . import mailer
+from . import authentication
+from .throttling import (
+    SendOTPThrottle, SendOTPIPThrottle, VerifyOTPThrottle, VerifyOTPIPThrottle,
+    LoginThrottle, LoginIPThrottle, RegisterThrottle
+)
+from django.http import Http404
 from .serializers import (
     RegisterSerializer, 
     LoginSerializer, 
@@ -34,142 +41,127 @@ from .serializers import (
 
 User = get_user_model()
 
-# Temporary: Update views.py to debug email
-def send_otp_email_background(email, otp_code):
-    """Send OTP email in background thread"""
-    try:
-        subject = 'Welcome to Pixora! Verify Your Account'
-        
-        # Beautiful HTML email template
-        html_message = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Pixora Verification</title>
-            <style>
-                body {{
-                    font-family: 'Arial', sans-serif;
-                    background-color: #f8f9fa;
-                    margin: 0;
-                    padding: 20px;
-                }}
-                .container {{
-                    max-width: 500px;
-                    margin: 0 auto;
-                    background: white;
-                    border-radius: 10px;
-                    padding: 30px; 
-                    overflow: hidden;
-                    box-shadow: 0 10px 30px rgba(0,0,0,0.1);
-                }}
-                .header {{
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    padding: 40px 20px;
-                    text-align: center;
-                    color: white;
-                }}
-                .logo {{
-                    font-size: 32px;
-                    font-weight: bold;
-                    margin-bottom: 10px;
-                }}
-                .otp-container {{
-                    padding: 40px 20px;
-                    text-align: center;
-                }}
-                .otp-code {{
-                    font-size: 42px;
-                    font-weight: bold;
-                    letter-spacing: 10px;
-                    color: #667eea;
-                    background: #f3f4f6;
-                    padding: 20px;
-                    border-radius: 10px;
-                    margin: 30px auto;
-                    display: inline-block;
-                }}
-                .footer {{
-                    background: #f8f9fa;
-                    padding: 20px;
-                    text-align: center;
-                    color: #6b7280;
-                    font-size: 12px;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <div class="logo">📸 PIXORA</div>
-                    <p style="margin: 0; opacity: 0.9;">Share Your Creative Moments</p>
-                </div>
+def build_otp_email(email, otp_code):
+    """Build the OTP verification email"""
+    subject = 'Welcome to Pixora! Verify Your Account'
+    
+    # Beautiful HTML email template
+    html_message = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>Pixora Verification</title>
+        <style>
+            body {{
+                font-family: 'Arial', sans-serif;
+                background-color: #f8f9fa;
+                margin: 0;
+                padding: 20px;
+            }}
+            .container {{
+                max-width: 500px;
+                margin: 0 auto;
+                background: white;
+                border-radius: 10px;
+                padding: 30px; 
+                overflow: hidden;
+                box-shadow: 0 10px 30px rgba(0,0,0,0.1);
+            }}
+            .header {{
+                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+                padding: 40px 20px;
+                text-align: center;
+                color: white;
+            }}
+            .logo {{
+                font-size: 32px;
+                font-weight: bold;
+                margin-bottom: 10px;
+            }}
+            .otp-container {{
+                padding: 40px 20px;
+                text-align: center;
+            }}
+            .otp-code {{
+                font-size: 42px;
+                font-weight: bold;
+                letter-spacing: 10px;
+                color: #667eea;
+                background: #f3f4f6;
+                padding: 20px;
+                border-radius: 10px;
+                margin: 30px auto;
+                display: inline-block;
+            }}
+            .footer {{
+                background: #f8f9fa;
+                padding: 20px;
+                text-align: center;
+                color: #6b7280;
+                font-size: 12px;
+            }}
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <div class="header">
+                <div class="logo">📸 PIXORA</div>
+                <p style="margin: 0; opacity: 0.9;">Share Your Creative Moments</p>
+            </div>
+            
+            <div class="otp-container">
+                <h2>Welcome to Pixora! 🎉</h2>
+                <p>Enter this verification code to complete your registration:</p>
                 
-                <div class="otp-container">
-                    <h2>Welcome to Pixora! 🎉</h2>
-                    <p>Enter this verification code to complete your registration:</p>
-                    
-                    <div class="otp-code">{otp_code}</div>
-                    
-                    <p style="color: #6b7280;">
-                        This code will expire in <strong>5 minutes</strong>.<br>
-                        If you didn't request this code, please ignore this email.
-                    </p>
-                </div>
+                <div class="otp-code">{otp_code}</div>
                 
-                <div class="footer">
-                    <p>© {datetime.now().year} Pixora. All rights reserved.</p>
-                    <p>This is an automated message, please do not reply.</p>
-                </div>
+                <p style="color: #6b7280;">
+                    This code will expire in <strong>5 minutes</strong>.<br>
+                    If you didn't request this code, please ignore this email.
+                </p>
             </div>
-        </body>
-        </html>
-        """
-        
-        # Plain text version (fallback)
-        plain_message = f"""
-        Welcome to Pixora!
-        
-        Your verification code is: {otp_code}
-        
-        This code will expire in 5 minutes.
-        
-        Enter this code on the verification page to complete your registration.
-        
-        If you didn't request this code, please ignore this email.
-        
-        Best regards,
-        The Pixora Team
-        """
-        print(f"\n=== TRYING TO SEND EMAIL ===")
-        print(f"To: {email}")
-        print(f"From: {settings.DEFAULT_FROM_EMAIL}")
-        print(f"Using: {settings.EMAIL_HOST_USER}")
-        
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.EMAIL_HOST_USER,
-            recipient_list=[email],
-            html_message=html_message,
-            fail_silently=False,
-        )
-        
-        print(f"✅ Email sent successfully to {email}")
-        print("=========================\n")
-        
-    except Exception as e:
-        print(f"❌ Email failed: {str(e)}")
-        print(f"Error: {str(e)}")
-        print(f"Email host: {settings.EMAIL_HOST}")
-        print(f"Email port: {settings.EMAIL_PORT}")
-        print(f"=========================\n")
+            
+            <div class="footer">
+                <p>© {datetime.now().year} Pixora. All rights reserved.</p>
+                <p>This is an automated message, please do not reply.</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+    
+    # Plain text version (fallback)
+    plain_message = f"""
+    Welcome to Pixora!
+    
+    Your verification code is: {otp_code}
+    
+    This code will expire in 5 minutes.
+    
+    Enter this code on the verification page to complete your registration.
+    
+    If you didn't request this code, please ignore this email.
+    
+    Best regards,
+    The Pixora Team
+    """
+
+    message = EmailMultiAlternatives(
+        subject=subject,
+        body=plain_message,
+        from_email=settings.EMAIL_HOST_USER or settings.DEFAULT_FROM_EMAIL,
+        to=[email],
+    )
+    message.attach_alternative(html_message, 'text/html')
+    return message
 
 
 class SendOTPView(APIView):
     """POST /api/auth/send-otp/ - Send OTP to email"""
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [SendOTPThrottle, SendOTPIPThrottle]
     
     def post(self, request):
         serializer = SendOTPSerializer(data=request.data)
@@ -192,57 +184,40 @@ class SendOTPView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Rate limiting: Check recent OTP requests
-        recent_attempts = EmailOTP.objects.filter(
-            email=email,
-            created_at__gte=timezone.now() - timedelta(minutes=1)
-        ).count()
+        # Generate new OTP
+        otp_code = EmailOTP.generate_otp()
         
-        if recent_attempts >= 2:
+        if settings.DEBUG:
+            print(f"\n{'='*50}")
+            print(f"OTP for {email}: {otp_code}")
+            print(f"{'='*50}\n")
+        
+        # Hand the email to the mail worker pool first - if the queue is
+        # full the previous OTP stays valid and no unsent OTP is stored
+        if not mailer.send_async(build_otp_email(email, otp_code)):
             return Response(
-                {'error': 'Too many OTP requests. Please wait 1 minute.'},
-                status=status.HTTP_429_TOO_MANY_REQUESTS
+                {'error': 'Email service is busy. Please try again shortly.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
         
         # Invalidate old OTPs
         EmailOTP.objects.filter(email=email, is_verified=False).delete()
         
-        # Generate new OTP
-        otp_code = EmailOTP.generate_otp()
         otp_instance = EmailOTP.objects.create(
             email=email,
             otp=otp_code
         )
         
-       # Send email with OTP in background thread
-        try:
-            if settings.DEBUG:
-                print(f"\n{'='*50}")
-                print(f"OTP for {email}: {otp_code}")
-                print(f"{'='*50}\n")
-            
-            # Send email in background
-            email_thread = threading.Thread(
-                target=send_otp_email_background,
-                args=(email, otp_code)
-            )
-            email_thread.start()
-            
-            return Response({
-                'message': 'OTP sent successfully to your email',
-                'email': email,
-                'expires_in': 300  # 5 minutes
-            }, status=status.HTTP_200_OK)
-            
-        except Exception as e:
-            return Response(
-                {'error': f'Failed to send email: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        return Response({
+            'message': 'OTP sent successfully to your email',
+            'email': email,
+            'expires_in': 300  # 5 minutes
+        }, status=status.HTTP_200_OK)
     
 class VerifyOTPView(APIView):
     """Verify OTP and mark email as verified"""
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [VerifyOTPThrottle, VerifyOTPIPThrottle]
     
     def post(self, request):
         serializer = VerifyOTPSerializer(data=request.data)
@@ -252,12 +227,6 @@ class VerifyOTPView(APIView):
         email = serializer.validated_data['email'].lower()
         otp = serializer.validated_data['otp']
         
-        # Clean up expired OTPs
-        EmailOTP.objects.filter(
-            expires_at__lt=timezone.now(),
-            is_verified=False
-        ).delete()
-
         try:
             otp_instance = EmailOTP.objects.get(
                 email=email,
@@ -294,11 +263,21 @@ class VerifyOTPView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+
+class MailMetricsView(APIView):
+    """GET /api/auth/mail-metrics/ - Mail queue counters of this worker process (admin only)"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(mailer.get_dispatcher().get_metrics(), status=status.HTTP_200_OK)
+
+
 class RegisterView(generics.CreateAPIView):
     """POST /api/auth/register/"""
     queryset = User.objects.all()
     serializer_class = RegisterSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [RegisterThrottle]
     
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -366,78 +345,76 @@ class RegisterView(generics.CreateAPIView):
             )
 
     def send_welcome_email(self, email, username):
-        """Send welcome email after registration"""
-        try:
-            subject = 'Welcome to Pixora! 🎉'
-        
-            html_message = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <style>
-                    body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                    .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                    .header {{ text-align: center; padding: 20px 0; }}
-                    .logo {{ font-size: 32px; font-weight: bold; color: #6366f1; }}
-                    .content {{ background: #f9f9f9; padding: 30px; border-radius: 10px; }}
-                    .button {{ display: inline-block; background: #6366f1; color: white; 
-                               padding: 12px 30px; text-decoration: none; border-radius: 5px; 
-                               margin: 20px 0; }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <div class="logo">📸 PIXORA</div>
-                    </div>
-                    <div class="content">
-                        <h2>Welcome @{username}! 👋</h2>
-                        <p>Your account has been successfully created and verified.</p>
-                        <p>Start exploring Pixora by:</p>
-                        <ul>
-                            <li>Setting up your profile</li>
-                            <li>Following interesting accounts</li>
-                            <li>Sharing your first post</li>
-                        </ul>
-                        <p>
-                            <a href="http://localhost:3000/" class="button">
-                                Go to Dashboard
-                            </a>
-                        </p>
-                    </div>
+        """Queue welcome email after registration"""
+        subject = 'Welcome to Pixora! 🎉'
+    
+        html_message = f"""
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <style>
+                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+                .header {{ text-align: center; padding: 20px 0; }}
+                .logo {{ font-size: 32px; font-weight: bold; color: #6366f1; }}
+                .content {{ background: #f9f9f9; padding: 30px; border-radius: 10px; }}
+                .button {{ display: inline-block; background: #6366f1; color: white; 
+                           padding: 12px 30px; text-decoration: none; border-radius: 5px; 
+                           margin: 20px 0; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <div class="logo">📸 PIXORA</div>
                 </div>
-            </body>
-            </html>
-            """          
-
-            plain_message = f"""
-            Welcome to Pixora, @{username}!     
-            Your account has been successfully created and verified.         
-            Start exploring:
-            - Set up your profile
-            - Follow interesting accounts
-            - Share your first post      
-            Login here: http://localhost:/dashboard           
-
-            Best regards,
-            The Pixora Team
-            """           
-
-            send_mail(
-                subject=subject,
-                message=plain_message,
-                from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@pixora.com'),
-                recipient_list=[email],
-                html_message=html_message,
-                fail_silently=True,
-            )
-        except Exception as e:
-            print(f"Failed to send welcome email: {str(e)}")
+                <div class="content">
+                    <h2>Welcome @{username}! 👋</h2>
+                    <p>Your account has been successfully created and verified.</p>
+                    <p>Start exploring Pixora by:</p>
+                    <ul>
+                        <li>Setting up your profile</li>
+                        <li>Following interesting accounts</li>
+                        <li>Sharing your first post</li>
+                    </ul>
+                    <p>
+                        <a href="http://localhost:3000/" class="button">
+                            Go to Dashboard
+                        </a>
+                    </p>
+                </div>
+            </div>
+        </body>
+        </html>
+        """          
+
+        plain_message = f"""
+        Welcome to Pixora, @{username}!     
+        Your account has been successfully created and verified.         
+        Start exploring:
+        - Set up your profile
+        - Follow interesting accounts
+        - Share your first post      
+        Login here: http://localhost:/dashboard           
+
+        Best regards,
+        The Pixora Team
+        """
+
+        message = EmailMultiAlternatives(
+            subject=subject,
+            body=plain_message,
+            from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@pixora.com'),
+            to=[email],
+        )
+        message.attach_alternative(html_message, 'text/html')
+        mailer.send_async(message)
 
 
 class LoginView(APIView):
     """POST /api/auth/login/"""
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [LoginThrottle, LoginIPThrottle]
     
     def post(self, request):
         serializer = LoginSerializer(data=request.data)
@@ -454,6 +431,27 @@ class LoginView(APIView):
         }, status=status.HTTP_200_OK)
 
 
+class LogoutView(APIView):
+    """POST /api/auth/logout/ - Blacklist the refresh token, revoke the access token"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        refresh = request.data.get('refresh')
+        if refresh:
+            try:
+                token = RefreshToken(refresh)
+            except TokenError:
+                return Response({'error': 'Invalid refresh token'}, status=status.HTTP_400_BAD_REQUEST)
+            if str(token.get('user_id')) != str(request.user.id):
+                return Response({'error': 'Invalid refresh token'}, status=status.HTTP_400_BAD_REQUEST)
+            token.blacklist()
+        
+        # The access token used for this request stops working right away
+        authentication.revoke_token(request.auth)
+        
+        return Response({'message': 'Logged out'}, status=status.HTTP_200_OK)
+
+
 class CurrentUserView(APIView):
     """GET /api/auth/me/"""
     serializer_class = UserSerializer
@@ -473,6 +471,12 @@ class UserProfileView(generics.RetrieveAPIView):
     
     def get_serializer_context(self):
         return {'request': self.request}
+    
+    def retrieve(self, request, *args, **kwargs):
+        user_id = profile_cache.get_user_id(kwargs['username'])
+        if user_id is None:
+            raise Http404
+        return Response(profile_cache.get_profile(user_id, request))
 
 class UpdateProfileView(generics.UpdateAPIView):
     """
@@ -553,7 +557,9 @@ def delete_account(request):
             
             # 5. Delete chat messages sent by user
             from chat.models import Message, Conversation
+            from chat import archive
             Message.objects.filter(sender=user).delete()
+            archive.purge_sender(user)
             
             # Remove user from conversations but keep conversation for other participants
             for conversation in Conversation.objects.filter(participants=user):
@@ -567,8 +573,12 @@ def delete_account(request):
             user.bio = ""
             user.avatar = None
             user.email = f"deleted_{user.id}@pixora.deleted"  # Anonymize email
+            user.post_count = 0
             user.save()
             
+            # Every access token of this account stops working
+            authentication.revoke_user(user.id)
+            
             # Keep username, following, followers in database (as per requirement)
             # These remain intact in social.models.Follow
             
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Conversation, Message, MessageRead
+from .models import Conversation, Message, MessageRead, ConversationReadState, ArchivedMessageSegment
 
 
 @admin.register(Conversation)
@@ -25,4 +25,18 @@ class MessageAdmin(admin.ModelAdmin):
 class MessageReadAdmin(admin.ModelAdmin):
     list_display = ['id', 'message', 'user', 'read_at']
     list_filter = ['read_at']
-    search_fields = ['user__username']
\ No newline at end of file
+    search_fields = ['user__username']
+
+
+@admin.register(ConversationReadState)
+class ConversationReadStateAdmin(admin.ModelAdmin):
+    list_display = ['id', 'conversation', 'user', 'unread_count', 'last_read_at']
+    search_fields = ['user__username']
+
+
+@admin.register(ArchivedMessageSegment)
+class ArchivedMessageSegmentAdmin(admin.ModelAdmin):
+    list_display = ['id', 'conversation', 'month', 'message_count', 'updated_at']
+    list_filter = ['month']
+    exclude = ['data']
+    readonly_fields = ['first_created_at', 'last_created_at', 'message_count']
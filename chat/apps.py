@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class ChatConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "chat"
+
+    def ready(self):
+        # Membership cache invalidation receivers
+        from . import membership  # noqa: F401
+        # Read state rows for new participants
+        from . import read_state  # noqa: F401
+        # Repoint last_message after hard deletes
+        from . import inbox  # noqa: F401
+        # Re-create search triggers after migrations (see chat/search.py)
+        from django.db.models.signals import post_migrate
+        from . import search
+        post_migrate.connect(search.ensure_index, sender=self)
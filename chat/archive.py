@@ -0,0 +1,430 @@
+"""
+Cold storage for old chat history.
+
+`archive_conversation()` moves messages older than CHAT_ARCHIVE_AFTER_DAYS
+out of chat_messages into ArchivedMessageSegment rows, one per conversation
+and month. Each segment is a zlib-compressed JSON list of messages, oldest
+first, with their reply preview, reactions and read receipts. The hot table
+(and everything that scans it: unread counts, sync, search) only keeps
+recent history.
+
+Each conversation keeps a clean boundary: every archived message is older
+than every message still in chat_messages. The boundary is moved back so
+that the conversation's last message and the reply targets of hot messages
+stay hot. That lets `MessageHistoryPagination` page through chat_messages
+first and carry on into the segments with the same cursor, so clients
+see one continuous history.
+
+Archived messages are read-only: they can't be reacted to, marked read or
+found by search. Soft-deleted messages are dropped instead of archived.
+`purge_sender()` rewrites segments without a deleted account's messages.
+"""
+
+import json
+import time
+import uuid
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor
+
+from accounts.serializers import UserSummarySerializer
+from pixora_backend.pagination import MessageCursorPagination
+
+from .models import ArchivedMessageSegment, Conversation, Message, MessageReaction, MessageRead
+
+User = get_user_model()
+
+
+def get_cutoff(days=None):
+    if days is None:
+        days = getattr(settings, 'CHAT_ARCHIVE_AFTER_DAYS', 365)
+    return timezone.now() - timedelta(days=days)
+
+
+def _format_time(value):
+    return serializers.DateTimeField().to_representation(value)
+
+
+def _compress(entries):
+    return zlib.compress(json.dumps(entries, separators=(',', ':')).encode('utf-8'))
+
+
+def _decompress(data):
+    return json.loads(zlib.decompress(bytes(data)).decode('utf-8'))
+
+
+# Archiving
+
+def find_boundary(conversation, cutoff):
+    """Newest created_at that can be archived up to (exclusive)"""
+    boundary = cutoff
+    if conversation.last_message_id:
+        last_created_at = Message.objects.filter(
+            id=conversation.last_message_id
+        ).values_list('created_at', flat=True).first()
+        if last_created_at is not None:
+            boundary = min(boundary, last_created_at)
+
+    # Hot messages must keep their reply targets - each step only moves back
+    while True:
+        target = Message.objects.filter(
+            conversation=conversation,
+            created_at__gte=boundary,
+            reply_to__created_at__lt=boundary
+        ).aggregate(oldest=Min('reply_to__created_at'))['oldest']
+        if target is None:
+            return boundary
+        boundary = target
+
+
+def _reply_previews(conversation, boundary):
+    """
+    Reply previews for every message that will be archived, read up front:
+    deleting an earlier batch nulls the reply_to of later ones.
+    """
+    rows = Message.objects.filter(
+        conversation=conversation,
+        created_at__lt=boundary,
+        reply_to__isnull=False
+    ).values('id', 'reply_to_id', 'reply_to__content', 'reply_to__sender__username', 'reply_to__message_type')
+    return {
+        row['id']: {
+            'id': str(row['reply_to_id']),
+            'content': row['reply_to__content'],
+            'sender': row['reply_to__sender__username'],
+            'message_type': row['reply_to__message_type']
+        }
+        for row in rows
+    }
+
+
+def _archive_entries(messages, reply_previews):
+    """Message rows -> archive entries with their reactions and receipts"""
+    message_ids = [message.id for message in messages]
+
+    reactors = {}
+    for message_id, emoji, user_id in MessageReaction.objects.filter(
+        message_id__in=message_ids
+    ).order_by('created_at').values_list('message_id', 'emoji', 'user_id'):
+        reactors.setdefault(message_id, {}).setdefault(emoji, []).append(str(user_id))
+
+    receipts = {}
+    for receipt_id, message_id, user_id, read_at in MessageRead.objects.filter(
+        message_id__in=message_ids
+    ).values_list('id', 'message_id', 'user_id', 'read_at'):
+        receipts.setdefault(message_id, []).append([str(receipt_id), str(user_id), _format_time(read_at)])
+
+    return [
+        {
+            'id': str(message.id),
+            'sender_id': str(message.sender_id),
+            'content': message.content,
+            'message_type': message.message_type,
+            'file': message.file.name or None,
+            'reply_to': reply_previews.get(message.id),
+            'created_at': _format_time(message.created_at),
+            'reactions': reactors.get(message.id, {}),
+            'read_receipts': receipts.get(message.id, []),
+        }
+        for message in messages
+    ]
+
+
+def _store(conversation_id, month, entries):
+    """Append entries (all newer than what the segment holds) to a month segment"""
+    segment = ArchivedMessageSegment.objects.select_for_update().filter(
+        conversation_id=conversation_id,
+        month=month
+    ).first()
+    if segment is None:
+        segment = ArchivedMessageSegment(conversation_id=conversation_id, month=month)
+        stored = []
+    else:
+        stored = _decompress(segment.data)
+
+    stored.extend(entries)
+    segment.data = _compress(stored)
+    segment.message_count = len(stored)
+    segment.first_created_at = parse_datetime(stored[0]['created_at'])
+    segment.last_created_at = parse_datetime(stored[-1]['created_at'])
+    segment.save()
+
+
+def archive_conversation(conversation, cutoff, batch_size=None):
+    """Move one conversation's old messages into segments, returns (archived, dropped)"""
+    batch_size = batch_size or getattr(settings, 'CHAT_ARCHIVE_BATCH_SIZE', 500)
+    boundary = find_boundary(conversation, cutoff)
+    reply_previews = _reply_previews(conversation, boundary)
+    archived = dropped = 0
+
+    while True:
+        with transaction.atomic():
+            messages = list(
+                Message.objects.filter(
+                    conversation=conversation,
+                    created_at__lt=boundary
+                ).order_by('created_at', 'id')[:batch_size]
+            )
+            if not messages:
+                break
+
+            # Group by month - a batch may cross a month boundary
+            months = {}
+            for message in messages:
+                if message.is_deleted:
+                    dropped += 1
+                    continue
+                month = timezone.localtime(message.created_at).date().replace(day=1)
+                months.setdefault(month, []).append(message)
+            for month, month_messages in months.items():
+                _store(conversation.id, month, _archive_entries(month_messages, reply_previews))
+                archived += len(month_messages)
+
+            # Receipts and reactions cascade
+            Message.objects.filter(id__in=[message.id for message in messages]).delete()
+
+    return archived, dropped
+
+
+def archive(days=None, batch_size=None):
+    """Archive every conversation, returns stats like pixora_backend.sweeper.sweep()"""
+    started = time.monotonic()
+    cutoff = get_cutoff(days)
+    stats = {'conversations': 0, 'archived': 0, 'dropped': 0}
+
+    conversation_ids = Message.objects.filter(
+        created_at__lt=cutoff
+    ).values_list('conversation_id', flat=True).distinct()
+    for conversation in Conversation.objects.filter(id__in=list(conversation_ids)):
+        archived, dropped = archive_conversation(conversation, cutoff, batch_size)
+        if archived or dropped:
+            stats['conversations'] += 1
+        stats['archived'] += archived
+        stats['dropped'] += dropped
+
+    stats['elapsed'] = time.monotonic() - started
+    return stats
+
+
+def purge_sender(user):
+    """
+    Drop a user's messages, and reply previews quoting them, from the
+    segments of their conversations (account deletion). Segments left
+    empty are deleted. Returns the number of messages removed.
+    """
+    user_id = str(user.id)
+    removed = 0
+    with transaction.atomic():
+        segments = ArchivedMessageSegment.objects.select_for_update().filter(
+            conversation__participants=user
+        )
+        for segment in segments:
+            stored = _decompress(segment.data)
+            kept = [entry for entry in stored if entry['sender_id'] != user_id]
+            for entry in kept:
+                if entry['reply_to'] and entry['reply_to']['sender'] == user.username:
+                    entry['reply_to'] = None
+            removed += len(stored) - len(kept)
+
+            if not kept:
+                segment.delete()
+                continue
+            segment.data = _compress(kept)
+            segment.message_count = len(kept)
+            segment.first_created_at = parse_datetime(kept[0]['created_at'])
+            segment.last_created_at = parse_datetime(kept[-1]['created_at'])
+            segment.save()
+    return removed
+
+
+# Reading
+
+class ArchivedMessage:
+    """A message read back from a segment"""
+
+    archived = True
+
+    def __init__(self, conversation_id, entry):
+        self.conversation_id = conversation_id
+        self.entry = entry
+        self.id = uuid.UUID(entry['id'])
+        self.created_at = parse_datetime(entry['created_at'])
+
+    @property
+    def key(self):
+        return (self.created_at, self.id)
+
+
+def _segment_messages(segment):
+    return [ArchivedMessage(segment.conversation_id, entry) for entry in _decompress(segment.data)]
+
+
+def get_before(conversation_id, key=None, limit=30):
+    """Archived messages older than key, newest first"""
+    segments = ArchivedMessageSegment.objects.filter(conversation_id=conversation_id).order_by('-month')
+    if key is not None:
+        segments = segments.filter(first_created_at__lte=key[0])
+
+    found = []
+    for segment in segments.iterator():
+        for message in reversed(_segment_messages(segment)):
+            if key is None or message.key < key:
+                found.append(message)
+                if len(found) == limit:
+                    return found
+    return found
+
+
+def get_after(conversation_id, key, limit=30):
+    """Archived messages newer than key, oldest first"""
+    segments = ArchivedMessageSegment.objects.filter(
+        conversation_id=conversation_id,
+        last_created_at__gte=key[0]
+    ).order_by('month')
+
+    found = []
+    for segment in segments.iterator():
+        for message in _segment_messages(segment):
+            if message.key > key:
+                found.append(message)
+                if len(found) == limit:
+                    return found
+    return found
+
+
+def build_payloads(messages, request):
+    """MessageSerializer-shaped dicts for archived messages (one User query)"""
+    user_ids = set()
+    for message in messages:
+        user_ids.add(message.entry['sender_id'])
+        user_ids.update(receipt[1] for receipt in message.entry['read_receipts'])
+    users = {
+        str(user.id): dict(UserSummarySerializer(user, context={'request': request}).data, id=str(user.id))
+        for user in User.objects.filter(id__in=user_ids)
+    }
+    viewer_id = str(request.user.id) if request and request.user.is_authenticated else None
+
+    payloads = []
+    for message in messages:
+        entry = message.entry
+        file_url = None
+        if entry['file']:
+            file_url = default_storage.url(entry['file'])
+            if request:
+                file_url = request.build_absolute_uri(file_url)
+        receipts = [receipt for receipt in entry['read_receipts'] if receipt[1] in users]
+        payloads.append({
+            'id': entry['id'],
+            'conversation': str(message.conversation_id),
+            'sender': users.get(entry['sender_id']),
+            'content': entry['content'],
+            'message_type': entry['message_type'],
+            'file': file_url,
+            'file_url': file_url,
+            'reply_to': entry['reply_to'],
+            'is_deleted': False,
+            'created_at': entry['created_at'],
+            'read_receipts': [
+                {'id': receipt_id, 'user': users[user_id], 'read_at': read_at}
+                for receipt_id, user_id, read_at in receipts
+            ],
+            'is_read': any(receipt[1] == viewer_id for receipt in receipts),
+            'reactions': {emoji: len(user_ids) for emoji, user_ids in entry['reactions'].items()},
+            'my_reactions': [emoji for emoji, user_ids in entry['reactions'].items() if viewer_id in user_ids],
+        })
+    return payloads
+
+
+class MessageHistoryPagination(MessageCursorPagination):
+    """
+    Message pages that continue from chat_messages into the archive.
+    Cursors hold the (created_at, id) of the page edge, so the same link
+    works on either side of the boundary.
+    """
+
+    def __init__(self, conversation_id):
+        self.conversation_id = conversation_id
+
+    def encode_key(self, key):
+        return f"{key[0].isoformat()}|{key[1]}"
+
+    def decode_key(self, position):
+        created_at, message_id = position.split('|')
+        created_at = parse_datetime(created_at)
+        if created_at is None:
+            raise ValueError(position)
+        return created_at, uuid.UUID(message_id)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        self.cursor = self.decode_cursor(request)
+        key = None
+        reverse = False
+        if self.cursor is not None and self.cursor.position:
+            try:
+                key = self.decode_key(self.cursor.position)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+            reverse = self.cursor.reverse
+
+        size = self.page_size
+        if not reverse:
+            # Walking back in time: hot rows first, then the archive
+            hot = queryset.order_by('-created_at', '-id')
+            if key is not None:
+                hot = hot.filter(Q(created_at__lt=key[0]) | Q(created_at=key[0], id__lt=key[1]))
+            page = list(hot[:size + 1])
+            if len(page) <= size:
+                edge = (page[-1].created_at, page[-1].id) if page else key
+                page += get_before(self.conversation_id, edge, size + 1 - len(page))
+            self.has_next = len(page) > size
+            self.has_previous = key is not None
+            page = page[:size]
+        else:
+            # Walking forward: archive first, then hot rows
+            page = get_after(self.conversation_id, key, size + 1)
+            if len(page) <= size:
+                hot = queryset.order_by('created_at', 'id')
+                last = page[-1].key if page else key
+                hot = hot.filter(Q(created_at__gt=last[0]) | Q(created_at=last[0], id__gt=last[1]))
+                page += list(hot[:size + 1 - len(page)])
+            self.has_previous = len(page) > size
+            self.has_next = True
+            page = list(reversed(page[:size]))
+
+        self.page = page
+        # Oldest first for display, like MessageCursorPagination
+        return list(reversed(page))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        oldest = self.page[-1]
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.encode_key((oldest.created_at, oldest.id))))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        newest = self.page[0]
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.encode_key((newest.created_at, newest.id))))
+
+    def serialize(self, page, serializer_class, context):
+        """Hot messages through the serializer (batched), archived ones from their entries"""
+        hot = [message for message in page if not getattr(message, 'archived', False)]
+        archived = [message for message in page if getattr(message, 'archived', False)]
+        data = {str(item['id']): item for item in serializer_class(hot, many=True, context=context).data}
+        data.update((payload['id'], payload) for payload in build_payloads(archived, context.get('request')))
+        return [data[str(message.id)] for message in page if str(message.id) in data]
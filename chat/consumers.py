@@ -1,11 +1,17 @@
-import json
+import asyncio
+import time
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
-from .models import Conversation, Message, MessageRead, MessageReaction
-from .serializers import MessageSerializer
-from rest_framework.request import Request
-from django.test import RequestFactory
+from django.core.exceptions import ValidationError
+from .models import Message, MessageRead
+from .serializers import ScopeRequest, build_message_payload
+from . import inbox, membership, presence, reactions, read_state, sync
+from .outbox import Outbox, SEND_ERROR_CLOSE_CODE, SLOW_CLIENT_CLOSE_CODE
+from .protocol import negotiate
+from .typing import TypingCoalescer
+from django.db import transaction
+from django.utils import timezone
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from django.contrib.auth.models import AnonymousUser
 from channels.db import database_sync_to_async
@@ -24,6 +30,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
         
+        # Participant sets for conversations this socket talks to
+        self.participants = {}
+        
+        # Keystrokes -> throttled typing state changes
+        self.typing = TypingCoalescer()
+        self.typing_timer = None
+        
         # Join user's personal room
         self.user_room = f"user_{self.user.id}"
         await self.channel_layer.group_add(
@@ -31,24 +44,52 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         
-        await self.accept()
+        # Wire protocol from the subprotocol header (see chat/protocol.py)
+        self.protocol = negotiate(self.scope.get('subprotocols'))
+        await self.accept(subprotocol=self.protocol.name)
+        
+        # Everything we send goes through the outbound queue
+        self.outbox = Outbox(self.send_frames, self.close_slow_client, self.close_broken_client)
+        self.outbox.start()
+        
+        # Count this socket, tell contacts if we just came online
+        if await database_sync_to_async(presence.connect)(self.user.id, self.channel_name):
+            await self.announce_presence(True)
+        # Keep this connection counted while the socket is open
+        self.presence_refreshed_at = time.monotonic()
+        self.presence_task = asyncio.ensure_future(self.keep_presence())
+        presence.start_sweeper()
         
         # Send connection confirmation
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'connection_established',
             'message': 'Connected to chat server'
-        }))
+        })
         print(f"✅ User {self.user.username} connected to WebSocket")
 
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection"""
         print(f"❌ User {self.user.username} disconnected")
 
+        if hasattr(self, 'outbox'):
+            self.outbox.stop()
+
+        if hasattr(self, 'presence_task'):
+            self.presence_task.cancel()
+
+        if hasattr(self, 'typing'):
+            if self.typing_timer:
+                self.typing_timer.cancel()
+            # Nobody should see us typing after we're gone
+            await self.send_typing_changes(self.typing.stop_all())
+
         if hasattr(self, 'user_room'):
             await self.channel_layer.group_discard(
                 self.user_room,
                 self.channel_name
             )
+            if await database_sync_to_async(presence.disconnect)(self.user.id, self.channel_name):
+                await self.announce_presence(False)
         
         if hasattr(self, 'conversation_room'):
             await self.channel_layer.group_discard(
@@ -56,10 +97,21 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
     
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         """Handle incoming WebSocket messages"""
         try:
-            data = json.loads(text_data)
+            data = self.protocol.decode(text_data, bytes_data)
+        except ValueError:
+            await self.send_event({
+                'type': 'error',
+                'message': 'Invalid JSON' if self.protocol.name is None else 'Invalid frame'
+            })
+            return
+
+        try:
+            # Any frame shows the client is alive
+            await self.refresh_presence()
+
             message_type = data.get('type')
 
             print(f"📩 Received: {message_type} from {self.user.username}")            
@@ -79,20 +131,26 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 await self.mark_message_read(data)
             
             elif message_type == 'add_reaction':
-                await self.handle_add_reaction(data)        
-
-        except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({
-                'type': 'error',
-                'message': 'Invalid JSON'
-            }))
+                await self.handle_reaction(data, 'add')
+            
+            elif message_type == 'remove_reaction':
+                await self.handle_reaction(data, 'remove')
+            
+            elif message_type == 'toggle_reaction':
+                await self.handle_reaction(data, 'toggle')
+            
+            elif message_type == 'heartbeat':
+                await self.handle_heartbeat()
+            
+            elif message_type == 'sync':
+                await self.handle_sync(data)
 
         except Exception as e:
             print(f"❌ Error in receive: {str(e)}")
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'error',
                 'message': str(e)
-            }))    
+            })    
 
     async def join_conversation(self, data):
         """Join a conversation room"""
@@ -102,10 +160,10 @@ class ChatConsumer(AsyncWebsocketConsumer):
         # Verify user is participant
         is_participant = await self.check_participant(conversation_id)
         if not is_participant:
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'error',
                 'message': 'You are not a participant in this conversation'
-            }))
+            })
             return
         
         # Leave previous conversation if any
@@ -122,10 +180,10 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         print(f"✅ Joined conversation room: {self.conversation_room}")        
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'joined_conversation',
             'conversation_id': conversation_id
-        }))
+        })
     
     async def leave_conversation(self, data):
         """Leave a conversation room"""
@@ -145,17 +203,25 @@ class ChatConsumer(AsyncWebsocketConsumer):
         if not content:
             return
         print(f"💬 Sending message to conversation: {conversation_id}")
+        
+        if not await self.check_participant(conversation_id):
+            await self.send_event({
+                'type': 'error',
+                'message': 'You are not a participant in this conversation'
+            })
+            return
 
         # Save message to database
-        message = await self.save_message(
+        saved = await self.save_message(
             conversation_id=conversation_id,
             content=content,
             reply_to_id=reply_to_id
         )
         
-        if message:
-            # Serialize message
-            message_data = await self.serialize_message(message)
+        if saved:
+            # Build the payload from what we already have - no extra queries
+            message, reply_to = saved
+            message_data = build_message_payload(message, self.user, reply_to, ScopeRequest(self.scope))
 
             print(f"✅ Message saved, broadcasting to room: conversation_{conversation_id}")
 
@@ -168,7 +234,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 }
             )
             # Also update conversation list for all participants
-            participants = await self.get_conversation_participants(conversation_id)
+            participants = await self.get_participants(conversation_id)
             for participant_id in participants:
                 await self.channel_layer.group_send(
                     f"user_{participant_id}",
@@ -180,192 +246,344 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 )
 
     async def handle_typing(self, data):
-        """Handle typing indicator"""
-        conversation_id = data.get('conversation_id')
+        """Handle typing indicator (coalesced - see chat/typing.py)"""
+        conversation_id = str(data.get('conversation_id'))
         is_typing = data.get('is_typing', False)
         
-        # Broadcast typing status to conversation
-        await self.channel_layer.group_send(
-            f"conversation_{conversation_id}",
-            {
-                'type': 'typing_indicator',
-                'user_id': str(self.user.id),
-                'username': self.user.username,
-                'is_typing': is_typing
-            }
-        )
-    
-    async def mark_message_read(self, data):
-        """Mark message as read"""
-        message_id = data.get('message_id')
-        conversation_id = data.get('conversation_id')        
-        await self.create_read_receipt(message_id)
+        if not await self.check_participant(conversation_id):
+            return
         
-        # Notify sender
-        message = await self.get_message(message_id)
-        if message:
+        await self.send_typing_changes(self.typing.update(conversation_id, is_typing))
+        self.schedule_typing_timer()
+    
+    async def send_typing_changes(self, changes):
+        """Broadcast typing state changes to their conversations"""
+        for conversation_id, is_typing in changes:
             await self.channel_layer.group_send(
                 f"conversation_{conversation_id}",
                 {
-                    'type': 'message_read_update',
-                    'message_id': str(message_id),
+                    'type': 'typing_indicator',
                     'user_id': str(self.user.id),
-                    'username': self.user.username
+                    'username': self.user.username,
+                    'is_typing': is_typing
                 }
             )
     
-    async def handle_add_reaction(self, data):
-        """Handle adding reaction to message"""
+    def schedule_typing_timer(self):
+        """(Re)arm the timer for held-back changes and typing expiry"""
+        if self.typing_timer:
+            self.typing_timer.cancel()
+            self.typing_timer = None
+        deadline = self.typing.next_deadline()
+        if deadline is not None:
+            self.typing_timer = asyncio.ensure_future(self.typing_timer_fired(deadline))
+    
+    async def typing_timer_fired(self, deadline):
+        await asyncio.sleep(max(0, deadline - self.typing.clock()))
+        self.typing_timer = None
+        await self.send_typing_changes(self.typing.tick())
+        self.schedule_typing_timer()
+    
+    async def send_event(self, event):
+        """Queue an event for this socket (see chat/outbox.py)"""
+        self.outbox.put(event)
+    
+    async def send_frames(self, events):
+        """Outbox writer - one batch frame if the protocol allows it"""
+        if self.protocol.batching and len(events) > 1:
+            text_data, bytes_data = self.protocol.encode_batch(events)
+            await self.send(text_data=text_data, bytes_data=bytes_data)
+            return
+        for event in events:
+            text_data, bytes_data = self.protocol.encode(event)
+            await self.send(text_data=text_data, bytes_data=bytes_data)
+    
+    async def close_slow_client(self):
+        print(f"🐢 Closing slow client {self.user.username} ({self.outbox.dropped} events dropped)")
+        await self.close(code=SLOW_CLIENT_CLOSE_CODE)
+    
+    async def close_broken_client(self):
+        await self.close(code=SEND_ERROR_CLOSE_CODE)
+    
+    async def refresh_presence(self, force=False):
+        """Refresh our presence connection, at most once per refresh interval"""
+        now = time.monotonic()
+        if not force and now < self.presence_refreshed_at + presence.get_refresh_interval():
+            return
+        self.presence_refreshed_at = now
+        if await database_sync_to_async(presence.heartbeat)(self.user.id, self.channel_name):
+            await self.announce_presence(True)
+
+    async def keep_presence(self):
+        while True:
+            await asyncio.sleep(presence.get_refresh_interval())
+            try:
+                await self.refresh_presence(force=True)
+            except Exception as e:
+                print(f"❌ Presence refresh failed: {str(e)}")
+
+    async def handle_heartbeat(self):
+        """Explicit keepalive from the client"""
+        await self.refresh_presence(force=True)
+        await self.send_event({'type': 'heartbeat_ack'})
+    
+    async def handle_sync(self, data):
+        """Stream what changed after the client's cursors (see chat/sync.py)"""
+        cursors = data.get('cursors')
+        if not isinstance(cursors, dict):
+            await self.send_event({
+                'type': 'error',
+                'message': 'sync needs a cursors object'
+            })
+            return
+        
+        # Taken before reading - changes made while we stream come again next time
+        synced_at = timezone.now()
+        skipped = []
+        request = ScopeRequest(self.scope)
+        for conversation_id, cursor in list(cursors.items())[:sync.get_max_conversations()]:
+            try:
+                position = sync.start(conversation_id, sync.parse_cursor(cursor))
+            except ValueError:
+                skipped.append(conversation_id)
+                continue
+            if not await self.check_participant(position['conversation_id']):
+                skipped.append(conversation_id)
+                continue
+            
+            while position is not None:
+                frame, position = await database_sync_to_async(sync.get_batch)(position, request=request)
+                if frame['messages'] or frame['reactions'] or frame['reads'] or frame['truncated']:
+                    await self.send_event(frame)
+                    # Don't queue history faster than the client takes it
+                    await self.outbox.wait_drained()
+        
+        await self.send_event({
+            'type': 'sync_complete',
+            'cursor': sync.format_cursor(synced_at),
+            'skipped': skipped + list(cursors)[sync.get_max_conversations():]
+        })
+    
+    async def announce_presence(self, online):
+        """Queue an online/offline change for everyone we chat with"""
+        contact_ids = await database_sync_to_async(presence.get_contact_ids)(self.user.id)
+        presence.batcher.add(self.user.id, online, contact_ids)
+    
+    async def mark_message_read(self, data):
+        """Mark message as read"""
         message_id = data.get('message_id')
-        emoji = data.get('emoji')
-        conversation_id = data.get('conversation_id')
 
-        await self.add_reaction(message_id, emoji)
+        # The message decides the conversation, not the client
+        conversation_id = await self.get_message_conversation_id(message_id)
+        if conversation_id is None:
+            await self.send_event({
+                'type': 'error',
+                'message': 'Message not found'
+            })
+            return
+
+        if not await self.check_participant(conversation_id):
+            await self.send_event({
+                'type': 'error',
+                'message': 'You are not a participant in this conversation'
+            })
+            return
 
-        # Broadcast reaction to conversation
+        await self.create_read_receipt(message_id)
+        
+        # Notify sender
         await self.channel_layer.group_send(
             f"conversation_{conversation_id}",
             {
-                'type': 'reaction_added',
+                'type': 'message_read_update',
                 'message_id': str(message_id),
-                'emoji': emoji,
                 'user_id': str(self.user.id),
                 'username': self.user.username
             }
         )
     
+    async def handle_reaction(self, data, action):
+        """Add, remove or toggle a reaction and broadcast the new counts"""
+        message_id = data.get('message_id')
+        emoji = data.get('emoji')
+
+        if not isinstance(emoji, str) or not 0 < len(emoji) <= reactions.MAX_EMOJI_LENGTH:
+            await self.send_event({
+                'type': 'error',
+                'message': 'Invalid emoji'
+            })
+            return
+
+        # The message decides the conversation, not the client
+        conversation_id = await self.get_message_conversation_id(message_id)
+        if conversation_id is None:
+            await self.send_event({
+                'type': 'error',
+                'message': 'Message not found'
+            })
+            return
+
+        if not await self.check_participant(conversation_id):
+            await self.send_event({
+                'type': 'error',
+                'message': 'You are not a participant in this conversation'
+            })
+            return
+
+        await self.apply_reaction(conversation_id, message_id, emoji, action)
+    
     # Event handlers (these are called by channel_layer.group_send)
     async def chat_message(self, event):
         """Send message to WebSocket"""
         print(f"📤 Broadcasting message to client")
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'new_message',
             'message': event['message']
-        }))
+        })
     
     async def typing_indicator(self, event):
         """Send typing indicator to WebSocket"""
         # Don't send typing indicator to self
         if event['user_id'] != str(self.user.id):
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'typing',
                 'user_id': event['user_id'],
                 'username': event['username'],
                 'is_typing': event['is_typing']
-            }))
+            })
     
     async def message_read_update(self, event):
-        """Send read receipt to WebSocket"""
-        await self.send(text_data=json.dumps({
+        """Send read receipt to WebSocket (one message or a batch)"""
+        payload = {
             'type': 'message_read',
-            'message_id': event['message_id'],
             'user_id': event['user_id'],
             'username': event['username']
-        }))
+        }
+        if 'message_ids' in event:
+            payload['message_ids'] = event['message_ids']
+        else:
+            payload['message_id'] = event['message_id']
+        await self.send_event(payload)
 
     async def conversation_updated(self, event):
         """Notify about conversation updates"""
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'conversation_updated',
             'conversation_id': event['conversation_id'],
             'last_message': event['last_message']
-        }))
+        })
+
+    async def presence_update(self, event):
+        """Batched online/offline changes of our contacts"""
+        await self.send_event({
+            'type': 'presence',
+            'online': event['online'],
+            'offline': event['offline']
+        })
+
+    async def membership_changed(self, event):
+        """Participants changed - drop our copy, next use reloads it"""
+        self.participants.pop(event['conversation_id'], None)
 
     async def reaction_added(self, event):
         """Send reaction update to WebSocket"""
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'reaction_added',
             'message_id': event['message_id'],
             'emoji': event['emoji'],
+            'reactions': event['reactions'],
             'user_id': event['user_id'],
             'username': event['username']
-        }))
+        })
 
-    # Database operations
-    @database_sync_to_async
-    def check_participant(self, conversation_id):
+    async def reaction_removed(self, event):
+        """Send reaction removal to WebSocket"""
+        await self.send_event({
+            'type': 'reaction_removed',
+            'message_id': event['message_id'],
+            'emoji': event['emoji'],
+            'reactions': event['reactions'],
+            'user_id': event['user_id'],
+            'username': event['username']
+        })
+
+    # Membership (per-connection copy backed by the shared cache)
+    async def get_participants(self, conversation_id):
+        """Participant IDs for a conversation - no query once warm"""
+        conversation_id = str(conversation_id)
+        participant_ids = self.participants.get(conversation_id)
+        if participant_ids is None:
+            participant_ids = await database_sync_to_async(membership.get_participant_ids)(conversation_id)
+            if participant_ids:
+                self.participants[conversation_id] = participant_ids
+        return participant_ids
+    
+    async def check_participant(self, conversation_id):
         """Check if user is participant in conversation"""
-        try:
-            conversation = Conversation.objects.get(id=conversation_id)
-            return self.user in conversation.participants.all()
-        except Conversation.DoesNotExist:
-            return False
+        return str(self.user.id) in await self.get_participants(conversation_id)
     
+    # Database operations
     @database_sync_to_async
     def save_message(self, conversation_id, content, reply_to_id=None):
-        """Save message to database"""
-        try:
-            conversation = Conversation.objects.get(id=conversation_id)
-            
-            reply_to = None
-            if reply_to_id:
-                try:
-                    reply_to = Message.objects.get(id=reply_to_id)
-                except Message.DoesNotExist:
-                    pass
-            
+        """Insert message and update the conversation pointers in one transaction"""
+        reply_to = None
+        if reply_to_id:
+            reply_to = Message.objects.filter(
+                id=reply_to_id,
+                conversation_id=conversation_id
+            ).select_related('sender').first()
+        
+        with transaction.atomic():
             message = Message.objects.create(
-                conversation=conversation,
+                conversation_id=conversation_id,
                 sender=self.user,
                 content=content,
                 reply_to=reply_to
             )
-            
-            # Update conversation timestamp
-            conversation.save()
-            
-            return message
-        except Conversation.DoesNotExist:
-            return None
-    
-    @database_sync_to_async
-    def serialize_message(self, message):
-        """Serialize message for WebSocket"""
-        factory = RequestFactory()
-        request = factory.get('/')
-        request.user = self.user
+            # Bump updated_at + last_message (also tells us it exists)
+            if not inbox.message_created(message):
+                transaction.set_rollback(True)
+                return None
+            read_state.message_created(message)
         
-        serializer = MessageSerializer(message, context={'request': request})
-        return serializer.data
-    
-    @database_sync_to_async
-    def get_message(self, message_id):
-        """Get message by ID"""
-        try:
-            return Message.objects.get(id=message_id)
-        except Message.DoesNotExist:
-            return None
+        return message, reply_to
     
     @database_sync_to_async
     def create_read_receipt(self, message_id):
-        """Create read receipt for message"""
+        """Create read receipt for message and advance the read watermark"""
         try:
             message = Message.objects.get(id=message_id)
             MessageRead.objects.get_or_create(
                 message=message,
                 user=self.user
             )
+            read_state.mark_read(message.conversation_id, self.user, message)
         except Message.DoesNotExist:
             pass
 
     @database_sync_to_async
-    def add_reaction(self, message_id, emoji):
-        """Add reaction to message"""
+    def get_message_conversation_id(self, message_id):
+        """Conversation of a visible message, or None"""
         try:
-            message = Message.objects.get(id=message_id)
-            MessageReaction.objects.get_or_create(
-                message=message,
-                user=self.user,
-                emoji=emoji
-            )
-        except Message.DoesNotExist:
-            pass
+            return Message.objects.filter(
+                id=message_id,
+                is_deleted=False
+            ).values_list('conversation_id', flat=True).first()
+        except (ValueError, ValidationError):
+            return None
 
     @database_sync_to_async
-    def get_conversation_participants(self, conversation_id):
-        """Get list of participant IDs"""
-        try:
-            conversation = Conversation.objects.get(id=conversation_id)
-            return [str(p.id) for p in conversation.participants.all()]
-        except Conversation.DoesNotExist:
-            return []
\ No newline at end of file
+    def apply_reaction(self, conversation_id, message_id, emoji, action):
+        """Apply the change and broadcast the message's new counts, like the REST action"""
+        if action == 'toggle':
+            changed = True
+            added, summary = reactions.toggle(message_id, self.user, emoji)
+        elif action == 'remove':
+            changed, summary = reactions.remove(message_id, self.user, emoji)
+            added = False
+        else:
+            changed, summary = reactions.add(message_id, self.user, emoji)
+            added = True
+        
+        if changed:
+            reactions.broadcast(conversation_id, self.user, message_id, emoji, added, summary)
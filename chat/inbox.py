@@ -0,0 +1,66 @@
+"""
+Conversation inbox.
+
+Each Conversation stores a pointer to its newest visible message, updated in
+the same transaction that writes the message. The inbox reads one page of
+conversations on the (-updated_at) index with the last message, participants
+and the viewer's read state joined or prefetched, so listing costs the same
+number of queries whatever the chat history looks like.
+"""
+
+from django.db.models import Prefetch, Subquery
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Conversation, ConversationReadState, Message
+
+
+def message_created(message):
+    """Point the conversation at a new message, returns False if it is gone"""
+    return bool(Conversation.objects.filter(id=message.conversation_id).update(
+        last_message=message,
+        updated_at=message.created_at
+    ))
+
+
+def message_deleted(message):
+    """Move the pointer back to the newest message still visible"""
+    latest = Message.objects.filter(
+        conversation_id=message.conversation_id,
+        is_deleted=False
+    ).order_by('-created_at').values('id')[:1]
+    Conversation.objects.filter(
+        id=message.conversation_id,
+        last_message=message
+    ).update(last_message=Subquery(latest))
+
+
+@receiver(post_delete, sender=Message)
+def message_removed(sender, instance, **kwargs):
+    # Hard delete (destroy, delete_account, archive): SET_NULL has already
+    # cleared the pointer if this was the newest message
+    latest = Message.objects.filter(
+        conversation_id=instance.conversation_id,
+        is_deleted=False
+    ).order_by('-created_at').values('id')[:1]
+    Conversation.objects.filter(
+        id=instance.conversation_id,
+        last_message__isnull=True
+    ).update(last_message=Subquery(latest))
+
+
+def get_inbox(user):
+    """The user's conversations with everything the inbox serializer reads"""
+    return Conversation.objects.filter(
+        participants=user
+    ).select_related(
+        'last_message__sender'
+    ).prefetch_related(
+        'participants',
+        # Only the viewer's read state - unread_count comes from it
+        Prefetch(
+            'read_states',
+            queryset=ConversationReadState.objects.filter(user=user),
+            to_attr='viewer_read_states'
+        )
+    )
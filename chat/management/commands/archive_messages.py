@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from chat import archive
+
+
+class Command(BaseCommand):
+    help = 'Move old chat messages out of chat_messages into compressed monthly segments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Archive messages older than this many days')
+        parser.add_argument('--batch-size', type=int, default=None, help='Messages moved per transaction')
+
+    def handle(self, *args, **options):
+        stats = archive.archive(days=options['days'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {stats['archived']} messages and dropped {stats['dropped']} deleted ones "
+            f"from {stats['conversations']} conversations in {stats['elapsed']:.2f}s"
+        ))
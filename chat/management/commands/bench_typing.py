@@ -0,0 +1,89 @@
+"""
+Typing indicator benchmark.
+
+Simulates users typing in bursts and counts the channel-layer group_sends
+(and socket deliveries, i.e. group_sends x room size) with one send per
+keystroke versus the TypingCoalescer. Runs on a simulated clock, so it is
+fast and deterministic.
+
+    python manage.py bench_typing --users 50 --room-size 2 --seconds 60
+"""
+
+import random
+
+from django.core.management.base import BaseCommand
+
+from chat.typing import TypingCoalescer, get_expiry, get_window
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Command(BaseCommand):
+    help = 'Compare per-keystroke typing broadcasts with coalesced typing events'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Concurrent typists')
+        parser.add_argument('--room-size', type=int, default=2, help='Sockets per conversation room')
+        parser.add_argument('--seconds', type=float, default=60.0, help='Simulated duration')
+        parser.add_argument('--keystrokes-per-second', type=float, default=5.0, help='Typing speed while in a burst')
+        parser.add_argument('--burst', type=float, default=4.0, help='Mean burst length in seconds')
+        parser.add_argument('--pause', type=float, default=6.0, help='Mean pause between bursts in seconds')
+        parser.add_argument('--window', type=float, default=None, help='Throttle window (default: CHAT_TYPING_WINDOW)')
+        parser.add_argument('--expiry', type=float, default=None, help='Auto-stop after (default: CHAT_TYPING_EXPIRY)')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        window = options['window'] if options['window'] is not None else get_window()
+        expiry = options['expiry'] if options['expiry'] is not None else get_expiry()
+        clock = SimulatedClock()
+
+        # (time, user, is_typing) client events; some bursts end with an explicit stop
+        events = []
+        interval = 1.0 / options['keystrokes_per_second']
+        for user in range(options['users']):
+            t = rng.expovariate(1.0 / options['pause'])
+            while t < options['seconds']:
+                burst_end = t + rng.expovariate(1.0 / options['burst'])
+                while t < min(burst_end, options['seconds']):
+                    events.append((t, user, True))
+                    t += interval * rng.uniform(0.5, 1.5)
+                if rng.random() < 0.5:
+                    events.append((t, user, False))
+                t += rng.expovariate(1.0 / options['pause'])
+        events.sort()
+
+        coalescers = [TypingCoalescer(window=window, expiry=expiry, clock=clock) for _ in range(options['users'])]
+        coalesced = 0
+        for at, user, is_typing in events:
+            # Fire any timers due before this event, like the consumer would
+            coalesced += self._run_timers(coalescers, clock, at)
+            clock.now = at
+            coalesced += len(coalescers[user].update(user, is_typing))
+        coalesced += self._run_timers(coalescers, clock, options['seconds'] + expiry + window)
+
+        naive = len(events)
+        room_size = options['room_size']
+        self.stdout.write(f"Typists: {options['users']}, simulated {options['seconds']:.0f}s, window {window}s, expiry {expiry}s")
+        self.stdout.write(f"  client typing events:     {naive}")
+        self.stdout.write(f"  group_sends (per event):  {naive}  -> deliveries {naive * room_size}")
+        self.stdout.write(f"  group_sends (coalesced):  {coalesced}  -> deliveries {coalesced * room_size}")
+        if coalesced:
+            self.stdout.write(self.style.SUCCESS(f"  reduction: {naive / coalesced:.1f}x"))
+
+    def _run_timers(self, coalescers, clock, until):
+        sent = 0
+        while True:
+            deadlines = [(c.next_deadline(), i) for i, c in enumerate(coalescers)]
+            deadlines = [d for d in deadlines if d[0] is not None and d[0] <= until]
+            if not deadlines:
+                return sent
+            deadline, index = min(deadlines)
+            clock.now = max(clock.now, deadline)
+            sent += len(coalescers[index].tick())
@@ -0,0 +1,16 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from chat import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the chat message full-text search index'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        indexed = search.rebuild()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {indexed} messages in {elapsed:.2f}s ({connection.vendor})'
+        ))
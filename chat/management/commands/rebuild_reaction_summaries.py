@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from chat import reactions
+
+
+class Command(BaseCommand):
+    help = 'Recount Message.reaction_summary from the message_reactions rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('message_ids', nargs='*', help='Only these messages (default: all)')
+
+    def handle(self, *args, **options):
+        fixed = reactions.rebuild_summaries(options['message_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'Fixed {fixed} reaction summaries'))
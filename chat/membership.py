@@ -0,0 +1,96 @@
+"""
+Conversation membership cache.
+
+Participant ID sets are cached in the shared cache backend (so every worker
+sees the same data) and each ChatConsumer keeps its own copy for the life of
+the connection. Any change to Conversation.participants drops the shared
+entry and sends `membership_changed` to the affected users' rooms so open
+connections drop their copy too.
+"""
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
+
+from .models import Conversation
+
+
+def _key(conversation_id):
+    return f"chat:participants:{conversation_id}"
+
+
+def get_participant_ids(conversation_id):
+    """frozenset of participant user IDs (as strings), empty if unknown"""
+    key = _key(conversation_id)
+    participant_ids = cache.get(key)
+    if participant_ids is None:
+        participant_ids = frozenset(
+            str(user_id) for user_id in Conversation.participants.through.objects.filter(
+                conversation_id=conversation_id
+            ).values_list('user_id', flat=True)
+        )
+        # Don't cache misses - the conversation may be mid-creation
+        if participant_ids:
+            cache.set(key, participant_ids, getattr(settings, 'CHAT_MEMBERSHIP_TIMEOUT', 3600))
+    return participant_ids
+
+
+def invalidate(conversation_id, user_ids=()):
+    """
+    Drop the cached set and tell connected members to drop theirs, once the
+    surrounding transaction commits (a reader before that would re-cache the
+    old set).
+    """
+    user_ids = [str(user_id) for user_id in user_ids]
+
+    def _invalidate():
+        key = _key(conversation_id)
+        affected = set(cache.get(key) or ())
+        affected.update(user_ids)
+        cache.delete(key)
+
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        for user_id in affected:
+            async_to_sync(channel_layer.group_send)(
+                f"user_{user_id}",
+                {
+                    'type': 'membership_changed',
+                    'conversation_id': str(conversation_id),
+                }
+            )
+
+    transaction.on_commit(_invalidate)
+
+
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def participants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # post_clear comes with pk_set=None - remember who is being removed
+        through = Conversation.participants.through.objects
+        if reverse:
+            instance._cleared_pks = set(through.filter(user_id=instance.pk).values_list('conversation_id', flat=True))
+        else:
+            instance._cleared_pks = set(through.filter(conversation_id=instance.pk).values_list('user_id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_cleared_pks', None)
+
+    if reverse:
+        # user.conversations.add/remove(...) - instance is the user
+        for conversation_id in pk_set or ():
+            invalidate(conversation_id, [instance.pk])
+    else:
+        invalidate(instance.pk, pk_set or ())
+
+
+@receiver(post_delete, sender=Conversation)
+def conversation_deleted(sender, instance, **kwargs):
+    invalidate(instance.pk)
@@ -4,8 +4,8 @@ from django.contrib.auth.models import AnonymousUser
 from channels.middleware import BaseMiddleware
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import AccessToken
-from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError, AuthenticationFailed
+from accounts.authentication import authenticate_token
 
 User = get_user_model()
 
@@ -13,10 +13,8 @@ User = get_user_model()
 def get_user_from_token(token):
     """Get user from JWT token"""
     try:
-        # Decode the token
-        jwt_auth = JWTAuthentication()
-        validated_token = jwt_auth.get_validated_token(token)
-        user = jwt_auth.get_user(validated_token)
+        # Validate the token, user comes from the shared jti cache
+        user, validated_token = authenticate_token(token)
         return user
 
 
@@ -26,7 +24,7 @@ def get_user_from_token(token):
         # # Get user from database
         # user = User.objects.get(id=user_id)
         # return user
-    except (InvalidToken, TokenError) as e:
+    except (InvalidToken, TokenError, AuthenticationFailed) as e:
         print(f"❌ Token validation failed: {str(e)}")
         return AnonymousUser()
 
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.9 on 2026-10-18 13:08
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def populate_read_states(apps, schema_editor):
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+    MessageRead = apps.get_model('chat', 'MessageRead')
+    ConversationReadState = apps.get_model('chat', 'ConversationReadState')
+
+    # Watermark = newest message the user sent or has a read receipt for
+    watermarks = {}
+    sent = Message.objects.values('conversation', 'sender').annotate(latest=Max('created_at'))
+    for row in sent.values_list('conversation', 'sender', 'latest'):
+        watermarks[row[:2]] = row[2]
+    read = MessageRead.objects.values('message__conversation', 'user').annotate(latest=Max('message__created_at'))
+    for conversation_id, user_id, latest in read.values_list('message__conversation', 'user', 'latest'):
+        current = watermarks.get((conversation_id, user_id))
+        if current is None or latest > current:
+            watermarks[(conversation_id, user_id)] = latest
+
+    states = []
+    memberships = Conversation.participants.through.objects.values_list('conversation_id', 'user_id')
+    for conversation_id, user_id in memberships.iterator():
+        last_read_at = watermarks.get((conversation_id, user_id))
+        unread = Message.objects.filter(conversation_id=conversation_id, is_deleted=False).exclude(sender_id=user_id)
+        if last_read_at is not None:
+            unread = unread.filter(created_at__gt=last_read_at)
+        last_read_message = None
+        if last_read_at is not None:
+            last_read_message = Message.objects.filter(
+                conversation_id=conversation_id, created_at=last_read_at
+            ).values_list('id', flat=True).first()
+        states.append(ConversationReadState(
+            conversation_id=conversation_id,
+            user_id=user_id,
+            last_read_at=last_read_at,
+            last_read_message_id=last_read_message,
+            unread_count=unread.count(),
+        ))
+    ConversationReadState.objects.bulk_create(states, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_alter_message_file'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationReadState',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('last_read_at', models.DateTimeField(blank=True, null=True)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_states', to='chat.conversation')),
+                ('last_read_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_read_states', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'chat_conversation_read_states',
+                'unique_together': {('conversation', 'user')},
+            },
+        ),
+        migrations.RunPython(populate_read_states, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.9 on 2026-10-18 13:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def populate_last_message(apps, schema_editor):
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+
+    latest = Message.objects.filter(
+        conversation=OuterRef('pk'),
+        is_deleted=False
+    ).order_by('-created_at').values('id')[:1]
+    Conversation.objects.update(last_message=Subquery(latest))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_conversationreadstate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['-updated_at'], name='chat_conver_updated_6ee585_idx'),
+        ),
+        migrations.RunPython(populate_last_message, migrations.RunPython.noop),
+    ]
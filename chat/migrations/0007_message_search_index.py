@@ -0,0 +1,81 @@
+# Full-text search index for chat messages (see chat/search.py)
+#
+# The SQL is a snapshot on purpose: chat.search may change later, this
+# migration must keep creating the index as it was at this point.
+
+from django.db import migrations
+
+SQLITE_CREATE = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS chat_message_search
+    USING fts5(content, tokenize='unicode61 remove_diacritics 2')
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_message_search_ai AFTER INSERT ON chat_messages
+    WHEN new.is_deleted = 0 AND coalesce(new.content, '') <> ''
+    BEGIN
+        INSERT INTO chat_message_search(rowid, content) VALUES (new.rowid, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_message_search_au AFTER UPDATE OF content, is_deleted ON chat_messages
+    BEGIN
+        DELETE FROM chat_message_search WHERE rowid = old.rowid;
+        INSERT INTO chat_message_search(rowid, content)
+        SELECT new.rowid, new.content WHERE new.is_deleted = 0 AND coalesce(new.content, '') <> '';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_message_search_ad AFTER DELETE ON chat_messages
+    BEGIN
+        DELETE FROM chat_message_search WHERE rowid = old.rowid;
+    END
+    """,
+    """
+    INSERT INTO chat_message_search(rowid, content)
+    SELECT rowid, content FROM chat_messages
+    WHERE is_deleted = 0 AND coalesce(content, '') <> ''
+    """,
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS chat_message_search_ai",
+    "DROP TRIGGER IF EXISTS chat_message_search_au",
+    "DROP TRIGGER IF EXISTS chat_message_search_ad",
+    "DROP TABLE IF EXISTS chat_message_search",
+]
+
+POSTGRES_CREATE = [
+    """
+    CREATE INDEX IF NOT EXISTS chat_messages_content_fts ON chat_messages
+    USING GIN (to_tsvector('simple', coalesce(content, '')))
+    """,
+]
+
+POSTGRES_DROP = [
+    "DROP INDEX IF EXISTS chat_messages_content_fts",
+]
+
+
+def _run(schema_editor, statements):
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def create_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_CREATE, 'postgresql': POSTGRES_CREATE})
+
+
+def drop_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_message_sync_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
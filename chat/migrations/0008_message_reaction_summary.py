@@ -0,0 +1,32 @@
+# Generated by Django 5.2.9 on 2026-10-18 15:02
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_reaction_summary(apps, schema_editor):
+    Message = apps.get_model('chat', 'Message')
+    MessageReaction = apps.get_model('chat', 'MessageReaction')
+
+    summaries = {}
+    counts = MessageReaction.objects.values('message_id', 'emoji').annotate(total=Count('id'))
+    for row in counts:
+        summaries.setdefault(row['message_id'], {})[row['emoji']] = row['total']
+    for message_id, summary in summaries.items():
+        Message.objects.filter(id=message_id).update(reaction_summary=summary)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_message_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='reaction_summary',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(populate_reaction_summary, migrations.RunPython.noop),
+    ]
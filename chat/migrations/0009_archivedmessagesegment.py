@@ -0,0 +1,34 @@
+# Generated by Django 5.2.9 on 2026-10-18 13:26
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_message_reaction_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedMessageSegment',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('month', models.DateField()),
+                ('first_created_at', models.DateTimeField()),
+                ('last_created_at', models.DateTimeField()),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archive_segments', to='chat.conversation')),
+            ],
+            options={
+                'db_table': 'chat_archived_message_segments',
+                'ordering': ['conversation', 'month'],
+                'unique_together': {('conversation', 'month')},
+            },
+        ),
+    ]
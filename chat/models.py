@@ -20,21 +20,27 @@ class Conversation(models.Model):
         choices=CONVERSATION_TYPES,
         default='direct'
     )
+    # Newest visible message, kept up to date on send and soft delete
+    last_message = models.ForeignKey(
+        'Message',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'chat_conversations'
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['-updated_at']),
+        ]
     
     def __str__(self):
         participant_names = ', '.join([p.username for p in self.participants.all()])
         return f"Conversation: {participant_names}"
-    
-    @property
-    def last_message(self):
-        """Get the last message in conversation"""
-        return self.messages.order_by('-created_at').first()
 
 
 class Message(models.Model):
@@ -78,6 +84,8 @@ class Message(models.Model):
         related_name='replies'
     )
     is_deleted = models.BooleanField(default=False)
+    # {emoji: count}, kept in step with MessageReaction by chat/reactions.py
+    reaction_summary = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -86,6 +94,8 @@ class Message(models.Model):
         ordering = ['created_at']
         indexes = [
             models.Index(fields=['conversation', '-created_at']),
+            # Sync streams changes after a cursor (chat/sync.py)
+            models.Index(fields=['conversation', 'updated_at']),
         ]
     
     def __str__(self):
@@ -142,3 +152,62 @@ class MessageReaction(models.Model):
     
     def __str__(self):
         return f"{self.user.username} reacted {self.emoji} to message"
+
+
+class ConversationReadState(models.Model):
+    """Per-participant read watermark and unread counter for a conversation"""
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    conversation = models.ForeignKey(
+        Conversation,
+        on_delete=models.CASCADE,
+        related_name='read_states'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='conversation_read_states'
+    )
+    last_read_message = models.ForeignKey(
+        Message,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    last_read_at = models.DateTimeField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'chat_conversation_read_states'
+        unique_together = ['conversation', 'user']
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.unread_count} unread"
+
+
+class ArchivedMessageSegment(models.Model):
+    """One month of a conversation's archived messages, compressed (chat/archive.py)"""
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    conversation = models.ForeignKey(
+        Conversation,
+        on_delete=models.CASCADE,
+        related_name='archive_segments'
+    )
+    month = models.DateField()
+    first_created_at = models.DateTimeField()
+    last_created_at = models.DateTimeField()
+    message_count = models.PositiveIntegerField(default=0)
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'chat_archived_message_segments'
+        unique_together = ['conversation', 'month']
+        ordering = ['conversation', 'month']
+    
+    def __str__(self):
+        return f"{self.message_count} archived messages ({self.month:%Y-%m})"
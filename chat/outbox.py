@@ -0,0 +1,145 @@
+"""
+Per-connection outbound queue.
+
+ChatConsumer never writes frames from its event handlers directly. Events
+go into an Outbox and a writer task sends them:
+
+- events arriving within CHAT_OUTBOX_BATCH_WINDOW of each other go out
+  together (as one `batch` frame for clients on a compact protocol, one
+  frame each for legacy JSON clients)
+- above CHAT_OUTBOX_HIGH_WATER queued events, typing and presence events
+  are coalesced: only the newest state per (type, user_id[, conversation_id])
+  is kept, so the client still ends up with every user's latest state
+- a client that stays above the high-water mark for CHAT_OUTBOX_SLOW_TIMEOUT
+  seconds, or reaches CHAT_OUTBOX_MAX_EVENTS, is disconnected
+- a send that raises is logged and the socket is closed
+
+The queue only grows when `send` is slow to return, i.e. on servers that
+propagate socket backpressure to the application.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SLOW_CLIENT_CLOSE_CODE = 4008
+SEND_ERROR_CLOSE_CODE = 1011
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class Outbox:
+    """Bounded event queue + writer task for one connection"""
+
+    def __init__(self, send_frames, on_slow, on_error=None, batch_window=None, max_batch=None,
+                 high_water=None, max_events=None, slow_timeout=None, clock=time.monotonic):
+        self.send_frames = send_frames
+        self.on_slow = on_slow
+        self.on_error = on_error
+        self.batch_window = _setting('CHAT_OUTBOX_BATCH_WINDOW', 0.005) if batch_window is None else batch_window
+        self.max_batch = _setting('CHAT_OUTBOX_MAX_BATCH', 50) if max_batch is None else max_batch
+        self.high_water = _setting('CHAT_OUTBOX_HIGH_WATER', 200) if high_water is None else high_water
+        self.max_events = _setting('CHAT_OUTBOX_MAX_EVENTS', 1000) if max_events is None else max_events
+        self.slow_timeout = _setting('CHAT_OUTBOX_SLOW_TIMEOUT', 10) if slow_timeout is None else slow_timeout
+        self.clock = clock
+
+        self.queue = deque()
+        self.dropped = 0
+        self.slow_since = None
+        self.closed = False
+        self._ready = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        self.closed = True
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def put(self, event):
+        """Queue an event (never blocks)"""
+        if self.closed:
+            return
+        self.queue.append(event)
+        self._ready.set()
+        if len(self.queue) > self.high_water:
+            self._drained.clear()
+            self._shed()
+
+    async def wait_drained(self):
+        """Wait until the queue is back under the high-water mark"""
+        await self._drained.wait()
+
+    def _shed(self):
+        # Newest first: an older typing state, or an older online/offline
+        # change of the same user, is superseded and can go
+        kept = deque()
+        typing_seen = set()
+        presence_seen = set()
+        for event in reversed(self.queue):
+            event_type = event.get('type')
+            if event_type == 'typing':
+                key = (event.get('user_id'), event.get('conversation_id'))
+                if key in typing_seen:
+                    self.dropped += 1
+                    continue
+                typing_seen.add(key)
+            elif event_type == 'presence':
+                online = [user_id for user_id in event['online'] if user_id not in presence_seen]
+                offline = [user_id for user_id in event['offline'] if user_id not in presence_seen]
+                presence_seen.update(event['online'], event['offline'])
+                if not online and not offline:
+                    self.dropped += 1
+                    continue
+                event = dict(event, online=online, offline=offline)
+            kept.appendleft(event)
+        self.queue = kept
+
+        if len(self.queue) <= self.high_water:
+            return
+        now = self.clock()
+        if self.slow_since is None:
+            self.slow_since = now
+        if len(self.queue) >= self.max_events or now - self.slow_since >= self.slow_timeout:
+            self.closed = True
+            self.queue.clear()
+            asyncio.ensure_future(self.on_slow())
+
+    async def _run(self):
+        while not self.closed:
+            await self._ready.wait()
+            if self.batch_window and len(self.queue) < self.max_batch:
+                await asyncio.sleep(self.batch_window)
+
+            events = []
+            while self.queue and len(events) < self.max_batch:
+                events.append(self.queue.popleft())
+            if not self.queue:
+                self._ready.clear()
+            if len(self.queue) <= self.high_water:
+                self.slow_since = None
+                self._drained.set()
+
+            if events:
+                try:
+                    await self.send_frames(events)
+                except Exception:
+                    logger.exception("Outbox send failed, closing the socket")
+                    self.closed = True
+                    self.queue.clear()
+                    if self.on_error is not None:
+                        await self.on_error()
+                    return
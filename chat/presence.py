@@ -0,0 +1,289 @@
+"""
+Online presence.
+
+Every open chat socket is a member of its user's connection set
+(`presence:conns:<user_id>`), scored with the time it expires. Each socket
+refreshes its expiry every CHAT_PRESENCE_TTL / 3 seconds and on inbound
+frames, so sockets that die without a disconnect (crashed worker, lost
+network) stop counting CHAT_PRESENCE_TTL seconds after their last refresh.
+A user is online while any of their connections is live - the count is
+always recomputed from the set, never kept as a separate counter.
+
+Online users are also listed in an index (`presence:index`) scored with
+their newest connection's expiry. One worker per interval sweeps it and
+announces users whose connections all lapsed as offline - nobody else
+would, since their socket never disconnected.
+
+On the Redis cache backend both are native sorted sets (ZADD / ZREM in one
+MULTI per change, no read-modify-write). Any other backend is per process
+anyway, so a process-local store is used.
+
+Online/offline transitions are not sent one by one: they are collected for
+CHAT_PRESENCE_BATCH_INTERVAL seconds and every contact (anyone sharing a
+conversation) gets one `presence_update` with the whole diff in their
+`user_<id>` room.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
+
+from .models import Conversation
+
+logger = logging.getLogger(__name__)
+
+
+def get_ttl():
+    return getattr(settings, 'CHAT_PRESENCE_TTL', 90)
+
+
+def get_batch_interval():
+    return getattr(settings, 'CHAT_PRESENCE_BATCH_INTERVAL', 1.0)
+
+
+def get_refresh_interval():
+    return get_ttl() / 3
+
+
+INDEX_KEY = 'presence:index'
+SWEEP_LOCK_KEY = 'presence:sweep'
+
+
+def _conns_key(user_id):
+    return f"presence:conns:{user_id}"
+
+
+class RedisPresenceStore:
+    """Connection sets and the index as Redis sorted sets"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def _client(self):
+        return self.backend._cache.get_client(write=True)
+
+    def _key(self, key):
+        return self.backend.make_and_validate_key(key)
+
+    def refresh(self, user_id, connection_id, now, expires_at):
+        """Add or refresh a connection, returns the live count before it"""
+        conns = self._key(_conns_key(user_id))
+        pipe = self._client().pipeline()
+        pipe.zremrangebyscore(conns, '-inf', now)
+        pipe.zcard(conns)
+        pipe.zadd(conns, {connection_id: expires_at})
+        pipe.expire(conns, int(expires_at - now) + 1)
+        pipe.zadd(self._key(INDEX_KEY), {str(user_id): expires_at}, gt=True)
+        # zcard ran after the prune but before our zadd
+        return pipe.execute()[1]
+
+    def remove(self, user_id, connection_id, now):
+        """Drop a connection, returns the live count after it"""
+        conns = self._key(_conns_key(user_id))
+        pipe = self._client().pipeline()
+        pipe.zrem(conns, connection_id)
+        pipe.zremrangebyscore(conns, '-inf', now)
+        pipe.zcard(conns)
+        count = pipe.execute()[2]
+        if not count:
+            client = self._client()
+            client.zrem(self._key(INDEX_KEY), str(user_id))
+            # Another tab may have connected meanwhile - keep it indexed
+            newest = client.zrange(conns, -1, -1, withscores=True)
+            if newest and newest[0][1] > now:
+                client.zadd(self._key(INDEX_KEY), {str(user_id): newest[0][1]}, gt=True)
+        return count
+
+    def online(self, user_ids, now):
+        pipe = self._client().pipeline()
+        for user_id in user_ids:
+            pipe.zcount(self._key(_conns_key(user_id)), f'({now}', '+inf')
+        return {user_id: bool(live) for user_id, live in zip(user_ids, pipe.execute())}
+
+    def lapsed(self, now):
+        """Remove and return indexed users with no live connection"""
+        client = self._client()
+        index = self._key(INDEX_KEY)
+        candidates = [member.decode() for member in client.zrangebyscore(index, '-inf', now)]
+        if not candidates:
+            return []
+        client.zremrangebyscore(index, '-inf', now)
+        # A refresh racing the sweep keeps its user online
+        pipe = client.pipeline()
+        for user_id in candidates:
+            pipe.zcount(self._key(_conns_key(user_id)), f'({now}', '+inf')
+        return [user_id for user_id, live in zip(candidates, pipe.execute()) if not live]
+
+
+class LocalPresenceStore:
+    """Same operations in process memory (locmem and other per-process caches)"""
+
+    def __init__(self):
+        self.conns = defaultdict(dict)
+        self.index = {}
+        self.lock = threading.Lock()
+
+    def _prune(self, user_id, now):
+        conns = self.conns.get(user_id, {})
+        for connection_id, expires_at in list(conns.items()):
+            if expires_at <= now:
+                del conns[connection_id]
+        return conns
+
+    def refresh(self, user_id, connection_id, now, expires_at):
+        user_id = str(user_id)
+        with self.lock:
+            live_before = len(self._prune(user_id, now))
+            self.conns[user_id][connection_id] = expires_at
+            self.index[user_id] = max(self.index.get(user_id, 0), expires_at)
+        return live_before
+
+    def remove(self, user_id, connection_id, now):
+        user_id = str(user_id)
+        with self.lock:
+            conns = self._prune(user_id, now)
+            conns.pop(connection_id, None)
+            count = len(conns)
+            if not count:
+                self.conns.pop(user_id, None)
+                self.index.pop(user_id, None)
+        return count
+
+    def online(self, user_ids, now):
+        with self.lock:
+            return {user_id: bool(self._prune(str(user_id), now)) for user_id in user_ids}
+
+    def lapsed(self, now):
+        with self.lock:
+            candidates = [user_id for user_id, expires_at in self.index.items() if expires_at <= now]
+            lapsed = []
+            for user_id in candidates:
+                del self.index[user_id]
+                if not self._prune(user_id, now):
+                    self.conns.pop(user_id, None)
+                    lapsed.append(user_id)
+        return lapsed
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = caches['default']
+                _store = RedisPresenceStore(backend) if isinstance(backend, RedisCache) else LocalPresenceStore()
+    return _store
+
+
+def connect(user_id, connection_id):
+    """Count a new socket, returns True if the user just came online"""
+    now = time.time()
+    return get_store().refresh(user_id, connection_id, now, now + get_ttl()) == 0
+
+
+def disconnect(user_id, connection_id):
+    """Drop a socket, returns True if the user just went offline"""
+    return get_store().remove(user_id, connection_id, time.time()) == 0
+
+
+def heartbeat(user_id, connection_id):
+    """Keep the socket counted, returns True if the user had lapsed (back online)"""
+    now = time.time()
+    return get_store().refresh(user_id, connection_id, now, now + get_ttl()) == 0
+
+
+def get_online(user_ids):
+    """{user_id: is_online} with one cache round trip"""
+    return get_store().online(list(user_ids), time.time())
+
+
+def get_contact_ids(user_id):
+    """Users sharing at least one conversation with user_id"""
+    Participant = Conversation.participants.through
+    return set(
+        str(contact_id) for contact_id in Participant.objects.filter(
+            conversation__participants=user_id
+        ).exclude(user_id=user_id).values_list('user_id', flat=True).distinct()
+    )
+
+
+def sweep_lapsed():
+    """
+    {user_id: contact_ids} of indexed users whose connections all expired.
+    Only one worker sweeps per refresh interval.
+    """
+    if not cache.add(SWEEP_LOCK_KEY, 1, max(1, int(get_refresh_interval()))):
+        return {}
+    lapsed = get_store().lapsed(time.time())
+    return {user_id: get_contact_ids(user_id) for user_id in lapsed}
+
+
+async def _sweep_forever():
+    while True:
+        await asyncio.sleep(get_refresh_interval())
+        try:
+            lapsed = await database_sync_to_async(sweep_lapsed)()
+            for user_id, contact_ids in lapsed.items():
+                batcher.add(user_id, False, contact_ids)
+        except Exception:
+            logger.exception("Presence sweep failed")
+
+
+_sweep_task = None
+
+
+def start_sweeper():
+    """Start this process's lapsed-presence sweep (once per event loop)"""
+    global _sweep_task
+    loop = asyncio.get_running_loop()
+    if _sweep_task is None or _sweep_task.done() or _sweep_task.get_loop() is not loop:
+        _sweep_task = loop.create_task(_sweep_forever())
+
+
+class PresenceBatcher:
+    """Collects presence changes and sends one diff per recipient per interval"""
+
+    def __init__(self, interval=None):
+        self.interval = interval
+        self.pending = defaultdict(dict)
+        self.task = None
+
+    def add(self, user_id, online, recipient_ids):
+        for recipient_id in recipient_ids:
+            # Last state in the window wins
+            self.pending[str(recipient_id)][str(user_id)] = online
+        if self.pending and (self.task is None or self.task.done()):
+            self.task = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        interval = self.interval if self.interval is not None else get_batch_interval()
+        await asyncio.sleep(interval)
+        await self.flush()
+
+    async def flush(self):
+        pending, self.pending = self.pending, defaultdict(dict)
+        channel_layer = get_channel_layer()
+        for recipient_id, changes in pending.items():
+            await channel_layer.group_send(
+                f"user_{recipient_id}",
+                {
+                    'type': 'presence_update',
+                    'online': [user_id for user_id, online in changes.items() if online],
+                    'offline': [user_id for user_id, online in changes.items() if not online],
+                }
+            )
+
+
+batcher = PresenceBatcher()
@@ -0,0 +1,131 @@
+"""
+WebSocket wire protocols for ChatConsumer.
+
+The client picks one with the WebSocket subprotocol header:
+
+- (none)           full JSON payloads as before
+- `pixora.json`    compact schema, JSON text frames
+- `pixora.msgpack` compact schema, msgpack binary frames
+
+On compact protocols the server may also send `{"type": "batch", "events": [...]}`
+frames carrying several events at once (see chat/outbox.py).
+
+In the compact schema a message carries `sender_id` instead of a nested user
+object, and empty optional fields (`file`, `file_url`, `reply_to`,
+`read_receipts`, `reactions`, `my_reactions`) are left out. Each connection
+remembers which users it has already described: the first frame mentioning
+a user carries their summary in a `users` map, later frames only the ID.
+"""
+
+import json
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack is in requirements.txt
+    msgpack = None
+
+OPTIONAL_MESSAGE_FIELDS = ('file', 'file_url', 'reply_to', 'read_receipts', 'reactions', 'my_reactions')
+
+
+class JSONProtocol:
+    """Default protocol - full payloads as JSON text frames"""
+
+    name = None
+    compact = False
+    batching = False
+
+    def __init__(self):
+        self.known_users = set()
+
+    def encode(self, event):
+        """Event dict -> (text_data, bytes_data) for AsyncWebsocketConsumer.send"""
+        if self.compact:
+            event = self.compact_event(event)
+        return self.dumps(event)
+
+    def encode_batch(self, events):
+        """Several events as one batch frame (compact protocols only)"""
+        return self.dumps({'type': 'batch', 'events': [self.compact_event(event) for event in events]})
+
+    def dumps(self, event):
+        return json.dumps(event), None
+
+    def decode(self, text_data=None, bytes_data=None):
+        """Incoming frame -> dict, ValueError if it can't be parsed"""
+        return json.loads(text_data if text_data is not None else bytes_data)
+
+    def compact_event(self, event):
+        event = dict(event)
+        users = {}
+
+        # Users described by an earlier frame (e.g. sync_batch) need no repeat
+        for user_id, summary in (event.pop('users', None) or {}).items():
+            if user_id not in self.known_users:
+                self.known_users.add(user_id)
+                users[user_id] = summary
+
+        for field in ('message', 'last_message'):
+            if isinstance(event.get(field), dict):
+                event[field] = self.compact_message(event[field], users)
+
+        if 'username' in event and event.get('user_id') in self.known_users:
+            del event['username']
+
+        if users:
+            event['users'] = users
+        return event
+
+    def compact_message(self, message, users):
+        message = dict(message)
+        sender = message.pop('sender', None)
+        if isinstance(sender, dict):
+            sender_id = str(sender['id'])
+            message['sender_id'] = sender_id
+            if sender_id not in self.known_users:
+                self.known_users.add(sender_id)
+                users[sender_id] = {key: value for key, value in sender.items() if key != 'id'}
+
+        for field in OPTIONAL_MESSAGE_FIELDS:
+            if field in message and not message[field]:
+                del message[field]
+        return message
+
+
+class CompactJSONProtocol(JSONProtocol):
+    """Compact schema, JSON text frames"""
+
+    name = 'pixora.json'
+    compact = True
+    batching = True
+
+
+class MsgpackProtocol(JSONProtocol):
+    """Compact schema, msgpack binary frames"""
+
+    name = 'pixora.msgpack'
+    compact = True
+    batching = True
+
+    def dumps(self, event):
+        return None, msgpack.packb(event, use_bin_type=True)
+
+    def decode(self, text_data=None, bytes_data=None):
+        if bytes_data is None:
+            # Clients may still send text frames
+            return super().decode(text_data)
+        try:
+            return msgpack.unpackb(bytes_data, raw=False)
+        except Exception as e:
+            raise ValueError(f"Invalid msgpack frame: {str(e)}")
+
+
+# Server preference order when the client offers several
+PROTOCOLS = [MsgpackProtocol, CompactJSONProtocol] if msgpack else [CompactJSONProtocol]
+
+
+def negotiate(requested):
+    """Pick a protocol from the client's subprotocol list"""
+    for protocol in PROTOCOLS:
+        if protocol.name in (requested or ()):
+            return protocol()
+    return JSONProtocol()
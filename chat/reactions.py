@@ -0,0 +1,112 @@
+"""
+Message reactions.
+
+Each Message keeps `reaction_summary` ({emoji: count}) next to its
+MessageReaction rows. The summary is changed in the same transaction as the
+row, with the message row locked, so showing counts never means loading
+reaction rows. Every change also bumps Message.updated_at so reconnect sync
+(chat/sync.py) picks up the new summary.
+"""
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Message, MessageReaction
+
+MAX_EMOJI_LENGTH = MessageReaction._meta.get_field('emoji').max_length
+
+
+def _apply(message_id, emoji, delta):
+    """Add delta to one emoji count under a row lock, returns the new summary"""
+    message = Message.objects.select_for_update().only('id', 'reaction_summary').get(id=message_id)
+    summary = dict(message.reaction_summary or {})
+    count = summary.get(emoji, 0) + delta
+    if count > 0:
+        summary[emoji] = count
+    else:
+        summary.pop(emoji, None)
+    Message.objects.filter(id=message_id).update(reaction_summary=summary, updated_at=timezone.now())
+    return summary
+
+
+def add(message_id, user, emoji):
+    """Returns (added, summary) - added is False if the user had already reacted"""
+    with transaction.atomic():
+        _, created = MessageReaction.objects.get_or_create(message_id=message_id, user=user, emoji=emoji)
+        if not created:
+            return False, Message.objects.values_list('reaction_summary', flat=True).get(id=message_id)
+        return True, _apply(message_id, emoji, 1)
+
+
+def remove(message_id, user, emoji):
+    """Returns (removed, summary)"""
+    with transaction.atomic():
+        deleted, _ = MessageReaction.objects.filter(message_id=message_id, user=user, emoji=emoji).delete()
+        if not deleted:
+            return False, Message.objects.values_list('reaction_summary', flat=True).get(id=message_id)
+        return True, _apply(message_id, emoji, -1)
+
+
+def toggle(message_id, user, emoji):
+    """Add the reaction if missing, remove it otherwise. Returns (added, summary)"""
+    removed, summary = remove(message_id, user, emoji)
+    if removed:
+        return False, summary
+    return add(message_id, user, emoji)
+
+
+def viewer_reactions(user, message_ids):
+    """{message_id: [emoji, ...]} the user reacted with, in one query"""
+    reacted = {}
+    rows = MessageReaction.objects.filter(user=user, message_id__in=message_ids).values_list('message_id', 'emoji')
+    for message_id, emoji in rows:
+        reacted.setdefault(message_id, []).append(emoji)
+    return reacted
+
+
+def broadcast(conversation_id, user, message_id, emoji, added, summary):
+    """reaction_added / reaction_removed event with the message's new counts"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(channel_layer.group_send)(
+        f"conversation_{conversation_id}",
+        {
+            'type': 'reaction_added' if added else 'reaction_removed',
+            'message_id': str(message_id),
+            'emoji': emoji,
+            'reactions': summary,
+            'user_id': str(user.id),
+            'username': user.username
+        }
+    )
+
+
+def rebuild_summaries(message_ids=None):
+    """
+    Recount summaries from MessageReaction rows (repair). Summaries with no
+    rows behind them are reset to {}. Returns the number of messages fixed.
+    """
+    counts = MessageReaction.objects.values('message_id', 'emoji').annotate(total=Count('id'))
+    stored = Message.objects.exclude(reaction_summary={})
+    if message_ids is not None:
+        counts = counts.filter(message_id__in=message_ids)
+        stored = stored.filter(id__in=message_ids)
+
+    fixed = 0
+    with transaction.atomic():
+        summaries = {}
+        for row in counts:
+            summaries.setdefault(row['message_id'], {})[row['emoji']] = row['total']
+        stored = dict(stored.select_for_update().values_list('id', 'reaction_summary'))
+
+        now = timezone.now()
+        for message_id in stored.keys() | summaries.keys():
+            summary = summaries.get(message_id, {})
+            if stored.get(message_id, {}) != summary:
+                Message.objects.filter(id=message_id).update(reaction_summary=summary, updated_at=now)
+                fixed += 1
+    return fixed
@@ -0,0 +1,159 @@
+"""
+Read watermarks and unread counters.
+
+Every participant has one ConversationReadState row. `last_read_at` is the
+created_at of the newest message they have read, and everything after it
+from other senders is unread. `unread_count` is kept in step on every write:
+a new message increments it for the other participants, and reading
+recounts only the messages that are still after the watermark. The
+conversation list reads it straight from the row, so an unread badge costs
+the same no matter how long the history is.
+"""
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
+
+from .models import Conversation, ConversationReadState, Message, MessageRead
+
+RECEIPT_BATCH_SIZE = 500
+
+
+def ensure_states(conversation_id, user_ids):
+    """Create missing read state rows (new participants start fully read)"""
+    ConversationReadState.objects.bulk_create(
+        [ConversationReadState(conversation_id=conversation_id, user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True
+    )
+
+
+def message_created(message):
+    """
+    One UPDATE for a new message: +1 unread for everyone else, and the
+    sender's watermark moves to their own message.
+    """
+    is_sender = Q(user_id=message.sender_id)
+    ConversationReadState.objects.filter(conversation_id=message.conversation_id).update(
+        unread_count=Case(When(is_sender, then=Value(0)), default=F('unread_count') + 1),
+        last_read_at=Case(When(is_sender, then=Value(message.created_at)), default=F('last_read_at')),
+        last_read_message=Case(When(is_sender, then=Value(message.id)), default=F('last_read_message')),
+    )
+
+
+def message_deleted(message):
+    """A soft-deleted message no longer counts as unread for anyone"""
+    ConversationReadState.objects.filter(
+        conversation_id=message.conversation_id,
+        unread_count__gt=0
+    ).exclude(
+        user_id=message.sender_id
+    ).filter(
+        Q(last_read_at__isnull=True) | Q(last_read_at__lt=message.created_at)
+    ).update(unread_count=F('unread_count') - 1)
+
+
+def count_unread(conversation_id, user_id, after):
+    """Messages from others after the watermark (index range on conversation, created_at)"""
+    messages = Message.objects.filter(
+        conversation_id=conversation_id,
+        is_deleted=False
+    ).exclude(sender_id=user_id)
+    if after is not None:
+        messages = messages.filter(created_at__gt=after)
+    return messages.count()
+
+
+def mark_read(conversation_id, user, message=None):
+    """
+    Move the user's watermark up to `message` (default: the newest message)
+    and recount what is left. Never moves the watermark backwards.
+    Returns the new unread count.
+    """
+    if message is None:
+        message = Message.objects.filter(
+            conversation_id=conversation_id
+        ).only('id', 'created_at').order_by('-created_at').first()
+
+    with transaction.atomic():
+        state, _ = ConversationReadState.objects.select_for_update().get_or_create(
+            conversation_id=conversation_id,
+            user=user
+        )
+        if message is not None and (state.last_read_at is None or message.created_at > state.last_read_at):
+            state.last_read_at = message.created_at
+            state.last_read_message_id = message.id
+        state.unread_count = count_unread(conversation_id, user.id, state.last_read_at)
+        state.save(update_fields=['last_read_at', 'last_read_message', 'unread_count', 'updated_at'])
+    return state.unread_count
+
+
+def mark_all_read(conversation_id, user):
+    """
+    Mark every unread message in a conversation as read with set-based
+    writes: one SELECT of the unread IDs past the watermark, batched
+    conflict-ignoring receipt inserts and one watermark advance. Messages
+    up to the watermark are already read, so the scan never covers the
+    whole history. Returns the newly read message IDs.
+    """
+    with transaction.atomic():
+        state, _ = ConversationReadState.objects.select_for_update().get_or_create(
+            conversation_id=conversation_id,
+            user=user
+        )
+        messages = Message.objects.filter(
+            conversation_id=conversation_id,
+            is_deleted=False
+        ).exclude(sender=user)
+        if state.last_read_at is not None:
+            messages = messages.filter(created_at__gt=state.last_read_at)
+        message_ids = list(
+            messages.exclude(read_receipts__user=user).values_list('id', flat=True)
+        )
+
+        MessageRead.objects.bulk_create(
+            [MessageRead(message_id=message_id, user=user) for message_id in message_ids],
+            batch_size=RECEIPT_BATCH_SIZE,
+            ignore_conflicts=True
+        )
+        mark_read(conversation_id, user)
+    return message_ids
+
+
+def broadcast_read(conversation_id, user, message_ids):
+    """One coalesced message_read_update for a batch of messages"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None or not message_ids:
+        return
+    async_to_sync(channel_layer.group_send)(
+        f"conversation_{conversation_id}",
+        {
+            'type': 'message_read_update',
+            'message_ids': [str(message_id) for message_id in message_ids],
+            'user_id': str(user.id),
+            'username': user.username
+        }
+    )
+
+
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def participants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != 'post_add' or not pk_set:
+        return
+
+    if reverse:
+        # user.conversations.add(...) - instance is the user
+        for conversation_id in pk_set:
+            ensure_states(conversation_id, [instance.pk])
+    else:
+        ensure_states(instance.pk, pk_set)
+
+
+@receiver(post_delete, sender=Message)
+def message_removed(sender, instance, **kwargs):
+    # Hard delete (destroy, delete_account, archive) - soft deleted
+    # messages were already taken off the counters
+    if not instance.is_deleted:
+        message_deleted(instance)
@@ -0,0 +1,148 @@
+"""
+Full-text search over chat messages.
+
+- SQLite: an FTS5 table `chat_message_search` keyed by the rowid of
+  chat_messages. Triggers on chat_messages keep it in step: inserts add the
+  message, edits and soft deletes replace or remove it, deletes remove it.
+  Migration 0007 creates them. SQLite drops triggers when a migration
+  rebuilds chat_messages, so after every migrate `ensure_index()` puts them
+  back and rebuilds the index.
+- PostgreSQL: a GIN index on to_tsvector('simple', content), which the
+  database maintains itself.
+- Other databases: falls back to icontains.
+
+Results are always limited to conversations the caller is a participant of
+and skip soft-deleted messages.
+"""
+
+import re
+import uuid
+
+from django.db import connection
+
+from .models import Conversation, Message
+
+FTS_TABLE = 'chat_message_search'
+PG_INDEX = 'chat_messages_content_fts'
+
+SQLITE_TRIGGERS = {
+    'chat_message_search_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS chat_message_search_ai AFTER INSERT ON chat_messages
+        WHEN new.is_deleted = 0 AND coalesce(new.content, '') <> ''
+        BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.rowid, new.content);
+        END
+    """,
+    'chat_message_search_au': f"""
+        CREATE TRIGGER IF NOT EXISTS chat_message_search_au AFTER UPDATE OF content, is_deleted ON chat_messages
+        BEGIN
+            DELETE FROM {FTS_TABLE} WHERE rowid = old.rowid;
+            INSERT INTO {FTS_TABLE}(rowid, content)
+            SELECT new.rowid, new.content WHERE new.is_deleted = 0 AND coalesce(new.content, '') <> '';
+        END
+    """,
+    'chat_message_search_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS chat_message_search_ad AFTER DELETE ON chat_messages
+        BEGIN
+            DELETE FROM {FTS_TABLE} WHERE rowid = old.rowid;
+        END
+    """,
+}
+
+
+def rebuild(conn=None):
+    """Re-index every visible message, returns the number indexed"""
+    conn = conn or connection
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}(rowid, content) "
+                f"SELECT rowid, content FROM chat_messages "
+                f"WHERE is_deleted = 0 AND coalesce(content, '') <> ''"
+            )
+            return cursor.rowcount
+        if conn.vendor == 'postgresql':
+            cursor.execute(f"REINDEX INDEX {PG_INDEX}")
+    return Message.objects.filter(is_deleted=False).count()
+
+
+def _sqlite_installed(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name = %s OR (type = 'trigger' AND tbl_name = 'chat_messages')",
+            [FTS_TABLE]
+        )
+        names = {row[0] for row in cursor.fetchall()}
+    return FTS_TABLE in names, set(SQLITE_TRIGGERS) <= names
+
+
+def ensure_index(sender=None, using='default', **kwargs):
+    """post_migrate receiver: put back triggers a table rebuild dropped"""
+    from django.db import connections
+
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return
+    has_table, has_triggers = _sqlite_installed(conn)
+    if has_table and not has_triggers:
+        with conn.cursor() as cursor:
+            for sql in SQLITE_TRIGGERS.values():
+                cursor.execute(sql)
+        # Row ids may have changed with the rebuilt table
+        rebuild(conn)
+
+
+def _fts_query(text):
+    """User text -> safe FTS5 query: every word must match, last one as a prefix"""
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search(user, text, conversation_id=None, limit=20):
+    """Best matching visible messages in the user's conversations"""
+    conversation_ids = Conversation.participants.through.objects.filter(
+        user_id=user.id
+    ).values('conversation_id')
+    if conversation_id is not None:
+        conversation_ids = conversation_ids.filter(conversation_id=conversation_id)
+
+    messages = Message.objects.filter(
+        conversation_id__in=conversation_ids,
+        is_deleted=False
+    ).select_related('sender', 'reply_to__sender').prefetch_related('read_receipts__user')
+
+    if connection.vendor == 'sqlite' and _sqlite_installed(connection)[0]:
+        query = _fts_query(text)
+        if query is None:
+            return []
+        scope_sql, scope_params = conversation_ids.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT m.id FROM {FTS_TABLE} JOIN chat_messages m ON m.rowid = {FTS_TABLE}.rowid "
+                f"WHERE {FTS_TABLE} MATCH %s AND m.is_deleted = 0 AND m.conversation_id IN ({scope_sql}) "
+                f"ORDER BY {FTS_TABLE}.rank LIMIT %s",
+                [query, *scope_params, limit]
+            )
+            ids = [uuid.UUID(row[0]) if isinstance(row[0], str) else row[0] for row in cursor.fetchall()]
+        found = {message.id: message for message in messages.filter(id__in=ids)}
+        return [found[message_id] for message_id in ids if message_id in found]
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        # Same expression as the GIN index, so the planner can use it
+        document = SearchVector('content', config='simple')
+        query = SearchQuery(text, config='simple')
+        return list(
+            messages.annotate(document=document, rank=SearchRank(document, query))
+            .filter(document=query)
+            .order_by('-rank')[:limit]
+        )
+
+    return list(messages.filter(content__icontains=text).order_by('-created_at')[:limit])
+
@@ -1,36 +1,62 @@
 from rest_framework import serializers
-from .models import Conversation, Message, MessageRead
-from accounts.serializers import UserSerializer
+from .models import Conversation, Message, MessageRead, ConversationReadState
+from . import reactions
+from accounts.serializers import UserSerializer, UserSummarySerializer
+from uploads.serializers import UploadIdField, claim_upload
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.http.request import split_domain_port, validate_host
 
 User = get_user_model()
 
 class MessageReadSerializer(serializers.ModelSerializer):
     """Serializer for message read receipts"""
     
-    user = UserSerializer(read_only=True)
+    user = UserSummarySerializer(read_only=True)
     
     class Meta:
         model = MessageRead
         fields = ['id', 'user', 'read_at']
 
+class MessageListSerializer(serializers.ListSerializer):
+    """Loads the viewer's reactions and read receipts for the whole page"""
+    
+    def to_representation(self, data):
+        messages = list(data.all() if hasattr(data, 'all') else data)
+        
+        request = self.context.get('request')
+        if request and request.user.is_authenticated and messages:
+            message_ids = [message.id for message in messages]
+            self.context['viewer_reactions'] = reactions.viewer_reactions(request.user, message_ids)
+            self.context['read_message_ids'] = set(MessageRead.objects.filter(
+                user=request.user,
+                message_id__in=message_ids
+            ).values_list('message_id', flat=True))
+        
+        return super().to_representation(messages)
+
 class MessageSerializer(serializers.ModelSerializer):
     """Serializer for chat messages"""
     
-    sender = UserSerializer(read_only=True)
+    sender = UserSummarySerializer(read_only=True)
     reply_to = serializers.SerializerMethodField()
     read_receipts = MessageReadSerializer(many=True, read_only=True)
     file_url = serializers.SerializerMethodField()
     is_read = serializers.SerializerMethodField()
+    reactions = serializers.JSONField(source='reaction_summary', read_only=True)
+    my_reactions = serializers.SerializerMethodField()
+    upload_id = UploadIdField()
     
     class Meta:
         model = Message
         fields = [
             'id', 'conversation', 'sender', 'content', 
             'message_type', 'file', 'file_url', 'reply_to',
-            'is_deleted', 'created_at', 'read_receipts', 'is_read'
+            'is_deleted', 'created_at', 'read_receipts', 'is_read',
+            'reactions', 'my_reactions', 'upload_id'
         ]
         read_only_fields = ['id', 'sender', 'created_at']
+        list_serializer_class = MessageListSerializer
     
     def get_file_url(self, obj):
         """Get full file URL"""
@@ -55,8 +81,8 @@ class MessageSerializer(serializers.ModelSerializer):
         data = super().to_representation(instance)
         # Convert UUID fields to strings
         data['id'] = str(instance.id)
-        data['conversation'] = str(instance.conversation.id)
-        data['sender']['id'] = str(instance.sender.id)
+        data['conversation'] = str(instance.conversation_id)
+        data['sender']['id'] = str(instance.sender_id)
         if instance.reply_to:
             data['reply_to']['id'] = str(instance.reply_to.id)
         return data
@@ -65,12 +91,25 @@ class MessageSerializer(serializers.ModelSerializer):
         """Check if current user has read the message"""
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            read_message_ids = self.context.get('read_message_ids')
+            if read_message_ids is not None:
+                return obj.id in read_message_ids
             return MessageRead.objects.filter(
                 message=obj,
                 user=request.user
             ).exists()
         return False
     
+    def get_my_reactions(self, obj):
+        """Emojis the current user reacted with"""
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            viewer_reactions = self.context.get('viewer_reactions')
+            if viewer_reactions is None:
+                viewer_reactions = reactions.viewer_reactions(request.user, [obj.id])
+            return viewer_reactions.get(obj.id, [])
+        return []
+    
     def validate_file(self, value):
         """Validate uploaded file"""
         if value:
@@ -89,13 +128,104 @@ class MessageSerializer(serializers.ModelSerializer):
                     raise serializers.ValidationError("File must be a video")
         
         return value
+    
+    def validate_upload_id(self, value):
+        """Same type rules as validate_file for a finished chunked upload"""
+        message_type = self.initial_data.get('message_type', 'text')
+        
+        if message_type == 'image' and not value.content_type.startswith('image/'):
+            raise serializers.ValidationError("File must be an image")
+        if message_type == 'video' and not value.content_type.startswith('video/'):
+            raise serializers.ValidationError("File must be a video")
+        return value
+    
+    def validate(self, attrs):
+        if attrs.get('file') and attrs.get('upload_id') is not None:
+            raise serializers.ValidationError("Send either file or upload_id, not both")
+        return attrs
+    
+    def create(self, validated_data):
+        # A finished chunked upload instead of a multipart file
+        claim_upload(validated_data, 'file', self.context['request'].user)
+        return super().create(validated_data)
+
+
+class ScopeRequest:
+    """
+    Just enough of a request for serializers that build absolute URLs
+    (avatar_url, file_url) from a websocket scope. The Host header is
+    checked against ALLOWED_HOSTS the same way HttpRequest.get_host() does.
+    """
+    
+    def __init__(self, scope):
+        headers = dict(scope.get('headers', []))
+        self.user = scope.get('user')
+        self.scheme = 'https' if scope.get('scheme') in ('wss', 'https') else 'http'
+        self.host = headers.get(b'host', b'').decode('latin1')
+    
+    def get_host(self):
+        allowed_hosts = settings.ALLOWED_HOSTS
+        if settings.DEBUG and not allowed_hosts:
+            allowed_hosts = ['.localhost', '127.0.0.1', '[::1]']
+        domain, _ = split_domain_port(self.host)
+        if domain and validate_host(domain, allowed_hosts):
+            return self.host
+        return None
+    
+    def build_absolute_uri(self, location):
+        host = self.get_host()
+        if host is None or '://' in location:
+            return location
+        return f"{self.scheme}://{host}{location}"
+
+
+def build_message_payload(message, sender, reply_to=None, request=None):
+    """
+    MessageSerializer-shaped dict for a message that was just created,
+    built from objects already in memory (no queries). A new message has
+    no read receipts yet. `request` is used for absolute URLs - from a
+    consumer pass ScopeRequest(self.scope).
+    """
+    sender_data = UserSummarySerializer(sender, context={'request': request}).data
+    return {
+        'id': str(message.id),
+        'conversation': str(message.conversation_id),
+        'sender': dict(sender_data, id=str(sender.id)),
+        'content': message.content,
+        'message_type': message.message_type,
+        'file': None,
+        'file_url': None,
+        'reply_to': {
+            'id': str(reply_to.id),
+            'content': reply_to.content,
+            'sender': reply_to.sender.username,
+            'message_type': reply_to.message_type
+        } if reply_to else None,
+        'is_deleted': message.is_deleted,
+        'created_at': serializers.DateTimeField().to_representation(message.created_at),
+        'read_receipts': [],
+        'is_read': False,
+        'reactions': {},
+        'my_reactions': [],
+    }
+
+
+class LastMessageSerializer(serializers.ModelSerializer):
+    """Slim message preview for the conversation list"""
+    
+    sender = UserSummarySerializer(read_only=True)
+    
+    class Meta:
+        model = Message
+        fields = ['id', 'sender', 'content', 'message_type', 'created_at']
+        read_only_fields = fields
 
 
 class ConversationSerializer(serializers.ModelSerializer):
     """Serializer for conversations"""
     
-    participants = UserSerializer(many=True, read_only=True)
-    last_message = MessageSerializer(read_only=True)
+    participants = UserSummarySerializer(many=True, read_only=True)
+    last_message = LastMessageSerializer(read_only=True)
     unread_count = serializers.SerializerMethodField()
     other_user = serializers.SerializerMethodField()
     
@@ -112,25 +242,22 @@ class ConversationSerializer(serializers.ModelSerializer):
         """Get unread message count for current user"""
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            # Get all messages in this conversation
-            message_ids = obj.messages.exclude(sender=request.user).values_list('id', flat=True)
-            
-            # Count messages not read by current user
-            read_message_ids = MessageRead.objects.filter(
-                message_id__in=message_ids,
-                user=request.user
-            ).values_list('message_id', flat=True)
-            
-            return len(message_ids) - len(read_message_ids)
+            # Maintained counter - prefetched by the list view
+            states = getattr(obj, 'viewer_read_states', None)
+            if states is None:
+                states = ConversationReadState.objects.filter(conversation=obj, user=request.user)
+            for state in states:
+                return state.unread_count
         return 0
     
     def get_other_user(self, obj):
         """Get the other user in direct conversation"""
         request = self.context.get('request')
         if request and request.user.is_authenticated and obj.conversation_type == 'direct':
-            other_user = obj.participants.exclude(id=request.user.id).first()
-            if other_user:
-                return UserSerializer(other_user, context={'request': request}).data
+            # Pick from the (prefetched) participants instead of a new query
+            for other_user in obj.participants.all():
+                if other_user.id != request.user.id:
+                    return UserSerializer(other_user, context={'request': request}).data
         return None
 
 
@@ -0,0 +1,189 @@
+"""
+Resume-from-cursor sync for reconnecting sockets.
+
+The client sends `{"type": "sync", "cursors": {<conversation_id>: <cursor>}}`,
+where a cursor is the `cursor` value from its last `sync_complete` (an ISO
+timestamp). For each conversation the consumer streams `sync_batch` frames
+holding only what changed after the cursor:
+
+- messages created or updated (soft deletes arrive with is_deleted and no
+  content), keyset-paged on (updated_at, id). Each carries its reaction
+  counts, so removed reactions show up here too
+- reactions added, keyset-paged on (created_at, id)
+- read watermarks of every participant (one row per user, first batch only)
+
+Batches are compact: users are referenced by id and described once per batch
+in `users`. File and avatar URLs are absolute, built from the request (a
+ScopeRequest from the consumer) like REST and live message payloads. A conversation with more than CHAT_SYNC_MAX_EVENTS changes is
+cut short with `truncated: true`, and the client reloads it over REST.
+"""
+
+import uuid
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+
+from .models import ConversationReadState, Message, MessageReaction
+
+User = get_user_model()
+
+
+def get_batch_size():
+    return getattr(settings, 'CHAT_SYNC_BATCH_SIZE', 100)
+
+
+def get_max_events():
+    return getattr(settings, 'CHAT_SYNC_MAX_EVENTS', 1000)
+
+
+def get_max_conversations():
+    return getattr(settings, 'CHAT_SYNC_MAX_CONVERSATIONS', 50)
+
+
+def parse_cursor(value):
+    """ISO timestamp -> aware datetime, ValueError if it isn't one"""
+    cursor = parse_datetime(value) if isinstance(value, str) else None
+    if cursor is None:
+        raise ValueError(f"Invalid sync cursor: {value!r}")
+    if timezone.is_naive(cursor):
+        cursor = timezone.make_aware(cursor, dt_timezone.utc)
+    return cursor
+
+
+def format_cursor(value):
+    return value.isoformat()
+
+
+def _after(queryset, field, position):
+    """Rows strictly after (timestamp, id) in (field, id) order"""
+    timestamp, row_id = position
+    if row_id is None:
+        return queryset.filter(**{f'{field}__gt': timestamp})
+    return queryset.filter(
+        Q(**{f'{field}__gt': timestamp}) | Q(**{field: timestamp, 'id__gt': row_id})
+    )
+
+
+def _absolute_url(storage, name, request):
+    if not name:
+        return None
+    url = storage.url(name)
+    return request.build_absolute_uri(url) if request else url
+
+
+def _file_url(name, request):
+    return _absolute_url(Message._meta.get_field('file').storage, name, request)
+
+
+def _users(user_ids, request):
+    storage = User._meta.get_field('avatar').storage
+    return {
+        str(row['id']): {
+            'username': row['username'],
+            'full_name': row['full_name'],
+            'avatar_url': _absolute_url(storage, row['avatar'], request),
+        }
+        for row in User.objects.filter(id__in=user_ids).values('id', 'username', 'full_name', 'avatar')
+    }
+
+
+def start(conversation_id, cursor):
+    """Initial position for get_batch(), ValueError for a malformed ID"""
+    return {
+        'conversation_id': str(uuid.UUID(str(conversation_id))),
+        'messages': (cursor, None),
+        'reactions': (cursor, None),
+        'reads_after': cursor,
+        'sent': 0,
+    }
+
+
+def get_batch(position, batch_size=None, request=None):
+    """
+    Next sync_batch for a conversation. `request` builds absolute URLs.
+    Returns (frame, position) - position is None once the conversation is done.
+    """
+    batch_size = batch_size or get_batch_size()
+    conversation_id = position['conversation_id']
+
+    messages = list(
+        _after(Message.objects.filter(conversation_id=conversation_id), 'updated_at', position['messages'])
+        .order_by('updated_at', 'id')
+        .values('id', 'sender_id', 'content', 'message_type', 'file', 'reply_to_id', 'is_deleted',
+                'reaction_summary', 'created_at', 'updated_at')[:batch_size]
+    )
+    reactions = list(
+        _after(MessageReaction.objects.filter(message__conversation_id=conversation_id), 'created_at', position['reactions'])
+        .order_by('created_at', 'id')
+        .values('id', 'message_id', 'user_id', 'emoji', 'created_at')[:batch_size]
+    )
+    reads = []
+    if position['reads_after'] is not None:
+        reads = list(
+            ConversationReadState.objects.filter(
+                conversation_id=conversation_id,
+                updated_at__gt=position['reads_after']
+            ).values('user_id', 'last_read_message_id', 'last_read_at')
+        )
+
+    user_ids = {row['sender_id'] for row in messages}
+    user_ids.update(row['user_id'] for row in reactions)
+    user_ids.update(row['user_id'] for row in reads)
+
+    frame = {
+        'type': 'sync_batch',
+        'conversation_id': str(conversation_id),
+        'messages': [
+            {
+                'id': str(row['id']),
+                'sender_id': str(row['sender_id']),
+                'content': None if row['is_deleted'] else row['content'],
+                'message_type': row['message_type'],
+                'file_url': None if row['is_deleted'] else _file_url(row['file'], request),
+                'reply_to': str(row['reply_to_id']) if row['reply_to_id'] else None,
+                'is_deleted': row['is_deleted'],
+                'reactions': row['reaction_summary'] or {},
+                'created_at': format_cursor(row['created_at']),
+            }
+            for row in messages
+        ],
+        'reactions': [
+            {
+                'message_id': str(row['message_id']),
+                'user_id': str(row['user_id']),
+                'emoji': row['emoji'],
+            }
+            for row in reactions
+        ],
+        'reads': [
+            {
+                'user_id': str(row['user_id']),
+                'last_read_message_id': str(row['last_read_message_id']) if row['last_read_message_id'] else None,
+                'last_read_at': format_cursor(row['last_read_at']) if row['last_read_at'] else None,
+            }
+            for row in reads
+        ],
+        'users': _users(user_ids, request) if user_ids else {},
+        'truncated': False,
+    }
+
+    more = len(messages) == batch_size or len(reactions) == batch_size
+    sent = position['sent'] + len(messages) + len(reactions)
+    if more and sent >= get_max_events():
+        # Too far behind - cheaper for the client to reload over REST
+        frame['truncated'] = True
+        more = False
+    if not more:
+        return frame, None
+
+    return frame, {
+        'conversation_id': conversation_id,
+        'messages': (messages[-1]['updated_at'], messages[-1]['id']) if messages else position['messages'],
+        'reactions': (reactions[-1]['created_at'], reactions[-1]['id']) if reactions else position['reactions'],
+        'reads_after': None,
+        'sent': sent,
+    }
@@ -1,3 +1,240 @@
-from django.test import TestCase
+import asyncio
+import multiprocessing
+import os
+import queue
+import socket
+import threading
+import unittest
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from pixora_backend.channel_layers import build_channel_layers
+
+try:
+    from fakeredis import TcpFakeServer
+except ImportError:
+    TcpFakeServer = None
+
+CONVERSATION_ROOM = 'conversation_layertest'
+USER_ROOM = 'user_layertest'
+EVENT_TYPES = {'chat_message', 'typing_indicator', 'conversation_updated'}
+TIMEOUT = 5.0
+
+
+def _worker(index, backend, redis_url, ready, results):
+    """Joins both rooms like a ChatConsumer on another Daphne worker would"""
+    os.environ['CHANNEL_LAYER_BACKEND'] = backend
+    os.environ['CHANNEL_REDIS_URL'] = redis_url
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pixora_backend.settings')
+
+    import django
+    django.setup()
+    from channels.layers import get_channel_layer
+
+    async def run():
+        layer = get_channel_layer()
+        channel = await layer.new_channel()
+        await layer.group_add(CONVERSATION_ROOM, channel)
+        await layer.group_add(USER_ROOM, channel)
+        ready.set()
+
+        received = set()
+        try:
+            while received != EVENT_TYPES:
+                event = await asyncio.wait_for(layer.receive(channel), TIMEOUT)
+                received.add(event['type'])
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            await layer.group_discard(CONVERSATION_ROOM, channel)
+            await layer.group_discard(USER_ROOM, channel)
+        return received
+
+    results.put((index, sorted(asyncio.run(run()))))
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@unittest.skipIf(TcpFakeServer is None, 'needs the fakeredis package')
+class ChannelLayerFanOutTests(SimpleTestCase):
+    """Chat events sent from one process reach sockets on every other worker"""
+
+    workers = 2
+
+    def setUp(self):
+        port = _free_port()
+        self.server = TcpFakeServer(('127.0.0.1', port), server_type='redis')
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.shutdown)
+        self.redis_url = f'redis://127.0.0.1:{port}/0'
+
+    def run_workers(self, backend):
+        from channels.layers import get_channel_layer
+
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        processes = []
+        ready_events = []
+        for index in range(self.workers):
+            ready = context.Event()
+            process = context.Process(
+                target=_worker,
+                args=(index, backend, self.redis_url, ready, results),
+                daemon=True,
+            )
+            process.start()
+            self.addCleanup(process.join, TIMEOUT)
+            processes.append(process)
+            ready_events.append(ready)
+
+        for ready in ready_events:
+            self.assertTrue(ready.wait(TIMEOUT * 4), 'Worker did not start in time')
+
+        group_send = async_to_sync(get_channel_layer().group_send)
+        group_send(CONVERSATION_ROOM, {'type': 'chat_message', 'message': {'content': 'layer test'}})
+        group_send(CONVERSATION_ROOM, {
+            'type': 'typing_indicator', 'user_id': 'layertest', 'username': 'layertest', 'is_typing': True,
+        })
+        group_send(USER_ROOM, {
+            'type': 'conversation_updated', 'conversation_id': 'layertest', 'last_message': None,
+        })
+
+        received = {}
+        for _ in processes:
+            try:
+                index, event_types = results.get(timeout=TIMEOUT * 2)
+            except queue.Empty:
+                break
+            received[index] = set(event_types)
+        return received
+
+    def assert_fan_out(self, backend):
+        with override_settings(CHANNEL_LAYERS=build_channel_layers(backend, self.redis_url)):
+            received = self.run_workers(backend)
+        self.assertEqual(received, {index: EVENT_TYPES for index in range(self.workers)})
+
+    def test_redis_fan_out(self):
+        self.assert_fan_out('redis')
+
+    def test_redis_pubsub_fan_out(self):
+        self.assert_fan_out('redis_pubsub')
+
+
+# Spawned layer workers import this module before django.setup(), so the
+# consumer tests import models and routing where they use them
+
+
+class ScopeUserMiddleware:
+    """Stands in for JWTAuthMiddleware with a fixed user"""
+
+    def __init__(self, app, user):
+        self.app = app
+        self.user = user
+
+    async def __call__(self, scope, receive, send):
+        return await self.app(dict(scope, user=self.user), receive, send)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class ChatConsumerTests(TransactionTestCase):
+    """ChatConsumer end to end through WebsocketCommunicator"""
+
+    def setUp(self):
+        from .models import Conversation
+
+        User = get_user_model()
+        self.alice = User.objects.create_user(email='alice@example.com', username='alice', password='pw12345678')
+        self.bob = User.objects.create_user(email='bob@example.com', username='bob', password='pw12345678')
+        self.carol = User.objects.create_user(email='carol@example.com', username='carol', password='pw12345678')
+        self.conversation = Conversation.objects.create(conversation_type='direct')
+        self.conversation.participants.add(self.alice, self.bob)
+
+    def communicator(self, user):
+        from .routing import websocket_urlpatterns
+
+        return WebsocketCommunicator(ScopeUserMiddleware(URLRouter(websocket_urlpatterns), user), '/ws/chat/')
+
+    def stored_messages(self):
+        from .models import Message
+
+        return list(Message.objects.values_list('sender_id', 'content'))
+
+    async def connect(self, user):
+        communicator = self.communicator(user)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual((await communicator.receive_json_from())['type'], 'connection_established')
+        return communicator
+
+    async def receive_type(self, communicator, event_type):
+        """Next event of the given type, skipping presence and other noise"""
+        while True:
+            event = await communicator.receive_json_from(timeout=TIMEOUT)
+            if event['type'] == event_type:
+                return event
+
+    async def join(self, communicator):
+        await communicator.send_json_to({'type': 'join_conversation', 'conversation_id': str(self.conversation.id)})
+        return await self.receive_type(communicator, 'joined_conversation')
+
+    async def test_anonymous_user_is_rejected(self):
+        from django.contrib.auth.models import AnonymousUser
+
+        connected, _ = await self.communicator(AnonymousUser()).connect()
+        self.assertFalse(connected)
+
+    async def test_message_reaches_other_participant(self):
+        alice = await self.connect(self.alice)
+        bob = await self.connect(self.bob)
+        try:
+            await self.join(alice)
+            await self.join(bob)
+
+            await alice.send_json_to({
+                'type': 'send_message', 'conversation_id': str(self.conversation.id), 'content': 'hello bob',
+            })
+
+            for communicator in (alice, bob):
+                event = await self.receive_type(communicator, 'new_message')
+                self.assertEqual(event['message']['content'], 'hello bob')
+                self.assertEqual(event['message']['sender']['username'], 'alice')
+
+            update = await self.receive_type(bob, 'conversation_updated')
+            self.assertEqual(update['conversation_id'], str(self.conversation.id))
+
+            stored = await database_sync_to_async(self.stored_messages)()
+            self.assertEqual(stored, [(self.alice.id, 'hello bob')])
+        finally:
+            await alice.disconnect()
+            await bob.disconnect()
+
+    async def test_non_participant_cannot_join_or_send(self):
+        carol = await self.connect(self.carol)
+        try:
+            await carol.send_json_to({'type': 'join_conversation', 'conversation_id': str(self.conversation.id)})
+            self.assertIn('not a participant', (await self.receive_type(carol, 'error'))['message'])
+
+            await carol.send_json_to({
+                'type': 'send_message', 'conversation_id': str(self.conversation.id), 'content': 'hi',
+            })
+            self.assertIn('not a participant', (await self.receive_type(carol, 'error'))['message'])
+            self.assertEqual(await database_sync_to_async(self.stored_messages)(), [])
+        finally:
+            await carol.disconnect()
+
+    async def test_invalid_json_returns_error(self):
+        alice = await self.connect(self.alice)
+        try:
+            await alice.send_to(text_data='not json')
+            self.assertEqual((await self.receive_type(alice, 'error'))['message'], 'Invalid JSON')
+        finally:
+            await alice.disconnect()
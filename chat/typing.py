@@ -0,0 +1,97 @@
+"""
+Typing indicator coalescing.
+
+Clients send `typing` on every keystroke. A TypingCoalescer (one per
+connection) turns that stream into state changes: at most one typing
+started/stopped event per conversation per CHAT_TYPING_WINDOW seconds, the
+last requested state wins when the window closes, and a user that goes quiet
+for CHAT_TYPING_EXPIRY seconds is reported as stopped. Room traffic then
+grows with the number of people typing, not with how fast they type.
+
+The class has no I/O and takes a clock, so the consumer drives it with
+`asyncio` timers and `bench_typing` drives it with a simulated clock.
+"""
+
+import time
+
+from django.conf import settings
+
+
+def get_window():
+    return getattr(settings, 'CHAT_TYPING_WINDOW', 1.0)
+
+
+def get_expiry():
+    return getattr(settings, 'CHAT_TYPING_EXPIRY', 5.0)
+
+
+class _State:
+    __slots__ = ('sent', 'sent_at', 'wanted', 'last_seen')
+
+    def __init__(self):
+        self.sent = False
+        self.sent_at = None
+        self.wanted = False
+        self.last_seen = None
+
+
+class TypingCoalescer:
+    """Keystroke stream in, (conversation_id, is_typing) changes out"""
+
+    def __init__(self, window=None, expiry=None, clock=time.monotonic):
+        self.window = get_window() if window is None else window
+        self.expiry = get_expiry() if expiry is None else expiry
+        self.clock = clock
+        self._states = {}
+
+    def update(self, conversation_id, is_typing):
+        """Record a client typing event, returns the changes to send now"""
+        now = self.clock()
+        state = self._states.get(conversation_id)
+        if state is None:
+            if not is_typing:
+                return []
+            state = self._states[conversation_id] = _State()
+
+        state.wanted = bool(is_typing)
+        if is_typing:
+            state.last_seen = now
+        return self._flush(conversation_id, state, now)
+
+    def tick(self):
+        """Expire quiet typists and send changes held back by the window"""
+        now = self.clock()
+        changes = []
+        for conversation_id, state in list(self._states.items()):
+            if state.wanted and now >= state.last_seen + self.expiry:
+                state.wanted = False
+            changes.extend(self._flush(conversation_id, state, now))
+        return changes
+
+    def next_deadline(self):
+        """Clock time at which tick() has work to do, None if idle"""
+        deadlines = []
+        for state in self._states.values():
+            if state.wanted != state.sent:
+                deadlines.append(state.sent_at + self.window)
+            if state.wanted:
+                deadlines.append(state.last_seen + self.expiry)
+        return min(deadlines) if deadlines else None
+
+    def stop_all(self):
+        """Stopped events for everything shown as typing (on disconnect)"""
+        changes = [conversation_id for conversation_id, state in self._states.items() if state.sent]
+        self._states.clear()
+        return [(conversation_id, False) for conversation_id in changes]
+
+    def _flush(self, conversation_id, state, now):
+        changes = []
+        if state.wanted != state.sent and (state.sent_at is None or now >= state.sent_at + self.window):
+            state.sent = state.wanted
+            state.sent_at = now
+            changes.append((conversation_id, state.sent))
+
+        # Forget idle state once its window is over (a new start may go out at once)
+        if not state.sent and not state.wanted and now >= state.sent_at + self.window:
+            del self._states[conversation_id]
+        return changes
@@ -1,11 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ConversationViewSet, MessageViewSet
+from .views import ConversationViewSet, MessageViewSet, MessageSearchView, PresenceView
 
 router = DefaultRouter()
 router.register(r'conversations', ConversationViewSet, basename='conversation')
 router.register(r'messages', MessageViewSet, basename='message')
 
 urlpatterns = [
+    path('chat/presence/', PresenceView.as_view(), name='chat-presence'),
+    path('chat/search/', MessageSearchView.as_view(), name='chat-search'),
     path('chat/', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,14 +1,20 @@
+import uuid
+
 from rest_framework import viewsets, status
+from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.db import transaction
 from django.db.models import Q, Max, Count
-from .models import Conversation, Message, MessageRead
+from .models import Message, MessageRead
+from . import archive, inbox, presence, reactions, read_state, search
 from .serializers import (
     ConversationSerializer, 
     MessageSerializer,
     CreateConversationSerializer
 )
+from pixora_backend.pagination import ConversationCursorPagination
 
 
 class ConversationViewSet(viewsets.ModelViewSet):
@@ -16,12 +22,11 @@ class ConversationViewSet(viewsets.ModelViewSet):
     
     serializer_class = ConversationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ConversationCursorPagination
     
     def get_queryset(self):
         """Get conversations for current user"""
-        return Conversation.objects.filter(
-            participants=self.request.user
-        ).prefetch_related('participants', 'messages').distinct()
+        return inbox.get_inbox(self.request.user)
     
     @action(detail=False, methods=['post'])
     def create_or_get(self, request):
@@ -54,47 +59,27 @@ class ConversationViewSet(viewsets.ModelViewSet):
         messages = Message.objects.filter(
             conversation=conversation,
             is_deleted=False
-        ).select_related('sender').prefetch_related('read_receipts')
-        
-        # Pagination
-        page = self.paginate_queryset(messages)
-        if page is not None:
-            serializer = MessageSerializer(
-                page,
-                many=True,
-                context={'request': request}
-            )
-            return self.get_paginated_response(serializer.data)
+        ).select_related('sender', 'reply_to__sender').prefetch_related('read_receipts')
         
-        serializer = MessageSerializer(
-            messages,
-            many=True,
-            context={'request': request}
-        )
-        return Response(serializer.data)
+        # Keyset pagination on (conversation, -created_at), continuing into the archive
+        paginator = archive.MessageHistoryPagination(conversation.id)
+        page = paginator.paginate_queryset(messages, request, view=self)
+        data = paginator.serialize(page, MessageSerializer, {'request': request})
+        return paginator.get_paginated_response(data)
     
     @action(detail=True, methods=['post'])
     def mark_as_read(self, request, pk=None):
         """Mark all messages in conversation as read"""
         conversation = self.get_object()
         
-        # Get unread messages
-        unread_messages = Message.objects.filter(
-            conversation=conversation,
-            is_deleted=False
-        ).exclude(sender=request.user).exclude(
-            read_receipts__user=request.user
-        )
+        # Bulk insert receipts and move the watermark to the newest message
+        message_ids = read_state.mark_all_read(conversation.id, request.user)
         
-        # Mark as read
-        for message in unread_messages:
-            MessageRead.objects.get_or_create(
-                message=message,
-                user=request.user
-            )
+        # One event for the whole batch
+        read_state.broadcast_read(conversation.id, request.user, message_ids)
         
         return Response(
-            {'message': f'{unread_messages.count()} messages marked as read'},
+            {'message': f'{len(message_ids)} messages marked as read'},
             status=status.HTTP_200_OK
         )
 
@@ -114,7 +99,10 @@ class MessageViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         """Create message with current user as sender"""
-        serializer.save(sender=self.request.user)
+        with transaction.atomic():
+            message = serializer.save(sender=self.request.user)
+            inbox.message_created(message)
+            read_state.message_created(message)
     
     @action(detail=True, methods=['post'])
     def mark_as_read(self, request, pk=None):
@@ -125,12 +113,33 @@ class MessageViewSet(viewsets.ModelViewSet):
             message=message,
             user=request.user
         )
+        read_state.mark_read(message.conversation_id, request.user, message)
         
         return Response(
             {'message': 'Message marked as read'},
             status=status.HTTP_200_OK
         )
     
+    @action(detail=True, methods=['post'])
+    def toggle_reaction(self, request, pk=None):
+        """Add the emoji reaction, or remove it if the user already reacted with it"""
+        message = self.get_object()
+        emoji = request.data.get('emoji')
+        
+        if not isinstance(emoji, str) or not 0 < len(emoji) <= reactions.MAX_EMOJI_LENGTH:
+            return Response(
+                {'error': 'Invalid emoji'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        added, summary = reactions.toggle(message.id, request.user, emoji)
+        reactions.broadcast(message.conversation_id, request.user, message.id, emoji, added, summary)
+        
+        return Response(
+            {'added': added, 'reactions': summary},
+            status=status.HTTP_200_OK
+        )
+    
     @action(detail=True, methods=['delete'])
     def soft_delete(self, request, pk=None):
         """Soft delete a message"""
@@ -143,10 +152,58 @@ class MessageViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        message.is_deleted = True
-        message.save()
+        with transaction.atomic():
+            message.is_deleted = True
+            message.save()
+            inbox.message_deleted(message)
+            read_state.message_deleted(message)
         
         return Response(
             {'message': 'Message deleted'},
             status=status.HTTP_200_OK
-        )
\ No newline at end of file
+        )
+
+
+class PresenceView(APIView):
+    """Who is online among ?ids=<id>,<id>,... (one cache round trip)"""
+    
+    permission_classes = [IsAuthenticated]
+    max_ids = 200
+    
+    def get(self, request):
+        user_ids = [user_id for user_id in request.query_params.get('ids', '').split(',') if user_id]
+        if len(user_ids) > self.max_ids:
+            return Response(
+                {'error': f'At most {self.max_ids} ids per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response({'presence': presence.get_online(user_ids)}, status=status.HTTP_200_OK)
+
+
+class MessageSearchView(APIView):
+    """GET /api/chat/search/?q=<text>[&conversation_id=<id>][&limit=<n>]"""
+    
+    permission_classes = [IsAuthenticated]
+    max_limit = 50
+    
+    def get(self, request):
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), self.max_limit)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        conversation_id = request.query_params.get('conversation_id')
+        if conversation_id:
+            try:
+                conversation_id = uuid.UUID(conversation_id)
+            except ValueError:
+                return Response({'error': 'Invalid conversation_id'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        messages = search.search(request.user, text, conversation_id or None, max(limit, 1))
+        serializer = MessageSerializer(messages, many=True, context={'request': request})
+        return Response({'results': serializer.data}, status=status.HTTP_200_OK)
@@ -22,8 +22,14 @@ from channels.security.websocket import AllowedHostsOriginValidator
 from chat.middleware import JWTAuthMiddleware
 import chat.routing
 
+from pixora_backend.sweeper import start_sweeper
+
 django_asgi_app = get_asgi_application()
 
+# Periodic expiry sweep every SWEEPER_INTERVAL seconds (set it to 0 to disable).
+# Each worker runs the thread; a cache lock lets only one of them sweep per interval
+start_sweeper()
+
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": AllowedHostsOriginValidator(
@@ -0,0 +1,78 @@
+"""
+Versioned cache keys.
+
+Cached entries are stored under `<namespace>:<id>:v<version>`. Invalidating
+an object only bumps its version counter - old entries are never deleted,
+they just stop being read and expire on their own. This works the same on
+the local-memory and Redis backends (see CACHES in settings).
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def get_timeout():
+    return getattr(settings, 'CACHE_TIMEOUT', 300)
+
+
+def _version_key(namespace, object_id):
+    return f"{namespace}:{object_id}:ver"
+
+
+def _initial_version():
+    # Never restart at 1 after the version key is evicted, or stale
+    # entries from before the eviction would become readable again
+    return int(time.time() * 1000)
+
+
+def get_version(namespace, object_id):
+    key = _version_key(namespace, object_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(namespace, object_ids):
+    """{object_id: version} for many objects in one cache round trip"""
+    keys = {_version_key(namespace, object_id): object_id for object_id in object_ids}
+    found = cache.get_many(list(keys))
+
+    versions = {}
+    for key, object_id in keys.items():
+        if key in found:
+            versions[object_id] = found[key]
+        else:
+            cache.add(key, _initial_version(), timeout=None)
+            versions[object_id] = cache.get(key)
+    return versions
+
+
+def bump_version(namespace, object_id):
+    """Invalidate everything cached for this object"""
+    key = _version_key(namespace, object_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), timeout=None)
+
+
+def make_key(namespace, object_id, version, *parts):
+    key = f"{namespace}:{object_id}:v{version}"
+    if parts:
+        key += ':' + ':'.join(str(part) for part in parts)
+    return key
+
+
+def get_or_build(namespace, object_id, build, *parts):
+    """Read-through: return the cached value or build(), cache and return it"""
+    key = make_key(namespace, object_id, get_version(namespace, object_id), *parts)
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        if value is not None:
+            cache.set(key, value, get_timeout())
+    return value
@@ -0,0 +1,46 @@
+"""
+CHANNEL_LAYERS presets.
+
+- 'memory'        InMemoryChannelLayer - one process only (development)
+- 'redis'         channels_redis RedisChannelLayer - any number of Daphne workers
+- 'redis_pubsub'  channels_redis RedisPubSubChannelLayer - lighter on Redis,
+                  no per-channel queues (messages to a dead socket are dropped)
+
+Kept free of Django imports so settings.py can use it.
+"""
+
+
+def build_channel_layers(backend='memory', redis_url='redis://127.0.0.1:6379/0'):
+    if backend == 'redis':
+        return {
+            'default': {
+                'BACKEND': 'channels_redis.core.RedisChannelLayer',
+                'CONFIG': {
+                    'hosts': [redis_url],
+                    'prefix': 'pixora',
+                    'capacity': 1500,  # per-channel queue before ChannelFull
+                    'expiry': 10,  # seconds an undelivered message is kept
+                    'group_expiry': 86400,
+                },
+            }
+        }
+
+    if backend == 'redis_pubsub':
+        return {
+            'default': {
+                'BACKEND': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+                'CONFIG': {
+                    'hosts': [redis_url],
+                    'prefix': 'pixora',
+                },
+            }
+        }
+
+    if backend == 'memory':
+        return {
+            'default': {
+                'BACKEND': 'channels.layers.InMemoryChannelLayer'
+            }
+        }
+
+    raise ValueError(f"Unknown CHANNEL_LAYER_BACKEND: {backend}")
@@ -0,0 +1,42 @@
+"""
+Keyset (cursor) paginators.
+
+Each page is a range read on an existing (<parent>, -created_at) index, so
+page 50 costs the same as page 1. Cursors are opaque base64 tokens returned
+in the `next` / `previous` links.
+"""
+
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """Newest first by created_at - posts and comments"""
+    ordering = '-created_at'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class FeedCursorPagination(CreatedAtCursorPagination):
+    """Home timeline - ordered by the timeline entry timestamp"""
+    ordering = '-feed_at'
+
+
+class ConversationCursorPagination(CreatedAtCursorPagination):
+    """Chat inbox - most recently active conversation first"""
+    ordering = '-updated_at'
+
+
+class MessageCursorPagination(CreatedAtCursorPagination):
+    """
+    Chat history - pages walk back in time from the newest message,
+    but each page is returned oldest first for display.
+    """
+    page_size = 30
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = super().paginate_queryset(queryset, request, view)
+        if page is None:
+            return None
+        # Copy - the paginator still needs self.page for the cursor links
+        return list(reversed(page))
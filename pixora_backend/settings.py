@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from dotenv import load_dotenv 
 import os
+from .channel_layers import build_channel_layers
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -50,6 +51,7 @@ INSTALLED_APPS = [
     'notifications',
     'analytics',
     'chat',
+    'uploads',
     'django_otp',
     'django_otp.plugins.otp_totp',
     'rest_framework_simplejwt.token_blacklist', 
@@ -101,12 +103,35 @@ TEMPLATES = [
 # WSGI_APPLICATION = "pixora_backend.wsgi.application"
 ASGI_APPLICATION = "pixora_backend.asgi.application"
 
-# Add Channels Layer Configuration (using in-memory for development)
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer'
+REDIS_URL = os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/0')
+
+# Channels Layer: 'memory' (single process, development), 'redis' or
+# 'redis_pubsub' (required for more than one Daphne worker)
+CHANNEL_LAYER_BACKEND = os.getenv('CHANNEL_LAYER_BACKEND', 'memory')
+CHANNEL_REDIS_URL = os.getenv('CHANNEL_REDIS_URL', REDIS_URL)
+CHANNEL_LAYERS = build_channel_layers(CHANNEL_LAYER_BACKEND, CHANNEL_REDIS_URL)
+
+# Cache (local memory for development/tests, Redis in production)
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'pixora',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'pixora',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
     }
-}
+
+CACHE_TIMEOUT = 300  # 5 minutes for serialized posts / profiles
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -160,7 +185,8 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWT with a per-process jti cache (accounts/authentication.py)
+        'accounts.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -168,6 +194,16 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
     'EXCEPTION_HANDLER': 'rest_framework.views.exception_handler',
+    # Auth endpoint limits (accounts/throttling.py, counted in the cache)
+    'DEFAULT_THROTTLE_RATES': {
+        'send_otp': '2/min',
+        'send_otp_ip': '10/hour',  # per client IP, across email addresses
+        'verify_otp': '5/min',
+        'verify_otp_ip': '20/min',
+        'login': '10/min',
+        'login_ip': '30/min',
+        'register': '5/hour',
+    },
 }
 
 # JWT Configuration
@@ -202,6 +238,10 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=7),
 }
 
+# Validated access token cache (accounts/authentication.py)
+AUTH_TOKEN_CACHE_SIZE = 10000  # tokens kept per process
+AUTH_TOKEN_CACHE_TTL = 30  # seconds - also the longest a revocation takes to reach other workers
+
 # CORS Configuration (for frontend)
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000", 
@@ -239,6 +279,60 @@ AUTH_USER_MODEL = 'accounts.User'
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
 
+# Resumable chunked uploads (uploads/sessions.py)
+UPLOAD_TEMP_DIR = os.getenv('UPLOAD_TEMP_DIR', os.path.join(BASE_DIR, 'upload_tmp'))  # partial files, shared by all workers
+UPLOAD_MAX_SIZE = 10485760  # 10MB, same limit as multipart media
+UPLOAD_SESSION_TTL = 86400  # seconds an idle or never attached upload is kept
+
 # Allowed file extensions
 ALLOWED_IMAGE_EXTENSIONS = ['jpg', 'jpeg', 'png', 'gif', 'webp']
-ALLOWED_VIDEO_EXTENSIONS = ['mp4', 'mov', 'avi']
\ No newline at end of file
+ALLOWED_VIDEO_EXTENSIONS = ['mp4', 'mov', 'avi']
+# Home timeline (fan-out on write)
+TIMELINE_FANOUT_MAX_FOLLOWERS = 5000  # Above this, followers pull posts on read instead
+TIMELINE_BACKFILL_SIZE = 200  # Posts copied in on follow / rebuild
+TIMELINE_BATCH_SIZE = 1000
+
+# Post like/comment counters: 'direct', 'sharded' or 'buffered' (see posts/counters.py).
+# 'buffered' is flushed in-process only and loses unflushed deltas when a worker dies
+POST_COUNTER_BACKEND = os.getenv('POST_COUNTER_BACKEND', 'direct')
+POST_COUNTER_SHARDS = 8
+POST_COUNTER_FLUSH_INTERVAL = 5  # seconds
+
+# Outgoing mail worker pool (accounts/mailer.py)
+MAIL_WORKERS = 2
+MAIL_QUEUE_SIZE = 100  # OTP requests get a 503 when this many emails are waiting
+MAIL_MAX_RETRIES = 3
+MAIL_RETRY_BACKOFF = 1.0  # seconds, doubled on every retry
+MAIL_IDLE_TIMEOUT = 30  # seconds before an idle worker closes its SMTP connection
+
+# Expiry sweeper for stories / OTPs (pixora_backend/sweeper.py)
+SWEEPER_INTERVAL = int(os.getenv('SWEEPER_INTERVAL', 60))  # seconds, 0 disables the in-process sweeper
+SWEEPER_BATCH_SIZE = 500
+SWEEPER_MAX_BATCHES = 100  # per table per run
+
+# Chat membership cache (chat/membership.py)
+CHAT_MEMBERSHIP_TIMEOUT = 3600  # seconds
+
+# Typing indicators (chat/typing.py)
+CHAT_TYPING_WINDOW = 1.0  # at most one typing change per conversation per window (seconds)
+CHAT_TYPING_EXPIRY = 5.0  # report "stopped typing" after this long without keystrokes
+
+# Presence (chat/presence.py)
+CHAT_PRESENCE_TTL = 90  # seconds without a heartbeat before a user counts as offline
+CHAT_PRESENCE_BATCH_INTERVAL = 1.0  # presence diffs are sent at most this often (seconds)
+
+# Reconnect sync (chat/sync.py)
+CHAT_SYNC_BATCH_SIZE = 100  # messages / reactions per sync_batch frame
+CHAT_SYNC_MAX_EVENTS = 1000  # per conversation, beyond this the client reloads over REST
+CHAT_SYNC_MAX_CONVERSATIONS = 50  # cursors handled per sync request
+
+# Outbound queue per chat socket (chat/outbox.py)
+CHAT_OUTBOX_BATCH_WINDOW = 0.005  # seconds to collect events into one frame
+CHAT_OUTBOX_MAX_BATCH = 50  # events per batch frame
+CHAT_OUTBOX_HIGH_WATER = 200  # queued events before typing/presence are dropped
+CHAT_OUTBOX_MAX_EVENTS = 1000  # queued events before the client is disconnected
+CHAT_OUTBOX_SLOW_TIMEOUT = 10  # seconds above the high-water mark before disconnecting
+
+# Chat history archive (chat/archive.py, `manage.py archive_messages`)
+CHAT_ARCHIVE_AFTER_DAYS = int(os.getenv('CHAT_ARCHIVE_AFTER_DAYS', 365))  # messages older than this move to segments
+CHAT_ARCHIVE_BATCH_SIZE = 500  # messages moved per transaction
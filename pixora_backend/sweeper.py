@@ -0,0 +1,191 @@
+"""
+Expiry sweeper for stories, story views, email OTPs and upload sessions.
+
+Rows are deleted in bounded batches picked through the expires_at indexes,
+so a sweep never holds a long lock or builds one huge DELETE. Media files of
+swept stories, and the files of uploads that were never attached, are
+removed from storage after their rows are gone.
+
+Run it with `python manage.py sweep_expired` (cron) or in-process with
+`start_sweeper()` - the ASGI entry point does this when SWEEPER_INTERVAL > 0.
+Every worker starts the thread, but each tick takes a cache lock first, so
+only one worker sweeps per interval.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+SWEEP_LOCK_KEY = 'sweeper:lock'
+
+
+def get_batch_size():
+    return getattr(settings, 'SWEEPER_BATCH_SIZE', 500)
+
+
+def get_max_batches():
+    return getattr(settings, 'SWEEPER_MAX_BATCHES', 100)
+
+
+def sweep_stories(now=None, batch_size=None, max_batches=None):
+    """Delete expired stories, their views and media files"""
+    from posts.models import Story, StoryView
+
+    now = now or timezone.now()
+    batch_size = batch_size or get_batch_size()
+    max_batches = max_batches or get_max_batches()
+    storage = Story._meta.get_field('media').storage
+
+    stats = {'stories': 0, 'story_views': 0, 'files': 0}
+    for _ in range(max_batches):
+        batch = list(
+            Story.objects.filter(expires_at__lte=now)
+            .order_by('expires_at')
+            .values_list('id', 'media')[:batch_size]
+        )
+        if not batch:
+            break
+
+        story_ids = [story_id for story_id, _ in batch]
+        with transaction.atomic():
+            views_deleted, _ = StoryView.objects.filter(story_id__in=story_ids).delete()
+            Story.objects.filter(id__in=story_ids).delete()
+        stats['story_views'] += views_deleted
+        stats['stories'] += len(story_ids)
+
+        for _, media in batch:
+            if media:
+                try:
+                    storage.delete(media)
+                    stats['files'] += 1
+                except Exception:
+                    logger.exception("Could not delete story media %s", media)
+
+        if len(batch) < batch_size:
+            break
+    return stats
+
+
+def sweep_otps(now=None, batch_size=None, max_batches=None):
+    """Delete expired, unverified OTPs"""
+    from accounts.models import EmailOTP
+
+    now = now or timezone.now()
+    batch_size = batch_size or get_batch_size()
+    max_batches = max_batches or get_max_batches()
+
+    deleted = 0
+    for _ in range(max_batches):
+        otp_ids = list(
+            EmailOTP.objects.filter(expires_at__lt=now, is_verified=False)
+            .order_by('expires_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not otp_ids:
+            break
+        EmailOTP.objects.filter(id__in=otp_ids).delete()
+        deleted += len(otp_ids)
+
+        if len(otp_ids) < batch_size:
+            break
+    return {'otps': deleted}
+
+
+def sweep_uploads(now=None, batch_size=None, max_batches=None):
+    """Delete expired upload sessions, their temp files and unattached files"""
+    from uploads.models import UploadSession
+    from uploads.sessions import remove_temp
+
+    now = now or timezone.now()
+    batch_size = batch_size or get_batch_size()
+    max_batches = max_batches or get_max_batches()
+    storage = UploadSession._meta.get_field('file').storage
+
+    deleted = 0
+    for _ in range(max_batches):
+        batch = list(
+            UploadSession.objects.filter(expires_at__lte=now)
+            .order_by('expires_at')
+            .values_list('id', 'status', 'file')[:batch_size]
+        )
+        if not batch:
+            break
+
+        UploadSession.objects.filter(id__in=[session_id for session_id, _, _ in batch]).delete()
+        deleted += len(batch)
+
+        for session_id, status, file in batch:
+            try:
+                remove_temp(session_id)
+                # Attached files belong to a post / story / message now
+                if file and status != 'attached':
+                    storage.delete(file)
+            except Exception:
+                logger.exception("Could not delete upload %s", session_id)
+
+        if len(batch) < batch_size:
+            break
+    return {'uploads': deleted}
+
+
+def sweep(batch_size=None, max_batches=None):
+    """Run every sweep once, returns row counts plus timing"""
+    started = time.monotonic()
+    now = timezone.now()
+
+    stats = {}
+    stats.update(sweep_stories(now, batch_size, max_batches))
+    stats.update(sweep_otps(now, batch_size, max_batches))
+    stats.update(sweep_uploads(now, batch_size, max_batches))
+
+    elapsed = time.monotonic() - started
+    rows = stats['stories'] + stats['story_views'] + stats['otps'] + stats['uploads']
+    stats['elapsed'] = elapsed
+    stats['rows_per_second'] = rows / elapsed if elapsed else 0.0
+    return stats
+
+
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def _run_forever(interval):
+    from django.db import close_old_connections
+
+    while True:
+        time.sleep(interval)
+        try:
+            # Another worker already swept this interval
+            if not cache.add(SWEEP_LOCK_KEY, 1, max(1, int(interval))):
+                continue
+            stats = sweep()
+            if stats['stories'] or stats['otps'] or stats['uploads']:
+                logger.info(
+                    "Swept %d stories, %d views, %d OTPs, %d uploads in %.2fs",
+                    stats['stories'], stats['story_views'], stats['otps'], stats['uploads'], stats['elapsed'],
+                )
+        except Exception:
+            logger.exception("Sweep failed")
+        finally:
+            close_old_connections()
+
+
+def start_sweeper(interval=None):
+    """Start the periodic sweeper thread (once per process)"""
+    global _thread
+    interval = interval if interval is not None else getattr(settings, 'SWEEPER_INTERVAL', 0)
+    if not interval:
+        return None
+
+    with _thread_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_run_forever, args=(interval,), daemon=True, name='expiry-sweeper')
+            _thread.start()
+    return _thread
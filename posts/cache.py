@@ -0,0 +1,121 @@
+"""
+Read-through cache for serialized posts and per-user post ID lists.
+
+Cached post data is viewer-independent - `is_liked` is filled in per request
+by `apply_viewer()` with one query for the whole page. The author and the
+like/comment counts are not cached with the post either: `get_posts()` reads
+the counts (one query per page, plus posts.counters pending deltas) and the
+author summaries (accounts.cache) on every request, so likes, comments and
+profile edits never invalidate a cached post. Versions are bumped on post
+save/delete only.
+"""
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts import cache as profile_cache
+from pixora_backend import cache as versioned_cache
+from .models import Like, Post
+from .serializers import PostSerializer
+from . import counters as post_counters
+
+POST = 'post'
+USER_POSTS = 'user_posts'
+
+
+SHARED_FIELDS = ('user', 'like_count', 'comment_count')
+
+
+def _build_posts(post_ids, request):
+    posts = Post.objects.filter(id__in=post_ids).select_related('user')
+    context = {'request': request, 'liked_post_ids': set(), 'pending_counts': {}}
+    built = {}
+    for post in posts:
+        data = dict(PostSerializer(post, context=context).data)
+        # Placeholders keep the field order, _apply_shared() fills them in
+        data.update(dict.fromkeys(SHARED_FIELDS))
+        built[post.id] = data
+    return built
+
+
+def _apply_shared(data, request):
+    """Fill in author and like/comment counts, drops posts deleted since caching"""
+    rows = Post.objects.filter(id__in=list(data)).values_list('id', 'user_id', 'like_count', 'comment_count')
+    rows = {post_id: (user_id, like_count, comment_count) for post_id, user_id, like_count, comment_count in rows}
+    pending_counts = post_counters.pending_deltas(rows)
+    authors = profile_cache.get_summaries({user_id for user_id, _, _ in rows.values()}, request)
+
+    for post_id in list(data):
+        if post_id not in rows:
+            del data[post_id]
+            continue
+        user_id, like_count, comment_count = rows[post_id]
+        post = data[post_id]
+        post['user'] = authors.get(user_id)
+        post['like_count'] = like_count
+        post['comment_count'] = comment_count
+        for field, delta in pending_counts.get(post_id, {}).items():
+            post[field] += delta
+
+
+def get_posts(post_ids, request):
+    """Serialized posts in the given order, deleted posts are skipped"""
+    if not post_ids:
+        return []
+
+    host = request.get_host()
+    versions = versioned_cache.get_versions(POST, post_ids)
+    keys = {
+        post_id: versioned_cache.make_key(POST, post_id, versions[post_id], host)
+        for post_id in post_ids
+    }
+    found = cache.get_many(list(keys.values()))
+
+    data = {post_id: found[key] for post_id, key in keys.items() if key in found}
+    missing = [post_id for post_id in post_ids if post_id not in data]
+    if missing:
+        built = _build_posts(missing, request)
+        cache.set_many(
+            {keys[post_id]: post_data for post_id, post_data in built.items()},
+            versioned_cache.get_timeout()
+        )
+        data.update(built)
+
+    _apply_shared(data, request)
+    return [data[post_id] for post_id in post_ids if post_id in data]
+
+
+def get_post(post_id, request):
+    posts = get_posts([post_id], request)
+    return posts[0] if posts else None
+
+
+def apply_viewer(posts, request):
+    """Fill in is_liked for the requesting user (one query per page)"""
+    liked_post_ids = set()
+    if request.user.is_authenticated and posts:
+        liked_post_ids = set(
+            str(post_id) for post_id in Like.objects.filter(
+                user=request.user,
+                post_id__in=[post['id'] for post in posts]
+            ).values_list('post_id', flat=True)
+        )
+    for post in posts:
+        post['is_liked'] = str(post['id']) in liked_post_ids
+    return posts
+
+
+def get_user_post_page(user_id, request, build):
+    """First page of a user's post IDs ({'ids': [...], 'next': url})"""
+    return versioned_cache.get_or_build(
+        USER_POSTS, user_id, build, request.get_host(), request.get_full_path()
+    )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    versioned_cache.bump_version(POST, instance.id)
+    versioned_cache.bump_version(USER_POSTS, instance.user_id)
+
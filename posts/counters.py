@@ -0,0 +1,201 @@
+"""
+Like / comment counters for posts.
+
+POST_COUNTER_BACKEND selects how increments are written:
+
+- 'direct'   UPDATE posts SET like_count = like_count + 1 (one hot row per post)
+- 'sharded'  increment one of POST_COUNTER_SHARDS rows in post_counter_shards,
+             spreading row locks on Postgres
+- 'buffered' accumulate deltas in process memory (no write per like at all)
+
+Sharded and buffered deltas are folded into Post periodically by `flush()`.
+Reads add `pending_deltas()` on top of the Post columns so displayed counts
+stay exact (buffered deltas are only visible to the process holding them).
+
+Buffered deltas are flushed only by the in-process timer thread (every
+POST_COUNTER_FLUSH_INTERVAL seconds, and once more at interpreter exit). The
+flush_post_counters command can't reach them, and whatever a worker holds
+when it is killed (SIGKILL, OOM, crash) is lost - use 'sharded' where
+every like has to survive.
+"""
+
+import atexit
+import logging
+import random
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from .models import Post, PostCounterShard
+from .signals import post_counts_changed
+
+FIELDS = {
+    'like_count': 'like_delta',
+    'comment_count': 'comment_delta',
+}
+
+logger = logging.getLogger(__name__)
+
+_buffer = defaultdict(lambda: defaultdict(int))
+_buffer_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_flusher = None
+
+
+def get_backend():
+    return getattr(settings, 'POST_COUNTER_BACKEND', 'direct')
+
+
+def get_shard_count():
+    return getattr(settings, 'POST_COUNTER_SHARDS', 8)
+
+
+def get_flush_interval():
+    return getattr(settings, 'POST_COUNTER_FLUSH_INTERVAL', 5)
+
+
+def increment(post_id, field, delta=1):
+    """Add delta to Post.<field> ('like_count' or 'comment_count')"""
+    if field not in FIELDS:
+        raise ValueError(f"Unknown counter field: {field}")
+
+    backend = get_backend()
+    if backend == 'direct':
+        Post.objects.filter(pk=post_id).update(**{field: F(field) + delta})
+    elif backend == 'sharded':
+        _increment_shard(post_id, FIELDS[field], delta)
+        _start_flusher()
+    elif backend == 'buffered':
+        with _buffer_lock:
+            _buffer[post_id][field] += delta
+        _start_flusher()
+    else:
+        raise ValueError(f"Unknown POST_COUNTER_BACKEND: {backend}")
+
+    post_counts_changed.send(sender=Post, post_id=post_id)
+
+
+def _increment_shard(post_id, delta_field, delta):
+    shard = random.randrange(get_shard_count())
+    shards = PostCounterShard.objects.filter(post_id=post_id, shard=shard)
+
+    if shards.update(**{delta_field: F(delta_field) + delta}):
+        return
+    try:
+        with transaction.atomic():
+            PostCounterShard.objects.create(post_id=post_id, shard=shard, **{delta_field: delta})
+    except IntegrityError:
+        # Another request created the shard row first
+        shards.update(**{delta_field: F(delta_field) + delta})
+
+
+def pending_deltas(post_ids):
+    """{post_id: {'like_count': n, 'comment_count': n}} not yet flushed to Post"""
+    post_ids = list(post_ids)
+    backend = get_backend()
+    pending = {}
+
+    if backend == 'sharded' and post_ids:
+        rows = PostCounterShard.objects.filter(post_id__in=post_ids).values('post_id').annotate(
+            like_count=Sum('like_delta'),
+            comment_count=Sum('comment_delta'),
+        )
+        for row in rows:
+            pending[row['post_id']] = {'like_count': row['like_count'], 'comment_count': row['comment_count']}
+
+    elif backend == 'buffered':
+        with _buffer_lock:
+            for post_id in post_ids:
+                if post_id in _buffer:
+                    pending[post_id] = dict(_buffer[post_id])
+
+    return pending
+
+
+def flush():
+    """Fold pending deltas into Post, returns number of posts updated"""
+    backend = get_backend()
+    if backend == 'sharded':
+        return _flush_shards()
+    if backend == 'buffered':
+        return _flush_buffer()
+    return 0
+
+
+def _flush_buffer():
+    # Deltas stay in the buffer (and in pending_deltas()) until the UPDATEs
+    # have committed - a failed flush loses nothing and is retried next time
+    with _flush_lock:
+        with _buffer_lock:
+            pending = {post_id: dict(deltas) for post_id, deltas in _buffer.items()}
+
+        with transaction.atomic():
+            for post_id, deltas in pending.items():
+                updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+                if updates:
+                    Post.objects.filter(pk=post_id).update(**updates)
+
+        # Subtract what was written - increments landing meanwhile are kept
+        with _buffer_lock:
+            for post_id, deltas in pending.items():
+                buffered = _buffer[post_id]
+                for field, delta in deltas.items():
+                    buffered[field] -= delta
+                if not any(buffered.values()):
+                    del _buffer[post_id]
+    return len(pending)
+
+
+def _flush_shards():
+    with transaction.atomic():
+        rows = list(
+            PostCounterShard.objects.select_for_update()
+            .exclude(like_delta=0, comment_delta=0)
+            .values_list('id', 'post_id', 'like_delta', 'comment_delta')
+        )
+        if not rows:
+            return 0
+
+        totals = defaultdict(lambda: [0, 0])
+        for shard_id, post_id, like_delta, comment_delta in rows:
+            totals[post_id][0] += like_delta
+            totals[post_id][1] += comment_delta
+            # Subtract what we read - increments landing meanwhile are kept
+            PostCounterShard.objects.filter(pk=shard_id).update(
+                like_delta=F('like_delta') - like_delta,
+                comment_delta=F('comment_delta') - comment_delta,
+            )
+
+        for post_id, (like_delta, comment_delta) in totals.items():
+            Post.objects.filter(pk=post_id).update(
+                like_count=F('like_count') + like_delta,
+                comment_count=F('comment_count') + comment_delta,
+            )
+
+        PostCounterShard.objects.filter(like_delta=0, comment_delta=0).delete()
+    return len(totals)
+
+
+def _flush_loop(stop):
+    while not stop.wait(get_flush_interval()):
+        try:
+            flush()
+        except Exception:
+            logger.exception("Counter flush failed")
+
+
+def _start_flusher():
+    """Start the periodic flush thread once per process"""
+    global _flusher
+    if _flusher is not None:
+        return
+    with _buffer_lock:
+        if _flusher is not None:
+            return
+        stop = threading.Event()
+        _flusher = threading.Thread(target=_flush_loop, args=(stop,), daemon=True, name='post-counter-flush')
+        _flusher.start()
+    atexit.register(flush)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from posts import timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild home timelines from posts and follows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='usernames', help='Only rebuild these usernames')
+        parser.add_argument('--batch-size', type=int, default=500, help='Users loaded per batch')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True).order_by('id')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        total_users = 0
+        total_entries = 0
+        for user in users.iterator(chunk_size=options['batch_size']):
+            total_entries += timeline.rebuild_timeline(user)
+            total_users += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {total_users} timelines ({total_entries} entries)'
+        ))
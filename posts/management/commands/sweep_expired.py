@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from pixora_backend import sweeper
+
+
+class Command(BaseCommand):
+    help = 'Delete expired stories, story views, OTPs and upload sessions in bounded batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Rows deleted per batch')
+        parser.add_argument('--max-batches', type=int, default=None, help='Batches per table before stopping')
+
+    def handle(self, *args, **options):
+        stats = sweeper.sweep(batch_size=options['batch_size'], max_batches=options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {stats['stories']} stories ({stats['files']} files), "
+            f"{stats['story_views']} story views, {stats['otps']} OTPs and {stats['uploads']} uploads "
+            f"in {stats['elapsed']:.2f}s ({stats['rows_per_second']:.0f} rows/s)"
+        ))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.9 on 2026-10-18 13:00
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostCounterShard',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('like_delta', models.IntegerField(default=0)),
+                ('comment_delta', models.IntegerField(default=0)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counter_shards', to='posts.post')),
+            ],
+            options={
+                'db_table': 'post_counter_shards',
+                'unique_together': {('post', 'shard')},
+            },
+        ),
+    ]
@@ -37,6 +37,24 @@ class Post(models.Model):
         return f"Post by {self.user.username} - {self.created_at}"
 
 
+class PostCounterShard(models.Model):
+    """Pending like/comment deltas for a post, spread over N rows to avoid a hot row"""
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='counter_shards')
+    shard = models.PositiveSmallIntegerField()
+    
+    like_delta = models.IntegerField(default=0)
+    comment_delta = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'post_counter_shards'
+        unique_together = ['post', 'shard']
+    
+    def __str__(self):
+        return f"Counter shard {self.shard} for {self.post_id}"
+
+
 class Like(models.Model):
     """Like model for posts"""
     
@@ -140,4 +158,27 @@ class StoryView(models.Model):
         ]
     
     def __str__(self):
-        return f"{self.user.username} viewed story {self.story.id}"
\ No newline at end of file
+        return f"{self.user.username} viewed story {self.story.id}"
+
+class TimelineEntry(models.Model):
+    """Materialized home timeline row - one per (owner, post)"""
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    
+    # Copy of post.created_at so the feed is a range read on this table
+    created_at = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'timeline_entries'
+        ordering = ['-created_at']
+        unique_together = ['owner', 'post']
+        indexes = [
+            models.Index(fields=['owner', '-created_at']),
+            models.Index(fields=['owner', 'author']),
+        ]
+    
+    def __str__(self):
+        return f"Timeline entry for {self.owner_id}: {self.post_id}"
@@ -1,11 +1,43 @@
 from rest_framework import serializers
+from django.db import transaction
+from django.db.models import Count
 from .models import Post, Like, Comment, Story, StoryView
-from accounts.serializers import UserSerializer
+from accounts.serializers import UserSummarySerializer
+from uploads.serializers import UploadIdField, claim_upload, validate_media_or_upload
+from . import counters as post_counters
+
+
+def _viewer(context):
+    """Authenticated user from serializer context, or None"""
+    request = context.get('request')
+    if request and request.user.is_authenticated:
+        return request.user
+    return None
+
+
+class PostListSerializer(serializers.ListSerializer):
+    """Loads the viewer's likes for the whole page in one query"""
+    
+    def to_representation(self, data):
+        posts = list(data.all() if hasattr(data, 'all') else data)
+        
+        liked_post_ids = set()
+        viewer = _viewer(self.context)
+        if viewer and posts:
+            liked_post_ids = set(Like.objects.filter(
+                user=viewer,
+                post_id__in=[post.id for post in posts]
+            ).values_list('post_id', flat=True))
+        self.context['liked_post_ids'] = liked_post_ids
+        self.context['pending_counts'] = post_counters.pending_deltas(post.id for post in posts)
+        
+        return super().to_representation(posts)
+
 
 class PostSerializer(serializers.ModelSerializer):
     """Post serializer with user and media details"""
     
-    user = UserSerializer(read_only=True)
+    user = UserSummarySerializer(read_only=True)
     media_url = serializers.SerializerMethodField()
     is_liked = serializers.SerializerMethodField()
     
@@ -16,6 +48,17 @@ class PostSerializer(serializers.ModelSerializer):
             'like_count', 'comment_count', 'is_liked', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'user', 'like_count', 'comment_count', 'created_at']
+        list_serializer_class = PostListSerializer
+    
+    def to_representation(self, instance):
+        """Add like/comment deltas that have not been flushed to the row yet"""
+        data = super().to_representation(instance)
+        pending_counts = self.context.get('pending_counts')
+        if pending_counts is None:
+            pending_counts = post_counters.pending_deltas([instance.id])
+        for field, delta in pending_counts.get(instance.id, {}).items():
+            data[field] += delta
+        return data
     
     def get_media_url(self, obj):
         """Get full media URL"""
@@ -26,18 +69,25 @@ class PostSerializer(serializers.ModelSerializer):
     
     def get_is_liked(self, obj):
         """Check if current user liked the post"""
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.likes.filter(user=request.user).exists()
+        liked_post_ids = self.context.get('liked_post_ids')
+        if liked_post_ids is not None:
+            return obj.id in liked_post_ids
+        
+        viewer = _viewer(self.context)
+        if viewer:
+            return obj.likes.filter(user=viewer).exists()
         return False
 
 
 class PostCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating posts"""
     
+    upload_id = UploadIdField()
+    
     class Meta:
         model = Post
-        fields = ['caption', 'media', 'media_type']
+        fields = ['caption', 'media', 'media_type', 'upload_id']
+        extra_kwargs = {'media': {'required': False}}
     
     def validate_media(self, value):
         """Validate file size and type"""
@@ -45,12 +95,21 @@ class PostCreateSerializer(serializers.ModelSerializer):
         if value.size > 10 * 1024 * 1024:
             raise serializers.ValidationError("File size cannot exceed 10MB")
         return value
+    
+    def validate(self, attrs):
+        return validate_media_or_upload(attrs, 'media')
+    
+    def create(self, validated_data):
+        # A finished chunked upload instead of a multipart file
+        with transaction.atomic():
+            claim_upload(validated_data, 'media', self.context['request'].user)
+            return super().create(validated_data)
 
 
 class CommentSerializer(serializers.ModelSerializer):
     """Comment serializer"""
     
-    user = UserSerializer(read_only=True)
+    user = UserSummarySerializer(read_only=True)
     
     class Meta:
         model = Comment
@@ -66,10 +125,39 @@ class LikeSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'post', 'created_at']
         read_only_fields = ['id', 'user', 'created_at']
 
+class StoryListSerializer(serializers.ListSerializer):
+    """Loads viewed stories and view counts for the whole page (one query each)"""
+    
+    def to_representation(self, data):
+        stories = list(data.all() if hasattr(data, 'all') else data)
+        story_ids = [story.id for story in stories]
+        
+        viewed_story_ids = set()
+        story_view_counts = {}
+        if story_ids:
+            viewer = _viewer(self.context)
+            if viewer:
+                viewed_story_ids = set(StoryView.objects.filter(
+                    user=viewer,
+                    story_id__in=story_ids
+                ).values_list('story_id', flat=True))
+            
+            story_view_counts = dict(
+                StoryView.objects.filter(story_id__in=story_ids)
+                .values('story_id')
+                .annotate(total=Count('id'))
+                .values_list('story_id', 'total')
+            )
+        self.context['viewed_story_ids'] = viewed_story_ids
+        self.context['story_view_counts'] = story_view_counts
+        
+        return super().to_representation(stories)
+
+
 class StorySerializer(serializers.ModelSerializer):
     """Story serializer"""
     
-    user = UserSerializer(read_only=True)
+    user = UserSummarySerializer(read_only=True)
     media_url = serializers.SerializerMethodField()
     is_viewed = serializers.SerializerMethodField()
     view_count = serializers.SerializerMethodField()
@@ -81,6 +169,7 @@ class StorySerializer(serializers.ModelSerializer):
             'created_at', 'expires_at', 'is_viewed', 'view_count'
         ]
         read_only_fields = ['id', 'user', 'created_at', 'expires_at']
+        list_serializer_class = StoryListSerializer
     
     def get_media_url(self, obj):
         request = self.context.get('request')
@@ -89,24 +178,42 @@ class StorySerializer(serializers.ModelSerializer):
         return None
     
     def get_is_viewed(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return StoryView.objects.filter(story=obj, user=request.user).exists()
+        viewed_story_ids = self.context.get('viewed_story_ids')
+        if viewed_story_ids is not None:
+            return obj.id in viewed_story_ids
+        
+        viewer = _viewer(self.context)
+        if viewer:
+            return StoryView.objects.filter(story=obj, user=viewer).exists()
         return False
     
     def get_view_count(self, obj):
+        story_view_counts = self.context.get('story_view_counts')
+        if story_view_counts is not None:
+            return story_view_counts.get(obj.id, 0)
         return obj.views.count()
 
 
 class StoryCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating stories"""
     
+    upload_id = UploadIdField()
+    
     class Meta:
         model = Story
-        fields = ['media', 'media_type']
+        fields = ['media', 'media_type', 'upload_id']
+        extra_kwargs = {'media': {'required': False}}
     
     def validate_media(self, value):
         # Max 10MB for stories
         if value.size > 10 * 1024 * 1024:
             raise serializers.ValidationError("File size cannot exceed 10MB")
-        return value
\ No newline at end of file
+        return value
+    
+    def validate(self, attrs):
+        return validate_media_or_upload(attrs, 'media')
+    
+    def create(self, validated_data):
+        with transaction.atomic():
+            claim_upload(validated_data, 'media', self.context['request'].user)
+            return super().create(validated_data)
\ No newline at end of file
@@ -0,0 +1,4 @@
+from django.dispatch import Signal
+
+# Sent by posts.counters after a like/comment count changes
+post_counts_changed = Signal()  # kwargs: post_id
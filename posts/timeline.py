@@ -0,0 +1,161 @@
+"""
+Home timeline store (fan-out on write).
+
+Every new post is copied into the timeline of its author and each follower,
+so the feed becomes a single range read on (owner, -created_at). Authors with
+more than TIMELINE_FANOUT_MAX_FOLLOWERS followers are not fanned out - their
+followers pull those posts into their own timeline when they read the feed.
+Each (follower, author) pair has its own watermark - the newest entry of
+that author already in the follower's timeline - and everything past it
+is pulled, so a slow author is never skipped because a busier one posted.
+"""
+
+from django.conf import settings
+from django.db.models import F, Max, Q
+
+from social.models import Follow
+from .models import Post, TimelineEntry
+
+
+def get_fanout_limit():
+    return getattr(settings, 'TIMELINE_FANOUT_MAX_FOLLOWERS', 5000)
+
+
+def get_backfill_size():
+    return getattr(settings, 'TIMELINE_BACKFILL_SIZE', 200)
+
+
+def get_batch_size():
+    return getattr(settings, 'TIMELINE_BATCH_SIZE', 1000)
+
+
+def _insert_entries(owner_ids, post):
+    """Insert one entry per owner for a post, in batches"""
+    batch = []
+    for owner_id in owner_ids:
+        batch.append(TimelineEntry(
+            owner_id=owner_id,
+            post_id=post.id,
+            author_id=post.user_id,
+            created_at=post.created_at,
+        ))
+        if len(batch) >= get_batch_size():
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def _insert_posts(owner_id, posts):
+    """Insert (id, user_id, created_at) post rows into one owner's timeline, in batches"""
+    inserted = 0
+    batch = []
+    for post_id, author_id, created_at in posts:
+        batch.append(TimelineEntry(owner_id=owner_id, post_id=post_id, author_id=author_id, created_at=created_at))
+        if len(batch) >= get_batch_size():
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        inserted += len(batch)
+    return inserted
+
+
+def is_pull_author(user):
+    """Authors above the fan-out limit are read by their followers instead"""
+    return user.follower_count > get_fanout_limit()
+
+
+def fan_out_post(post):
+    """Push a new post into the timelines of its author and followers"""
+    _insert_entries([post.user_id], post)
+
+    if is_pull_author(post.user):
+        return
+
+    follower_ids = Follow.objects.filter(
+        following_id=post.user_id
+    ).values_list('follower_id', flat=True).iterator(chunk_size=get_batch_size())
+    _insert_entries(follower_ids, post)
+
+
+def pull_author_ids(user):
+    """IDs of followed authors that are not fanned out"""
+    return list(
+        Follow.objects.filter(
+            follower=user,
+            following__follower_count__gt=get_fanout_limit()
+        ).values_list('following_id', flat=True)
+    )
+
+
+def pull_on_read(user):
+    """Copy new posts by followed pull authors into the user's timeline"""
+    author_ids = pull_author_ids(user)
+    if not author_ids:
+        return 0
+
+    watermarks = dict(
+        TimelineEntry.objects.filter(owner=user, author_id__in=author_ids)
+        .values('author_id').annotate(latest=Max('created_at'))
+        .values_list('author_id', 'latest')
+    )
+
+    inserted = 0
+    # Authors not pulled before start from their recent posts, like add_author()
+    for author_id in author_ids:
+        if author_id not in watermarks:
+            posts = Post.objects.filter(user_id=author_id).order_by('-created_at').values_list(
+                'id', 'user_id', 'created_at'
+            )
+            inserted += _insert_posts(user.id, posts[:get_backfill_size()])
+
+    # Everyone else: every post past their own watermark, in one query
+    if watermarks:
+        since = Q()
+        for author_id, latest in watermarks.items():
+            since |= Q(user_id=author_id, created_at__gt=latest)
+        posts = Post.objects.filter(since).order_by('created_at').values_list(
+            'id', 'user_id', 'created_at'
+        ).iterator(chunk_size=get_batch_size())
+        inserted += _insert_posts(user.id, posts)
+    return inserted
+
+
+def home_timeline(user):
+    """Posts in the user's home timeline, newest first"""
+    pull_on_read(user)
+
+    return Post.objects.filter(
+        timeline_entries__owner=user
+    ).annotate(
+        feed_at=F('timeline_entries__created_at')
+    ).select_related('user').order_by('-feed_at')
+
+
+def add_author(owner, author):
+    """Backfill an author's recent posts after owner follows them"""
+    posts = Post.objects.filter(user=author).order_by('-created_at').values_list(
+        'id', 'user_id', 'created_at'
+    )
+    return _insert_posts(owner.id, posts[:get_backfill_size()])
+
+
+def remove_author(owner, author):
+    """Drop an author's posts after owner unfollows them"""
+    deleted, _ = TimelineEntry.objects.filter(owner=owner, author=author).delete()
+    return deleted
+
+
+def rebuild_timeline(user):
+    """Rebuild a user's timeline from scratch (own posts + followed authors)"""
+    TimelineEntry.objects.filter(owner=user).delete()
+
+    author_ids = list(Follow.objects.filter(follower=user).values_list('following_id', flat=True))
+    author_ids.append(user.id)
+
+    posts = Post.objects.filter(user_id__in=author_ids).order_by('-created_at').values_list(
+        'id', 'user_id', 'created_at'
+    )
+    return _insert_posts(user.id, posts[:get_backfill_size()])
@@ -1,13 +1,20 @@
 from rest_framework import status, generics, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.shortcuts import get_object_or_404
-from django.db.models import F
 from .models import Post, Like, Comment
 from .serializers import PostSerializer, PostCreateSerializer, CommentSerializer, LikeSerializer, StorySerializer, StoryCreateSerializer
 from django.utils import timezone
 from .models import Story, StoryView
+from . import timeline
+from . import counters as post_counters
+from . import cache as post_cache
+from accounts import cache as profile_cache
+from django.http import Http404
+from accounts import counters
+from pixora_backend.pagination import CreatedAtCursorPagination, FeedCursorPagination
+from pixora_backend import sweeper
 
 class PostListCreateView(generics.ListCreateAPIView):
     """
@@ -15,8 +22,8 @@ class PostListCreateView(generics.ListCreateAPIView):
     POST /api/posts/ - Create new post
     """
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    parser_classes = [MultiPartParser, FormParser]
-    pagination_class = None 
+    parser_classes = [MultiPartParser, FormParser, JSONParser]
+    pagination_class = CreatedAtCursorPagination
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -27,7 +34,11 @@ class PostListCreateView(generics.ListCreateAPIView):
         return Post.objects.select_related('user').all()
     
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        post = serializer.save(user=self.request.user)
+        counters.adjust_post_count(post.user_id, 1)
+        
+        # Push into follower timelines
+        timeline.fan_out_post(post)
     
     def get_serializer_context(self):
         return {'request': self.request}
@@ -46,6 +57,14 @@ class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_serializer_context(self):
         return {'request': self.request}
     
+    def retrieve(self, request, *args, **kwargs):
+        # Serialized post comes from the cache, only is_liked is per request
+        data = post_cache.get_post(kwargs['pk'], request)
+        if data is None:
+            raise Http404
+        post_cache.apply_viewer([data], request)
+        return Response(data)
+    
     def perform_destroy(self, instance):
         # Only post owner can delete
         if instance.user != self.request.user:
@@ -54,6 +73,7 @@ class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
                 status=status.HTTP_403_FORBIDDEN
             )
         instance.delete()
+        counters.adjust_post_count(instance.user_id, -1)
 
 class UserPostsView(generics.ListAPIView):
     """
@@ -61,7 +81,7 @@ class UserPostsView(generics.ListAPIView):
     """
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    pagination_class = None
+    pagination_class = CreatedAtCursorPagination
     
     def get_queryset(self):
         username = self.kwargs['username']
@@ -69,6 +89,30 @@ class UserPostsView(generics.ListAPIView):
     
     def get_serializer_context(self):
         return {'request': self.request}
+    
+    def list(self, request, *args, **kwargs):
+        # Only the first page is cached - cursor pages go to the database
+        if 'cursor' in request.query_params:
+            return super().list(request, *args, **kwargs)
+        
+        user_id = profile_cache.get_user_id(self.kwargs['username'])
+        if user_id is None:
+            return super().list(request, *args, **kwargs)
+        
+        def build_page():
+            page = self.paginate_queryset(self.get_queryset())
+            return {
+                'ids': [post.id for post in page],
+                'next': self.paginator.get_next_link(),
+            }
+        
+        page = post_cache.get_user_post_page(user_id, request, build_page)
+        results = post_cache.apply_viewer(post_cache.get_posts(page['ids'], request), request)
+        return Response({
+            'next': page['next'],
+            'previous': None,
+            'results': results,
+        })
 
 
 class LikePostView(APIView):
@@ -86,7 +130,7 @@ class LikePostView(APIView):
         
         if created:
             # Increment like count
-            Post.objects.filter(pk=post.pk).update(like_count=F('like_count') + 1)
+            post_counters.increment(post.pk, 'like_count', 1)
             return Response({
                 'message': 'Post liked',
                 'liked': True
@@ -105,7 +149,7 @@ class LikePostView(APIView):
             like.delete()
             
             # Decrement like count
-            Post.objects.filter(pk=post.pk).update(like_count=F('like_count') - 1)
+            post_counters.increment(post.pk, 'like_count', -1)
             
             return Response({
                 'message': 'Post unliked',
@@ -124,6 +168,7 @@ class CommentListCreateView(generics.ListCreateAPIView):
     """
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = CreatedAtCursorPagination
     
     def get_queryset(self):
         post_id = self.kwargs['post_id']
@@ -137,7 +182,7 @@ class CommentListCreateView(generics.ListCreateAPIView):
         serializer.save(user=self.request.user, post=post)
         
         # Increment comment count
-        Post.objects.filter(pk=post_id).update(comment_count=F('comment_count') + 1)
+        post_counters.increment(post.pk, 'comment_count', 1)
 
 
 class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -159,9 +204,7 @@ class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
             )
         
         # Decrement comment count
-        Post.objects.filter(pk=instance.post.pk).update(
-            comment_count=F('comment_count') - 1
-        )
+        post_counters.increment(instance.post_id, 'comment_count', -1)
         instance.delete()
 
 
@@ -171,11 +214,11 @@ class FeedView(generics.ListAPIView):
     """
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FeedCursorPagination
     
     def get_queryset(self):
-        user = self.request.user
-        # For now, return all posts. Later we'll filter by following
-        return Post.objects.select_related('user').all()
+        # Own posts + posts from followed users, read from the timeline store
+        return timeline.home_timeline(self.request.user)
     
     def get_serializer_context(self):
         return {'request': self.request}
@@ -186,7 +229,7 @@ class StoryListCreateView(generics.ListCreateAPIView):
     POST /api/stories/ - Create new story
     """
     permission_classes = [permissions.IsAuthenticated]
-    parser_classes = [MultiPartParser, FormParser]
+    parser_classes = [MultiPartParser, FormParser, JSONParser]
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -293,10 +336,9 @@ class DeleteExpiredStoriesView(APIView):
     permission_classes = [permissions.IsAdminUser]
     
     def delete(self, request):
-        expired_stories = Story.objects.filter(expires_at__lte=timezone.now())
-        count = expired_stories.count()
-        expired_stories.delete()
+        # Same bounded batches as the background sweeper
+        stats = sweeper.sweep_stories()
         
         return Response({
-            'message': f'Deleted {count} expired stories'
+            'message': f"Deleted {stats['stories']} expired stories"
         }, status=status.HTTP_200_OK)
\ No newline at end of file
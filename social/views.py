@@ -7,6 +7,8 @@ from django.db import transaction
 from .models import Follow
 from .serializers import FollowSerializer
 from accounts.serializers import UserSerializer, UserProfileSerializer
+from posts import timeline
+from accounts import counters
   
 User = get_user_model()
 
@@ -34,8 +36,13 @@ class FollowUserView(APIView):
             following=user_to_follow
         )
 
-        follower_count = Follow.objects.filter(following=user_to_follow).count()
-        following_count = Follow.objects.filter(follower=request.user).count()
+        if created:
+            counters.adjust_follow_counts(request.user.id, user_to_follow.id, 1)
+            
+            # Backfill the followed user's recent posts into our feed
+            timeline.add_author(request.user, user_to_follow)
+
+        follower_count, following_count = counters.get_follow_counts(request.user.id, user_to_follow.id)
 
         return Response({
             'message': f'You are now following {username}' if created else f'You are already following {username}',
@@ -54,9 +61,12 @@ class FollowUserView(APIView):
                 following=user_to_unfollow
             )
             follow.delete()
+            counters.adjust_follow_counts(request.user.id, user_to_unfollow.id, -1)
+            
+            # Drop their posts from our feed
+            timeline.remove_author(request.user, user_to_unfollow)
             
-            follower_count = Follow.objects.filter(following=user_to_unfollow).count()
-            following_count = Follow.objects.filter(follower=request.user).count()
+            follower_count, following_count = counters.get_follow_counts(request.user.id, user_to_unfollow.id)
             
             return Response({
                 'message': f'You unfollowed {username}',
@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import UploadSession
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'filename', 'size', 'offset', 'status', 'expires_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['user__username', 'filename']
+    readonly_fields = ['created_at', 'updated_at']
@@ -0,0 +1,108 @@
+import os
+import re
+
+from django.conf import settings
+from rest_framework import serializers
+from .models import UploadSession
+from . import sessions
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """Upload progress"""
+    
+    file_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'filename', 'content_type', 'size', 'offset',
+            'status', 'file_url', 'created_at', 'expires_at'
+        ]
+        read_only_fields = fields
+    
+    def get_file_url(self, obj):
+        """Get full file URL once the upload is complete"""
+        if obj.file:
+            request = self.context.get('request')
+            if request:
+                return request.build_absolute_uri(obj.file.url)
+        return None
+
+
+class UploadCreateSerializer(serializers.Serializer):
+    """Serializer for starting an upload"""
+    
+    filename = serializers.CharField(max_length=255)
+    content_type = serializers.CharField(max_length=100)
+    size = serializers.IntegerField(min_value=1)
+    sha256 = serializers.CharField(required=False, allow_blank=True, default='')
+    
+    def validate_filename(self, value):
+        extension = os.path.splitext(value)[1].lower().lstrip('.')
+        allowed = settings.ALLOWED_IMAGE_EXTENSIONS + settings.ALLOWED_VIDEO_EXTENSIONS
+        if extension not in allowed:
+            raise serializers.ValidationError(f"File type must be one of: {', '.join(allowed)}")
+        return value
+    
+    def validate_size(self, value):
+        max_size = sessions.get_max_size()
+        if value > max_size:
+            raise serializers.ValidationError(f"File size cannot exceed {max_size // (1024 * 1024)}MB")
+        return value
+    
+    def validate_sha256(self, value):
+        if value and not re.fullmatch(r'[0-9a-fA-F]{64}', value):
+            raise serializers.ValidationError("Must be a hex SHA-256 digest")
+        return value
+    
+    def create(self, validated_data):
+        return sessions.create(user=self.context['request'].user, **validated_data)
+
+
+class UploadIdField(serializers.UUIDField):
+    """
+    Write-only `upload_id` for media fields: a completed upload of the
+    current user. Validates to the UploadSession, claim it in create().
+    """
+    
+    def __init__(self, **kwargs):
+        kwargs.setdefault('write_only', True)
+        kwargs.setdefault('required', False)
+        super().__init__(**kwargs)
+    
+    def to_internal_value(self, data):
+        upload_id = super().to_internal_value(data)
+        request = self.context.get('request')
+        session = UploadSession.objects.filter(
+            id=upload_id,
+            user_id=getattr(request.user, 'id', None) if request else None,
+            status='complete'
+        ).first()
+        if session is None:
+            raise serializers.ValidationError("Upload not found or not complete")
+        return session
+
+
+def validate_media_or_upload(attrs, field):
+    """A multipart file in `field` or an upload_id - exactly one of them"""
+    if attrs.get(field) and attrs.get('upload_id') is not None:
+        raise serializers.ValidationError(f"Send either {field} or upload_id, not both")
+    if not attrs.get(field) and attrs.get('upload_id') is None:
+        raise serializers.ValidationError({field: "No file was submitted."})
+    # content_type of a completed upload is derived from its bytes
+    session = attrs.get('upload_id')
+    media_type = attrs.get('media_type')
+    if session is not None and media_type in ('image', 'video') and not session.content_type.startswith(f'{media_type}/'):
+        raise serializers.ValidationError({'upload_id': "Upload does not match media_type"})
+    return attrs
+
+
+def claim_upload(validated_data, field, user):
+    """Swap validated_data['upload_id'] for the claimed file name in `field`"""
+    session = validated_data.pop('upload_id', None)
+    if session is not None:
+        file_name = sessions.claim(session.id, user)
+        if file_name is None:
+            raise serializers.ValidationError({'upload_id': "Upload has already been used"})
+        validated_data[field] = file_name
+    return validated_data
@@ -0,0 +1,229 @@
+"""
+Resumable chunked uploads.
+
+1. `create()` opens an UploadSession for a file of known size
+2. the client PUTs the bytes in any number of chunks, each starting at the
+   session's current offset (`write_chunk()`). Chunks are streamed from the
+   request into a temp file under UPLOAD_TEMP_DIR in READ_SIZE pieces, so
+   memory stays constant whatever the file size. After a dropped
+   connection the client asks for the offset and carries on from there
+3. `complete()` checks the sha256 of the temp file, checks the extension
+   against ALLOWED_IMAGE/VIDEO_EXTENSIONS and the bytes against it (Pillow
+   for images, container signatures for videos), stores the content type
+   derived from that instead of the declared one, and moves the file into
+   default storage
+4. a Post, Story or Message serializer takes the session's `upload_id` and
+   `claim()`s the file - once
+
+Sessions that are idle or never attached for UPLOAD_SESSION_TTL seconds
+are removed by the expiry sweeper (pixora_backend/sweeper.py).
+"""
+
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+from PIL import Image
+
+from .models import UploadSession
+
+READ_SIZE = 64 * 1024
+
+VIDEO_CONTENT_TYPES = {
+    'mp4': 'video/mp4',
+    'mov': 'video/quicktime',
+    'avi': 'video/x-msvideo',
+}
+
+
+class UploadError(Exception):
+    """Request can't be applied to the session (maps to 400)"""
+
+
+class OffsetConflict(UploadError):
+    """Chunk doesn't start at the session's offset (maps to 409)"""
+
+    def __init__(self, offset):
+        super().__init__(f'Expected offset {offset}')
+        self.offset = offset
+
+
+class UploadTooLarge(UploadError):
+    """More bytes than the declared size (maps to 413)"""
+
+
+def get_max_size():
+    return getattr(settings, 'UPLOAD_MAX_SIZE', 10 * 1024 * 1024)
+
+
+def get_expiry():
+    return timezone.now() + timedelta(seconds=getattr(settings, 'UPLOAD_SESSION_TTL', 86400))
+
+
+def get_temp_path(session_id):
+    temp_dir = getattr(settings, 'UPLOAD_TEMP_DIR', os.path.join(settings.BASE_DIR, 'upload_tmp'))
+    return os.path.join(temp_dir, f'{session_id}.part')
+
+
+def remove_temp(session_id):
+    try:
+        os.remove(get_temp_path(session_id))
+    except FileNotFoundError:
+        pass
+
+
+def create(user, filename, content_type, size, sha256=''):
+    """New session with an empty temp file"""
+    session = UploadSession.objects.create(
+        user=user,
+        filename=filename,
+        content_type=content_type,
+        size=size,
+        sha256=sha256.lower(),
+        expires_at=get_expiry()
+    )
+    path = get_temp_path(session.id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    return session
+
+
+def write_chunk(session, offset, stream):
+    """
+    Append the request body at `offset`, returns the new offset.
+    Whatever arrived before a dropped connection is kept.
+    """
+    if session.status != 'uploading':
+        raise UploadError('Upload is already complete')
+    if offset != session.offset:
+        raise OffsetConflict(session.offset)
+
+    remaining = session.size - offset
+    written = 0
+    with open(get_temp_path(session.id), 'r+b') as temp:
+        temp.seek(offset)
+        while True:
+            piece = stream.read(READ_SIZE)
+            if not piece:
+                break
+            if written + len(piece) > remaining:
+                temp.truncate(offset)
+                raise UploadTooLarge(f'Upload is {session.size} bytes')
+            temp.write(piece)
+            written += len(piece)
+        temp.truncate(offset + written)
+
+    # Only advance from the offset we started at - a concurrent chunk loses
+    now = timezone.now()
+    updated = UploadSession.objects.filter(
+        id=session.id,
+        offset=offset,
+        status='uploading'
+    ).update(offset=offset + written, expires_at=get_expiry(), updated_at=now)
+    if not updated:
+        session.refresh_from_db(fields=['offset'])
+        raise OffsetConflict(session.offset)
+
+    session.offset = offset + written
+    return session.offset
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as temp:
+        for piece in iter(lambda: temp.read(READ_SIZE), b''):
+            digest.update(piece)
+    return digest.hexdigest()
+
+
+def _image_type(path):
+    """MIME type Pillow reads from the file, None if it isn't an image"""
+    try:
+        with Image.open(path) as image:
+            image.verify()
+            return Image.MIME.get(image.format)
+    except Exception:
+        return None
+
+
+def _video_signature_matches(path, extension):
+    with open(path, 'rb') as temp:
+        head = temp.read(12)
+    if extension == 'avi':
+        return head[:4] == b'RIFF' and head[8:12] == b'AVI '
+    # ISO base media (mp4) and QuickTime (mov) start with a box header
+    return head[4:8] in (b'ftyp', b'moov', b'mdat', b'wide', b'free')
+
+
+def detect_content_type(path, filename):
+    """Server-side type of an uploaded file, UploadError if it isn't allowed media"""
+    extension = os.path.splitext(filename)[1].lower().lstrip('.')
+    if extension in getattr(settings, 'ALLOWED_IMAGE_EXTENSIONS', []):
+        content_type = _image_type(path)
+        if content_type is None:
+            raise UploadError('File is not a valid image')
+        return content_type
+    if extension in getattr(settings, 'ALLOWED_VIDEO_EXTENSIONS', []):
+        if not _video_signature_matches(path, extension):
+            raise UploadError('File is not a valid video')
+        return VIDEO_CONTENT_TYPES.get(extension, 'video/mp4')
+    raise UploadError(f'Unsupported file type: .{extension}' if extension else 'File has no extension')
+
+
+def complete(session, sha256=''):
+    """Verify the checksum and move the file into storage"""
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(id=session.id)
+        if session.status != 'uploading':
+            return session
+
+        expected = (sha256 or session.sha256).lower()
+        if not expected:
+            raise UploadError('sha256 is required')
+        if session.offset != session.size:
+            raise UploadError(f'Upload is incomplete ({session.offset} of {session.size} bytes)')
+
+        path = get_temp_path(session.id)
+        matches = _file_sha256(path) == expected
+        if matches:
+            session.content_type = detect_content_type(path, session.filename)
+            with open(path, 'rb') as temp:
+                session.file.save(get_valid_filename(session.filename), File(temp), save=False)
+            session.sha256 = expected
+            session.status = 'complete'
+            session.expires_at = get_expiry()
+        else:
+            # The bytes are wrong somewhere - start over
+            open(path, 'wb').close()
+            session.offset = 0
+        session.save()
+
+    if not matches:
+        raise UploadError('Checksum mismatch, upload restarted')
+    remove_temp(session.id)
+    return session
+
+
+def claim(session_id, user):
+    """
+    Mark a completed upload as used, returns its stored file name
+    (None if it isn't the user's, isn't complete or was already claimed).
+    """
+    session = UploadSession.objects.filter(id=session_id, user=user, status='complete').first()
+    if session is None:
+        return None
+    claimed = UploadSession.objects.filter(id=session.id, status='complete').update(status='attached')
+    return session.file.name if claimed else None
+
+
+def abort(session):
+    """Drop a session and whatever was uploaded"""
+    remove_temp(session.id)
+    if session.file and session.status != 'attached':
+        session.file.delete(save=False)
+    session.delete()
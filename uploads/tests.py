@@ -0,0 +1,127 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from . import sessions
+from .models import UploadSession
+
+User = get_user_model()
+
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class ChunkedUploadTests(TestCase):
+    """Create -> PUT chunks -> complete, through the API"""
+
+    def setUp(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        settings_override = override_settings(
+            UPLOAD_TEMP_DIR=os.path.join(temp_dir, 'upload_tmp'),
+            MEDIA_ROOT=os.path.join(temp_dir, 'media'),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        os.makedirs(os.path.join(temp_dir, 'upload_tmp'))
+
+        self.user = User.objects.create_user(email='uploader@example.com', username='uploader', password='pw12345678')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.data = png_bytes()
+
+    def start(self, filename='photo.png', content_type='image/png'):
+        response = self.client.post('/api/uploads/', {
+            'filename': filename, 'content_type': content_type, 'size': len(self.data),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def put_chunk(self, upload_id, offset, chunk):
+        return self.client.generic(
+            'PUT', f'/api/uploads/{upload_id}/', chunk,
+            content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def complete(self, upload_id, sha256):
+        return self.client.post(f'/api/uploads/{upload_id}/complete/', {'sha256': sha256}, format='json')
+
+    def test_complete_chunked_upload(self):
+        upload_id = self.start()
+        middle = len(self.data) // 2
+
+        response = self.put_chunk(upload_id, 0, self.data[:middle])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Upload-Offset'], str(middle))
+
+        # A client resuming asks for the offset first
+        response = self.client.get(f'/api/uploads/{upload_id}/')
+        self.assertEqual(response.data['offset'], middle)
+
+        response = self.put_chunk(upload_id, middle, self.data[middle:])
+        self.assertEqual(response.data['offset'], len(self.data))
+
+        response = self.complete(upload_id, hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'complete')
+        self.assertEqual(response.data['content_type'], 'image/png')
+        self.assertTrue(response.data['file_url'])
+
+        session = UploadSession.objects.get(id=upload_id)
+        with session.file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.data)
+        self.assertFalse(os.path.exists(sessions.get_temp_path(session.id)))
+
+    def test_chunk_at_wrong_offset_is_rejected(self):
+        upload_id = self.start()
+        self.put_chunk(upload_id, 0, self.data[:10])
+
+        response = self.put_chunk(upload_id, 5, self.data[5:20])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 10)
+
+    def test_incomplete_upload_cannot_complete(self):
+        upload_id = self.start()
+        self.put_chunk(upload_id, 0, self.data[:10])
+
+        response = self.complete(upload_id, hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['offset'], 10)
+
+    def test_sha256_mismatch_restarts_upload(self):
+        upload_id = self.start()
+        self.put_chunk(upload_id, 0, self.data)
+
+        response = self.complete(upload_id, hashlib.sha256(b'something else').hexdigest())
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Checksum mismatch', response.data['error'])
+        self.assertEqual(response.data['offset'], 0)
+
+        session = UploadSession.objects.get(id=upload_id)
+        self.assertEqual(session.status, 'uploading')
+        self.assertFalse(session.file)
+
+        # The same session takes the upload again from zero
+        self.put_chunk(upload_id, 0, self.data)
+        response = self.complete(upload_id, hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'complete')
+
+    def test_content_type_comes_from_file(self):
+        self.data = b'definitely not a png'
+        upload_id = self.start()
+        self.put_chunk(upload_id, 0, self.data)
+
+        response = self.complete(upload_id, hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(UploadSession.objects.get(id=upload_id).status, 'uploading')
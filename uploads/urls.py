@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+app_name = 'uploads'
+
+urlpatterns = [
+    path('uploads/', views.UploadCreateView.as_view(), name='upload_create'),
+    path('uploads/<uuid:pk>/', views.UploadDetailView.as_view(), name='upload_detail'),
+    path('uploads/<uuid:pk>/complete/', views.UploadCompleteView.as_view(), name='upload_complete'),
+]
@@ -0,0 +1,99 @@
+import io
+
+from rest_framework import status, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.shortcuts import get_object_or_404
+from .models import UploadSession
+from .serializers import UploadSessionSerializer, UploadCreateSerializer
+from . import sessions
+
+
+def _response(session, request, status_code=status.HTTP_200_OK):
+    """Session JSON plus the offset as a header (usable from HEAD)"""
+    response = Response(
+        UploadSessionSerializer(session, context={'request': request}).data,
+        status=status_code
+    )
+    response['Upload-Offset'] = str(session.offset)
+    response['Upload-Length'] = str(session.size)
+    return response
+
+
+class UploadCreateView(APIView):
+    """
+    POST /api/uploads/ - Start a resumable upload
+    {filename, content_type, size, sha256 (optional until complete)}
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        serializer = UploadCreateSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        session = serializer.save()
+        return _response(session, request, status.HTTP_201_CREATED)
+
+
+class UploadDetailView(APIView):
+    """
+    GET/HEAD /api/uploads/:id/ - Current offset (resume from here)
+    PUT /api/uploads/:id/ - Chunk starting at the Upload-Offset header
+    DELETE /api/uploads/:id/ - Abort
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    # The body is raw file bytes, read straight from the request stream
+    parser_classes = []
+    
+    def get_object(self, pk):
+        return get_object_or_404(UploadSession, id=pk, user=self.request.user)
+    
+    def get(self, request, pk):
+        return _response(self.get_object(pk), request)
+    
+    def put(self, request, pk):
+        session = self.get_object(pk)
+        
+        offset = request.headers.get('Upload-Offset', request.query_params.get('offset'))
+        try:
+            offset = int(offset)
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'Upload-Offset header is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            # request.stream is None for an empty body
+            sessions.write_chunk(session, offset, request.stream or io.BytesIO())
+        except sessions.OffsetConflict as e:
+            return Response(
+                {'error': str(e), 'offset': e.offset},
+                status=status.HTTP_409_CONFLICT
+            )
+        except sessions.UploadTooLarge as e:
+            return Response({'error': str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        except sessions.UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return _response(session, request)
+    
+    def delete(self, request, pk):
+        sessions.abort(self.get_object(pk))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadCompleteView(APIView):
+    """POST /api/uploads/:id/complete/ - Verify the sha256 and finish"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request, pk):
+        session = get_object_or_404(UploadSession, id=pk, user=request.user)
+        try:
+            session = sessions.complete(session, request.data.get('sha256', ''))
+        except sessions.UploadError as e:
+            session.refresh_from_db()
+            return Response(
+                {'error': str(e), 'offset': session.offset},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return _response(session, request)